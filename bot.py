@@ -1,14 +1,17 @@
 from telegram import Update, ReplyKeyboardMarkup, BotCommand
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler, MessageHandler, filters, ConversationHandler
 import database
-from datetime import datetime, timedelta
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import JobQueue
 import threading
 import os
-from config import TOKEN, DOMAIN_URL
+from config import TOKEN
 import logging
 import sqlite3 # Needed for DB check exception handling
+try:
+    import uvloop # Optional: faster event loop on Linux/macOS
+except ImportError:
+    uvloop = None
 
 # Import handlers
 from handlers import commands as cmd_handlers
@@ -20,8 +23,7 @@ from handlers import jira_auth as jira_auth_handlers
 from web_app import run_flask, set_job_queue
 from handlers.commands import (
     FORWARDED_MESSAGE_PROJECT_SELECT, FORWARDED_MESSAGE_PROJECT_CREATE,
-    handle_forwarded_message, handle_forwarded_project_name,
-    format_minutes_as_mmss
+    handle_forwarded_message, handle_forwarded_project_name
 )
 
 # Shared state (consider moving to a better place later, e.g., context.bot_data or a dedicated module)
@@ -142,344 +144,6 @@ async def list_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text("Select a task:", reply_markup=reply_markup)
 
-from datetime import datetime, timedelta
-
-async def start_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id in timer_states:
-        await update.message.reply_text('A timer is already running or paused. Please stop it first.')
-        return
-    if user_id not in user_data or 'current_project' not in user_data[user_id] or 'current_task' not in user_data[user_id]:
-        await update.message.reply_text('Please select a project and task first.')
-        return
-    timer_states[user_id] = {
-        'state': 'running',
-        'accumulated_time': 0,
-        'start_time': datetime.now(),
-        'job': context.job_queue.run_once(timer_finished, 25 * 60, data={'user_id': user_id})
-    }
-    # Send message with a button to view the timer
-    timer_url = f'{DOMAIN_URL}/timer/{user_id}'
-    keyboard = [[InlineKeyboardButton("View Timer", url=timer_url)]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text('Timer started for 25 minutes.', reply_markup=reply_markup)
-
-async def timer_finished(context: ContextTypes.DEFAULT_TYPE):
-    job = context.job
-    user_id = job.data['user_id']
-    if user_id in timer_states:
-        timer_states[user_id]['accumulated_time'] = 25
-        timer_states[user_id]['state'] = 'stopped'
-        
-        # Get project and task IDs from user_data
-        if user_id in user_data and 'current_project' in user_data[user_id] and 'current_task' in user_data[user_id]:
-            project_id = user_data[user_id]['current_project']
-            task_id = user_data[user_id]['current_task']
-            
-            # Save completed session to database
-            start_time = timer_states[user_id]['start_time']
-            database.add_pomodoro_session(
-                user_id=user_id,
-                project_id=project_id,
-                task_id=task_id,
-                start_time=start_time,
-                work_duration=25,  # Full Pomodoro session
-                completed=1        # Completed successfully
-            )
-            
-            # Get project and task names for the message
-            project_name = database.get_project_name(project_id)
-            task_name = database.get_task_name(task_id)
-            
-            success_message = (
-                f"✅ Time's up! Pomodoro session completed.\n\n"
-                f'Project: {project_name}\n'
-                f'Task: {task_name}\n'
-                f'Duration: 25 minutes'
-            )
-            await context.bot.send_message(chat_id=user_id, text=success_message)
-        else:
-            # Generic message if project/task data is missing
-            await context.bot.send_message(chat_id=user_id, text="✅ Time's up! Pomodoro session completed.")
-        
-        # Clean up timer state
-        del timer_states[user_id]
-
-async def pause_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id not in timer_states or timer_states[user_id]['state'] != 'running':
-        await update.message.reply_text('No timer is running.')
-        return
-    current_time = datetime.now()
-    time_worked = (current_time - timer_states[user_id]['start_time']).total_seconds() / 60
-    timer_states[user_id]['accumulated_time'] += time_worked
-    timer_states[user_id]['state'] = 'paused'
-    timer_states[user_id]['job'].schedule_removal()
-    del timer_states[user_id]['job']
-    accumulated_time_formatted = format_minutes_as_mmss(timer_states[user_id]["accumulated_time"])
-    await update.message.reply_text(f'Timer paused. Accumulated time: {accumulated_time_formatted}')
-
-async def resume_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id not in timer_states or timer_states[user_id]['state'] != 'paused':
-        await update.message.reply_text('No timer is paused.')
-        return
-    accumulated_time = timer_states[user_id]['accumulated_time']
-    remaining_time = 25 - accumulated_time
-    if remaining_time <= 0:
-        await update.message.reply_text('Timer already completed.')
-        del timer_states[user_id]
-        return
-    timer_states[user_id]['state'] = 'running'
-    timer_states[user_id]['start_time'] = datetime.now()
-    timer_states[user_id]['job'] = context.job_queue.run_once(timer_finished, remaining_time * 60, data={'user_id': user_id})
-    await update.message.reply_text('Timer resumed.')
-
-async def stop_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id not in timer_states:
-        await update.message.reply_text('No timer is running or paused.')
-        return
-    
-    # Calculate the final accumulated time
-    if timer_states[user_id]['state'] == 'running':
-        current_time = datetime.now()
-        time_worked = (current_time - timer_states[user_id]['start_time']).total_seconds() / 60
-        timer_states[user_id]['accumulated_time'] += time_worked
-    
-    accumulated_time = timer_states[user_id]['accumulated_time']
-    is_completed = 1 if accumulated_time >= 25 else 0
-    
-    # Get project and task IDs from user_data
-    if user_id in user_data and 'current_project' in user_data[user_id] and 'current_task' in user_data[user_id]:
-        project_id = user_data[user_id]['current_project']
-        task_id = user_data[user_id]['current_task']
-        
-        # Save session to database
-        start_time = timer_states[user_id]['start_time']
-        database.add_pomodoro_session(
-            user_id=user_id,
-            project_id=project_id,
-            task_id=task_id,
-            start_time=start_time,
-            work_duration=accumulated_time,
-            completed=is_completed
-        )
-        
-        # Get project and task names for the message
-        project_name = database.get_project_name(project_id)
-        task_name = database.get_task_name(task_id)
-
-        accumulated_time_formatted = format_minutes_as_mmss(accumulated_time)
-        message = (
-            f'⏹ Timer stopped.\n\n'
-            f'Project: {project_name}\n'
-            f'Task: {task_name}\n'
-            f'Duration: {accumulated_time_formatted}'
-        )
-        await update.message.reply_text(message)
-    else:
-        # Generic message if project/task data is missing
-        accumulated_time_formatted = format_minutes_as_mmss(accumulated_time)
-        await update.message.reply_text(f'⏹ Timer stopped. Total time worked: {accumulated_time_formatted}')
-    
-    # Cancel the scheduled job if it exists
-    if 'job' in timer_states[user_id]:
-        timer_states[user_id]['job'].schedule_removal()
-    
-    # Clean up timer state
-    del timer_states[user_id]
-
-# Report commands
-async def report_daily(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    total_minutes, project_breakdown = database.get_daily_report(user_id)
-    
-    if total_minutes == 0:
-        await update.message.reply_text("You haven't completed any Pomodoro sessions today.")
-        return
-        
-    # Format the report message
-    report = f"📊 *Daily Report*\n\n"
-    report += f"Total time today: *{total_minutes:.1f} minutes*\n\n"
-    
-    if project_breakdown:
-        report += "*Project Breakdown:*\n"
-        for project_name, minutes in project_breakdown:
-            percentage = (minutes / total_minutes) * 100
-            report += f"• {project_name}: {minutes:.1f} min ({percentage:.1f}%)\n"
-    
-    await update.message.reply_text(report, parse_mode='Markdown')
-
-async def report_weekly(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    total_minutes, daily_breakdown, project_breakdown = database.get_weekly_report(user_id)
-    
-    if total_minutes == 0:
-        await update.message.reply_text("You haven't completed any Pomodoro sessions this week.")
-        return
-    
-    # Format the report message
-    report = f"📈 *Weekly Report*\n\n"
-    report += f"Total time this week: *{total_minutes:.1f} minutes*\n\n"
-    
-    if daily_breakdown:
-        report += "*Daily Breakdown:*\n"
-        for date, minutes in daily_breakdown:
-            try:
-                # Format date as "Mon, Jan 15"
-                date_obj = datetime.fromisoformat(date).strftime("%a, %b %d")
-                report += f"• {date_obj}: {minutes:.1f} min\n"
-            except (ValueError, TypeError):
-                # Fallback if date parsing fails
-                report += f"• {date}: {minutes:.1f} min\n"
-    
-    report += "\n*Project Breakdown:*\n"
-    for project_name, minutes in project_breakdown:
-        percentage = (minutes / total_minutes) * 100
-        report += f"• {project_name}: {minutes:.1f} min ({percentage:.1f}%)\n"
-    
-    await update.message.reply_text(report, parse_mode='Markdown')
-
-async def report_monthly(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    total_minutes, project_breakdown = database.get_monthly_report(user_id)
-    
-    if total_minutes == 0:
-        await update.message.reply_text("You haven't completed any Pomodoro sessions this month.")
-        return
-    
-    # Format the report message
-    current_month = datetime.now().strftime("%B %Y")
-    report = f"📅 *Monthly Report: {current_month}*\n\n"
-    report += f"Total time this month: *{total_minutes:.1f} minutes* ({total_minutes/60:.1f} hours)\n\n"
-    
-    if project_breakdown:
-        report += "*Project Breakdown:*\n"
-        for project_name, minutes in project_breakdown:
-            percentage = (minutes / total_minutes) * 100
-            report += f"• {project_name}: {minutes:.1f} min ({percentage:.1f}%)\n"
-    
-    await update.message.reply_text(report, parse_mode='Markdown')
-
-async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not context.args or len(context.args) == 0:
-        keyboard = [
-            [InlineKeyboardButton("📊 Daily", callback_data="report_daily")],
-            [InlineKeyboardButton("📈 Weekly", callback_data="report_weekly")],
-            [InlineKeyboardButton("📅 Monthly", callback_data="report_monthly")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text("Which report would you like to see?", reply_markup=reply_markup)
-        return
-    
-    report_type = context.args[0].lower()
-    if report_type == "daily":
-        await report_daily(update, context)
-    elif report_type == "weekly":
-        await report_weekly(update, context)
-    elif report_type == "monthly":
-        await report_monthly(update, context)
-    else:
-        await update.message.reply_text("Unknown report type. Available options: daily, weekly, monthly")
-
-async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    data = query.data
-    user_id = query.from_user.id # Use query.from_user.id for callback queries
-
-    if data == "report_daily":
-        # Create a fake update with the original message
-        fake_update = Update(0, query.message)
-        fake_update.message.from_user = query.from_user
-        await report_daily(fake_update, context)
-    elif data == "report_weekly":
-        fake_update = Update(0, query.message)
-        fake_update.message.from_user = query.from_user
-        await report_weekly(fake_update, context)
-    elif data == "report_monthly":
-        fake_update = Update(0, query.message)
-        fake_update.message.from_user = query.from_user
-        await report_monthly(fake_update, context)
-    elif data.startswith("select_project:"):
-        project_id = int(data.split(":")[1])
-        project_name = database.get_project_name(project_id)
-        if project_name:
-            # Ensure user_data dictionary exists for the user
-            if user_id not in user_data:
-                user_data[user_id] = {}
-            user_data[user_id]['current_project'] = project_id
-            # Edit the original message to show selection
-            await query.edit_message_text(f'Project "{project_name}" selected.')
-            # Optionally, clear the current task selection
-            if 'current_task' in user_data[user_id]:
-                del user_data[user_id]['current_task']
-        else:
-            await query.edit_message_text('Error: Project not found.')
-    elif data.startswith("select_task:"):
-        task_id = int(data.split(":")[1])
-        task_name = database.get_task_name(task_id)
-        if task_name:
-            # Ensure user_data dictionary exists for the user (should already exist if project is selected)
-            if user_id not in user_data:
-                user_data[user_id] = {} # Should ideally not happen if project is selected
-            user_data[user_id]['current_task'] = task_id
-            await query.edit_message_text(f'Task "{task_name}" selected.')
-        else:
-            await query.edit_message_text('Error: Task not found.')
-
-    # --- Deletion Callbacks ---
-    elif data == "cancel_delete":
-        await query.edit_message_text("Deletion cancelled.")
-        
-    elif data.startswith("confirm_delete_project:"):
-        project_id = int(data.split(":")[1])
-        project_name = database.get_project_name(project_id) or "Unknown Project"
-        keyboard = [
-            [InlineKeyboardButton("🔴 Yes, DELETE it!", callback_data=f"delete_project:{project_id}")],
-            [InlineKeyboardButton("🟢 No, cancel", callback_data="cancel_delete")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(f"❗️ Are you ABSOLUTELY SURE you want to delete project '{project_name}'?\nThis will delete all its tasks and recorded time entries.", reply_markup=reply_markup)
-        
-    elif data.startswith("delete_project:"):
-        project_id = int(data.split(":")[1])
-        project_name = database.get_project_name(project_id) or "Unknown Project"
-        deleted = database.delete_project(project_id)
-        if deleted:
-             # Clear selected project if it was the one deleted
-            if user_id in user_data and user_data[user_id].get('current_project') == project_id:
-                del user_data[user_id]['current_project']
-                if 'current_task' in user_data[user_id]: # Also clear task
-                    del user_data[user_id]['current_task']
-            await query.edit_message_text(f"✅ Project '{project_name}' and all associated data have been deleted.")
-        else:
-            await query.edit_message_text(f"❌ Failed to delete project '{project_name}'. Check logs.")
-            
-    elif data.startswith("confirm_delete_task:"):
-        task_id = int(data.split(":")[1])
-        task_name = database.get_task_name(task_id) or "Unknown Task"
-        keyboard = [
-            [InlineKeyboardButton("🔴 Yes, DELETE it!", callback_data=f"delete_task:{task_id}")],
-            [InlineKeyboardButton("🟢 No, cancel", callback_data="cancel_delete")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(f"❗️ Are you ABSOLUTELY SURE you want to delete task '{task_name}'?\nThis will delete all its recorded time entries.", reply_markup=reply_markup)
-        
-    elif data.startswith("delete_task:"):
-        task_id = int(data.split(":")[1])
-        task_name = database.get_task_name(task_id) or "Unknown Task"
-        deleted = database.delete_task(task_id)
-        if deleted:
-            # Clear selected task if it was the one deleted
-            if user_id in user_data and user_data[user_id].get('current_task') == task_id:
-                del user_data[user_id]['current_task']
-            await query.edit_message_text(f"✅ Task '{task_name}' and its time entries have been deleted.")
-        else:
-            await query.edit_message_text(f"❌ Failed to delete task '{task_name}'. Check logs.")
-
 # --- Deletion Commands ---
 
 async def delete_project_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -547,9 +211,26 @@ async def setup_bot_commands(application: Application):
 async def post_init(application: Application):
     """Runs after the application is initialized."""
     await setup_bot_commands(application)
+    if application.job_queue is not None:
+        cmd_handlers.restore_timer_states(application.job_queue)
+        application.job_queue.run_repeating(
+            cmd_handlers.persist_state_job,
+            interval=database.SESSION_FLUSH_INTERVAL_SECONDS,
+            name="persist_state"
+        )
+
+async def post_shutdown(application: Application):
+    """Runs on shutdown; writes any sessions still buffered and the active timers."""
+    database.flush_pomodoro_sessions()
+    cmd_handlers.save_timer_states()
 
 def main():
     log.info("Initializing Pomodoro Bot...")
+
+    # Must happen before the application creates its event loop
+    if uvloop is not None:
+        uvloop.install()
+        log.info("Using uvloop event loop.")
     
     # According to DEPLOY.md, in production the correct installation is:
     # pip install "python-telegram-bot[job-queue]"
@@ -557,7 +238,7 @@ def main():
     
     try:
         # Standard initialization for python-telegram-bot 21.x with job-queue extra
-        application = Application.builder().token(TOKEN).post_init(post_init).build()
+        application = Application.builder().token(TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
         
         # Check if job queue is available
         if not hasattr(application, 'job_queue') or application.job_queue is None:
@@ -566,7 +247,7 @@ def main():
     except Exception as e:
         log.error(f"Error initializing application: {e}")
         # Fallback to simpler initialization if anything fails
-        application = Application.builder().token(TOKEN).build()
+        application = Application.builder().token(TOKEN).post_shutdown(post_shutdown).build()
         log.warning("Using basic initialization without post_init.")
 
     # Define reply keyboard button texts (ensure these match the ones in handlers/commands.py)
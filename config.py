@@ -1,4 +1,7 @@
 import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -38,8 +41,50 @@ if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
 print(f"Google Config: Client ID {'set' if GOOGLE_CLIENT_ID else 'MISSING'}, Secret {'set' if GOOGLE_CLIENT_SECRET else 'MISSING'}, Redirect URI: {GOOGLE_REDIRECT_URI}")
 
 # --- Shared State ---
-# Note: timer_states is still in-memory and not persistent across restarts.
-timer_states = {} # {user_id: {'start_time': datetime, 'accumulated_time': int, 'state': 'running'/'paused'/'stopped', 'job': Job, 'initial_start_time': datetime}} 
+# Timer states and session types. Plain strings on purpose: they are stored in
+# pomodoro_sessions.session_type and returned as-is by the web app's JSON API.
+TIMER_RUNNING = 'running'
+TIMER_PAUSED = 'paused'
+TIMER_STOPPED = 'stopped'
+TIMER_FINISHED = 'finished'
+ACTIVE_TIMER_STATES = frozenset((TIMER_RUNNING, TIMER_PAUSED))
+SESSION_WORK = 'work'
+SESSION_BREAK = 'break'
+# A stopped timer counts as completed if it is at most this far short of its duration
+COMPLETION_TOLERANCE_MINUTES = 0.01
+
+@dataclass(slots=True)
+class TimerState:
+    """One user's running/paused timer. Times are in minutes."""
+    duration: float
+    session_type: str # SESSION_WORK or SESSION_BREAK
+    job: object = None # telegram.ext.Job for the completion callback
+    state: str = TIMER_RUNNING # One of the TIMER_* states
+    accumulated_time: float = 0
+    start_time: datetime | None = None # Wall clock, for display/logging
+    initial_start_time: datetime | None = None
+    start_monotonic: float = field(default_factory=time.monotonic) # Start of the current run, for elapsed math
+    project_id: int | None = None # Work sessions: the project/task selected when the timer started
+    task_id: int | None = None
+
+    def completed_flag(self) -> int:
+        """1 if the accumulated time covers the full duration (within the tolerance), else 0."""
+        return int(self.accumulated_time + COMPLETION_TOLERANCE_MINUTES >= self.duration)
+
+    def running_minutes(self) -> float:
+        """Minutes since the current run (start or last resume) began."""
+        return (time.monotonic() - self.start_monotonic) / 60
+
+    def mark_resumed(self, job):
+        """Starts a new run segment after a pause, tracking the newly scheduled job."""
+        self.state = TIMER_RUNNING
+        self.job = job
+        self.start_time = datetime.now()
+        self.start_monotonic = time.monotonic()
+
+# Running/paused timers are snapshotted to the active_timers table and restored on startup
+# (see handlers.commands.save_timer_states / restore_timer_states).
+timer_states = {} # {user_id: TimerState}
 
 # --- i18n Settings ---
 SUPPORTED_LANGUAGES = ['en', 'de', 'ru']
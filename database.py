@@ -1,7 +1,8 @@
 import sqlite3
+import threading
+import time
 from datetime import datetime
 import logging # Add logging
-import traceback
 import json # Needed for credentials handling
 from collections import defaultdict # Import defaultdict
 
@@ -14,10 +15,172 @@ log = logging.getLogger(__name__)
 STATUS_ACTIVE = 0
 STATUS_DONE = 1
 
+# Prepared-statement cache size for long-lived connections (sqlite3 default is 128)
+STATEMENT_CACHE_SIZE = 256
+
+# How long a connection waits on a locked database before raising (sqlite3 default is 5s)
+DB_BUSY_TIMEOUT_SECONDS = 30
+
+# Hot read queries, kept as constants so the per-connection statement cache hits
+_SQL_GET_PROJECTS = 'SELECT project_id, project_name FROM projects WHERE user_id = ? AND status = ?'
+_SQL_GET_PROJECT_NAME = 'SELECT project_name FROM projects WHERE project_id = ?'
+_SQL_GET_TASKS = 'SELECT task_id, task_name FROM tasks WHERE project_id = ? AND status = ?'
+_SQL_GET_TASK_NAME = 'SELECT task_name FROM tasks WHERE task_id = ?'
+# Ownership checks for writes addressed by ID (IDs come from callback data and web requests)
+_SQL_OWNED_PROJECT = 'SELECT project_name FROM projects WHERE project_id = ? AND user_id = ?'
+_SQL_OWNED_TASK = ('SELECT t.project_id, t.task_name FROM tasks t JOIN projects p ON p.project_id = t.project_id '
+                   'WHERE t.task_id = ? AND p.user_id = ?')
+# Case-insensitive name lookups; PY_CASEFOLD matches Python's str.casefold() (SQLite's NOCASE is ASCII-only)
+_SQL_FIND_PROJECT = 'SELECT project_id, project_name FROM projects WHERE user_id = ? AND status = ? AND PY_CASEFOLD(project_name) = ? LIMIT 1'
+_SQL_FIND_TASK = 'SELECT task_id, task_name FROM tasks WHERE project_id = ? AND status = ? AND PY_CASEFOLD(task_name) = ? LIMIT 1'
+# Report period bounds and the per-project/task breakdown
+_SQL_DATE_RANGE_DAYS = "SELECT DATE('now', ?, 'localtime'), DATE('now', ?, 'localtime')"
+_SQL_WEEK_RANGE = "SELECT DATE('now', 'weekday 0', ?, 'localtime'), DATE('now', 'weekday 0', ?, 'localtime')"
+_SQL_MONTH_RANGE = "SELECT DATE('now', 'start of month', ?, 'localtime'), DATE('now', 'start of month', ?, 'localtime')"
+# Shared by all report periods: work minutes per project/task for days in [start, end).
+# Reads the daily_rollups table (kept up to date by a trigger on pomodoro_sessions).
+_SQL_REPORT_BREAKDOWN = '''
+    SELECT 
+        p.project_name, 
+        t.task_name, 
+        SUM(r.minutes) as task_minutes
+    FROM daily_rollups r
+    JOIN projects p ON r.project_id = p.project_id
+    JOIN tasks t ON r.task_id = t.task_id
+    WHERE r.user_id = ? 
+      AND r.day >= ?
+      AND r.day < ?
+    GROUP BY r.project_id, r.task_id, p.project_name, t.task_name
+    ORDER BY p.project_name, task_minutes DESC
+'''
+# Work minutes per day in [start, end), including work logged without a project/task
+_SQL_REPORT_DAILY_TOTALS = '''
+    SELECT day, SUM(minutes) as minutes
+    FROM daily_rollups
+    WHERE user_id = ? AND day >= ? AND day < ?
+    GROUP BY day
+    ORDER BY day
+'''
+
+_thread_local = threading.local()
+
+# Project/task name cache: {('project'|'task', id): (name, expires_at)}
+NAME_CACHE_TTL_SECONDS = 300
+NAME_CACHE_MAX_SIZE = 4096
+_name_cache = {}
+
+def _get_cached_name(kind, item_id):
+    """Returns a cached name or None if missing/expired."""
+    entry = _name_cache.get((kind, item_id))
+    if entry and entry[1] > time.monotonic():
+        return entry[0]
+    return None
+
+def _cache_name(kind, item_id, name):
+    """Stores a name in the cache, evicting the oldest entry when full."""
+    if len(_name_cache) >= NAME_CACHE_MAX_SIZE:
+        _name_cache.pop(next(iter(_name_cache)), None)
+    _name_cache[(kind, item_id)] = (name, time.monotonic() + NAME_CACHE_TTL_SECONDS)
+
+def invalidate_name_cache(kind=None, item_id=None):
+    """Drops one cached name, all names of a kind, or everything."""
+    if kind is None:
+        _name_cache.clear()
+    elif item_id is None:
+        for cache_key in [k for k in list(_name_cache) if k[0] == kind]: # Snapshot: other threads insert concurrently
+            _name_cache.pop(cache_key, None)
+    else:
+        _name_cache.pop((kind, item_id), None)
+
+# Project/task list cache: {('projects', user_id, status) | ('tasks', project_id, status): (rows, expires_at)}
+LIST_CACHE_TTL_SECONDS = 300
+LIST_CACHE_MAX_SIZE = 4096
+_list_cache = {}
+
+def _get_cached_list(kind, owner_id, status):
+    """Returns cached list rows or None if missing/expired."""
+    entry = _list_cache.get((kind, owner_id, status))
+    if entry and entry[1] > time.monotonic():
+        return entry[0]
+    return None
+
+def _cache_list(kind, owner_id, status, rows):
+    """Stores list rows in the cache, evicting the oldest entry when full."""
+    if len(_list_cache) >= LIST_CACHE_MAX_SIZE:
+        _list_cache.pop(next(iter(_list_cache)), None)
+    _list_cache[(kind, owner_id, status)] = (rows, time.monotonic() + LIST_CACHE_TTL_SECONDS)
+
+def invalidate_list_cache(kind, owner_id=None):
+    """Drops cached 'projects'/'tasks' lists of one owner (user/project id), or all of that kind."""
+    for cache_key in [k for k in list(_list_cache) if k[0] == kind and (owner_id is None or k[1] == owner_id)]:
+        _list_cache.pop(cache_key, None)
+
+# Report results: {('daily'|'weekly'|'monthly', user_id, offset): (result, expires_at)}
+# Dropped when the user logs a session or a project/task is renamed/deleted; the TTL bounds
+# staleness otherwise (e.g. the report period rolling over at midnight).
+REPORT_CACHE_TTL_SECONDS = {'daily': 60, 'weekly': 300, 'monthly': 300}
+REPORT_CACHE_MAX_SIZE = 4096
+_report_cache = {}
+
+def _get_cached_report(kind, user_id, offset):
+    """Returns a cached report tuple or None if missing/expired."""
+    entry = _report_cache.get((kind, user_id, offset))
+    if entry and entry[1] > time.monotonic():
+        return entry[0]
+    return None
+
+def _cache_report(kind, user_id, offset, result):
+    """Stores a report tuple in the cache, evicting the oldest entry when full."""
+    if len(_report_cache) >= REPORT_CACHE_MAX_SIZE:
+        _report_cache.pop(next(iter(_report_cache)), None)
+    _report_cache[(kind, user_id, offset)] = (result, time.monotonic() + REPORT_CACHE_TTL_SECONDS[kind])
+
+def invalidate_report_cache(user_id=None):
+    """Drops cached reports of one user, or everything."""
+    if user_id is None:
+        _report_cache.clear()
+        return
+    for cache_key in [k for k in list(_report_cache) if k[1] == user_id]:
+        _report_cache.pop(cache_key, None)
+
+# Current selection per user: {user_id: (project_id, project_name, task_id, task_name)}
+_current_context_cache = {}
+
+def _forget_current_context(project_id=None, task_id=None):
+    """Drops cached selections pointing at a renamed/deleted project or task."""
+    stale = [
+        u for u, entry in list(_current_context_cache.items())
+        if (project_id is not None and entry[0] == project_id) or (task_id is not None and entry[2] == task_id)
+    ]
+    for user_id in stale:
+        _current_context_cache.pop(user_id, None)
+
+def _sql_casefold(value):
+    """SQL function backing PY_CASEFOLD() (full Unicode case folding, unlike SQLite's lower())."""
+    return value.casefold() if isinstance(value, str) else value
+
 # --- Database Initialization and Schema Management ---
+def get_cached_connection():
+    """Returns a long-lived connection for the calling thread.
+
+    The connection is reused across calls (and never closed by callers), so
+    SQLite's prepared-statement cache survives between queries.
+    """
+    conn = getattr(_thread_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_NAME, cached_statements=STATEMENT_CACHE_SIZE, timeout=DB_BUSY_TIMEOUT_SECONDS)
+        conn.execute("PRAGMA foreign_keys = ON;")
+        conn.execute("PRAGMA journal_mode = WAL;") # Readers don't block the writer
+        conn.execute("PRAGMA synchronous = NORMAL;") # Safe with WAL, fewer fsyncs
+        conn.execute("PRAGMA cache_size = -20000;") # ~20MB page cache, kept warm by reuse
+        conn.execute("PRAGMA temp_store = MEMORY;") # GROUP BY/ORDER BY temp b-trees stay off disk
+        conn.create_function("PY_CASEFOLD", 1, _sql_casefold, deterministic=True)
+        _thread_local.conn = conn
+    return conn
+
 def get_db_connection():
     """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT_SECONDS)
     conn.row_factory = sqlite3.Row # Return rows as dictionary-like objects
     conn.execute("PRAGMA foreign_keys = ON;") # Enforce foreign key constraints
     return conn
@@ -67,6 +230,10 @@ def create_database():
     conn = None
     try:
         conn = get_db_connection()
+        # WAL is persistent in the database file, so every later connection (including
+        # short-lived ones) gets concurrent readers alongside the single writer
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA wal_autocheckpoint = 1000;")
         cursor = conn.cursor()
         
         # --- Create Tables ---\n        # Users Table
@@ -162,9 +329,73 @@ def create_database():
                 FOREIGN KEY (project_id) REFERENCES projects(project_id) ON DELETE SET NULL
             )
         ''')
+
+        # Active Timers Table (snapshot of running/paused timers, restored on startup)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS active_timers (
+                user_id INTEGER PRIMARY KEY,
+                state TEXT NOT NULL,
+                session_type TEXT NOT NULL,
+                duration REAL NOT NULL,
+                accumulated_time REAL NOT NULL DEFAULT 0,
+                start_time TEXT,
+                initial_start_time TEXT,
+                project_id INTEGER,
+                task_id INTEGER
+            )
+        ''')
+
+        # Daily Rollups Table (work minutes per user/day/project/task, kept in step with
+        # pomodoro_sessions by a trigger so reports read a few rows per day instead of every session)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_rollups'")
+        rollups_existed = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                user_id INTEGER NOT NULL,
+                day TEXT NOT NULL,   -- DATE(start_time) of the sessions
+                project_id INTEGER,  -- NULL for work logged without a selection
+                task_id INTEGER,
+                minutes REAL NOT NULL DEFAULT 0,
+                FOREIGN KEY (project_id) REFERENCES projects(project_id) ON DELETE CASCADE,
+                FOREIGN KEY (task_id) REFERENCES tasks(task_id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_rollups_user_day ON daily_rollups(user_id, day)")
+        # Project/task can be NULL, so add-or-update uses IS matching instead of an upsert on a key
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_sessions_rollup AFTER INSERT ON pomodoro_sessions
+            WHEN NEW.session_type = 'work'
+            BEGIN
+                UPDATE daily_rollups SET minutes = minutes + COALESCE(NEW.work_duration, 0)
+                WHERE user_id = NEW.user_id AND day = DATE(NEW.start_time)
+                  AND project_id IS NEW.project_id AND task_id IS NEW.task_id;
+                INSERT INTO daily_rollups (user_id, day, project_id, task_id, minutes)
+                SELECT NEW.user_id, DATE(NEW.start_time), NEW.project_id, NEW.task_id, COALESCE(NEW.work_duration, 0)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM daily_rollups
+                    WHERE user_id = NEW.user_id AND day = DATE(NEW.start_time)
+                      AND project_id IS NEW.project_id AND task_id IS NEW.task_id
+                );
+            END
+        ''')
+        if not rollups_existed:
+            # First run with rollups: aggregate the sessions logged so far
+            cursor.execute('''
+                INSERT INTO daily_rollups (user_id, day, project_id, task_id, minutes)
+                SELECT user_id, DATE(start_time), project_id, task_id, SUM(COALESCE(work_duration, 0))
+                FROM pomodoro_sessions
+                WHERE session_type = 'work'
+                GROUP BY user_id, DATE(start_time), project_id, task_id
+            ''')
+            log.info(f"Backfilled {cursor.rowcount} daily rollup row(s).")
         
         log.info("Database tables ensured.")
 
+        # --- Indexes ---
+        # Active/archived list views filter by owner and status
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_projects_user_status ON projects(user_id, status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_project_status ON tasks(project_id, status)")
+
         # --- Schema Migrations ---
         _apply_migrations(cursor)
 
@@ -200,20 +431,29 @@ def _apply_migrations(cursor):
 # --- User Management ---
 # Moved these functions up to ensure get_db_connection is defined before use
 
-def add_user(user_id, first_name, last_name):
-    """Adds or updates a user in the database."""
+_known_users = set() # Users whose row is known to exist; users are never deleted
+
+def add_user(user_id, first_name, last_name, language_code='en') -> bool:
+    """Adds a user if missing; `language_code` is only used for a newly created row.
+
+    Returns True only when a new row was inserted.
+    """
+    if user_id in _known_users:
+        return False # Row already there; skip the no-op INSERT OR IGNORE (and its write lock)
     conn = None
     try:
-        conn = get_db_connection() # Use helper function
+        conn = get_cached_connection()
         cursor = conn.cursor()
         # Use INSERT OR IGNORE to handle existing users gracefully
         cursor.execute('''
             INSERT OR IGNORE INTO users (user_id, first_name, last_name, language_code)
             VALUES (?, ?, ?, ?)
-        ''', (user_id, first_name, last_name, 'en')) # Default to 'en' on creation
+        ''', (user_id, first_name, last_name, language_code))
         conn.commit()
+        _known_users.add(user_id)
         if cursor.rowcount > 0:
              log.info(f"Added user {user_id}.")
+             return True
         else:
              log.info(f"User {user_id} already exists, ignored insert.")
              # Optionally, update first/last name here if needed
@@ -225,37 +465,28 @@ def add_user(user_id, first_name, last_name):
     except sqlite3.Error as e:
         log.error(f"Error adding/updating user {user_id}: {e}", exc_info=True)
         if conn: conn.rollback()
-    finally:
-        if conn:
-            conn.close()
+    return False
 
 def get_user_language(user_id):
     """Gets the preferred language code for a user."""
     conn = None
     try:
-        conn = get_db_connection() # Use helper function
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT language_code FROM users WHERE user_id = ?", (user_id,))
         result = cursor.fetchone()
-        # conn.row_factory = sqlite3.Row is set by get_db_connection()
-        if result and result['language_code']:
-            return result['language_code']
+        if result and result[0]:
+            return result[0]
         return 'en' # Return default language 'en'
     except sqlite3.Error as e:
         log.error(f"Error getting language for user {user_id}: {e}", exc_info=True)
         return 'en' # Return default on error
-    except TypeError as e: # Catch potential Row factory issue explicitly
-        log.error(f"TypeError accessing language for user {user_id}. DB row format issue? Error: {e}", exc_info=True)
-        return 'en' # Return default on this error too
-    finally:
-        if conn:
-            conn.close()
 
 def set_user_language(user_id, language_code):
     """Sets the preferred language code for a user."""
     conn = None
     try:
-        conn = get_db_connection() # Use helper function
+        conn = get_cached_connection()
         cursor = conn.cursor()
         # Optional: Validate if language_code is in SUPPORTED_LANGUAGES from config?
         cursor.execute("UPDATE users SET language_code = ? WHERE user_id = ?", (language_code, user_id))
@@ -270,221 +501,284 @@ def set_user_language(user_id, language_code):
         log.error(f"Error setting language for user {user_id}: {e}", exc_info=True)
         if conn: conn.rollback()
         return False
-    finally:
-        if conn:
-            conn.close()
 
 # --- Rest of the original file ...
 
-def set_current_project(user_id, project_id):
-    """Sets the current project for a user, clearing the current task."""
+def set_current_project(user_id, project_id) -> bool:
+    """Sets one of the user's projects as current, clearing the current task.
+
+    Returns False (and changes nothing) if the project does not belong to the user.
+    """
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         # Also clear the current task when project changes
-        cursor.execute("UPDATE users SET current_project_id = ?, current_task_id = NULL WHERE user_id = ?", (project_id, user_id))
+        cursor.execute(
+            "UPDATE users SET current_project_id = ?, current_task_id = NULL "
+            "WHERE user_id = ? AND EXISTS (SELECT 1 FROM projects WHERE project_id = ? AND user_id = ?)",
+            (project_id, user_id, project_id, user_id)
+        )
         conn.commit()
+        _current_context_cache.pop(user_id, None)
         log.debug(f"Set current project for user {user_id} to {project_id}. Rows affected: {cursor.rowcount}")
+        return cursor.rowcount > 0
     except sqlite3.Error as e:
         log.error(f"Database error setting current project for user {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+        if conn: conn.rollback()
+    return False
 
 def set_current_task(user_id, task_id):
     """Sets the current task for a user."""
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET current_task_id = ? WHERE user_id = ?", (task_id, user_id))
         conn.commit()
+        _current_context_cache.pop(user_id, None)
         log.debug(f"Set current task for user {user_id} to {task_id}.")
     except sqlite3.Error as e:
         log.error(f"Database error setting current task for user {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+        if conn: conn.rollback()
 
-def get_current_project(user_id):
-    """Gets the current project ID for a user."""
+def set_current_selection(user_id, project_id, task_id):
+    """Sets the current project and task for a user in one write (task_id may be None)."""
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT current_project_id FROM users WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        log.debug(f"get_current_project for user {user_id} raw result: {result}")
-        return result[0] if result and result[0] is not None else None
+        cursor.execute("UPDATE users SET current_project_id = ?, current_task_id = ? WHERE user_id = ?", (project_id, task_id, user_id))
+        conn.commit()
+        _current_context_cache.pop(user_id, None)
+        log.debug(f"Set current selection for user {user_id} to project {project_id}, task {task_id}.")
     except sqlite3.Error as e:
-        log.error(f"Database error getting current project for user {user_id}: {e}")
-        return None # Return None on error
-    finally:
-        if conn:
-            conn.close()
+        log.error(f"Database error setting current selection for user {user_id}: {e}")
+        if conn: conn.rollback()
 
-def get_current_task(user_id):
-    """Gets the current task ID for a user."""
-    conn = None
+def get_current_project(user_id):
+    """Gets the current project ID for a user (served from the current-context cache)."""
+    return get_current_context(user_id)[0]
+
+def get_current_context(user_id):
+    """Gets the user's selection as (project_id, project_name, task_id, task_name).
+
+    Fetched with a single joined query and cached per user until the selection
+    (or the selected project/task) changes. Missing parts are None.
+    """
+    cached = _current_context_cache.get(user_id)
+    if cached:
+        return cached
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute("SELECT current_task_id FROM users WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        return result[0] if result and result[0] is not None else None
+        conn = get_cached_connection()
+        result = conn.execute(
+            "SELECT u.current_project_id, p.project_name, u.current_task_id, t.task_name FROM users u "
+            "LEFT JOIN projects p ON p.project_id = u.current_project_id "
+            "LEFT JOIN tasks t ON t.task_id = u.current_task_id WHERE u.user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if result is None:
+            return (None, None, None, None)
+        _current_context_cache[user_id] = result
+        return result
     except sqlite3.Error as e:
-        log.error(f"Database error getting current task for user {user_id}: {e}")
-        return None # Return None on error
-    finally:
-        if conn:
-            conn.close()
+        log.error(f"Database error getting current context for user {user_id}: {e}")
+        return (None, None, None, None)
+
+def get_timer_start_context(user_id):
+    """Gets (project_id, project_name, project_status, task_id, task_name, task_status) in one query.
+
+    Always reads the database (statuses are not cached) and refreshes the
+    current-context cache on the way. Missing parts are None.
+    """
+    try:
+        conn = get_cached_connection()
+        result = conn.execute(
+            "SELECT u.current_project_id, p.project_name, p.status, u.current_task_id, t.task_name, t.status FROM users u "
+            "LEFT JOIN projects p ON p.project_id = u.current_project_id "
+            "LEFT JOIN tasks t ON t.task_id = u.current_task_id WHERE u.user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if result is None:
+            return (None,) * 6
+        _current_context_cache[user_id] = (result[0], result[1], result[3], result[4])
+        return result
+    except sqlite3.Error as e:
+        log.error(f"Database error getting timer start context for user {user_id}: {e}")
+        return (None,) * 6
+
+def get_current_project_with_name(user_id):
+    """Gets the user's current project as (project_id, project_name), or None if unset."""
+    project_id, project_name = get_current_context(user_id)[:2]
+    if not project_id:
+        return None
+    return project_id, project_name
+
+def get_current_task(user_id):
+    """Gets the current task ID for a user (served from the current-context cache)."""
+    return get_current_context(user_id)[2]
 
 def clear_current_project(user_id):
     """Clears both current project and task for the user."""
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET current_project_id = NULL, current_task_id = NULL WHERE user_id = ?", (user_id,))
         conn.commit()
+        _current_context_cache.pop(user_id, None)
         log.debug(f"Cleared current project/task for user {user_id}.")
     except sqlite3.Error as e:
         log.error(f"Database error clearing current project/task for user {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+        if conn: conn.rollback()
 
 def clear_current_task(user_id):
     """Clears only the current task for the user."""
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET current_task_id = NULL WHERE user_id = ?", (user_id,))
         conn.commit()
+        _current_context_cache.pop(user_id, None)
         log.debug(f"Cleared current task for user {user_id}.")
     except sqlite3.Error as e:
         log.error(f"Database error clearing current task for user {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+        if conn: conn.rollback()
 
 def add_project(user_id, project_name):
     """Adds a new active project for a user."""
     conn = None
     project_id = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         # Insert with default status (active)
         cursor.execute('INSERT INTO projects (user_id, project_name, status) VALUES (?, ?, ?)', 
                        (user_id, project_name, STATUS_ACTIVE))
         project_id = cursor.lastrowid
         conn.commit()
+        invalidate_list_cache('projects', user_id)
         log.info(f"Added project '{project_name}' ({project_id}) for user {user_id}.")
     except sqlite3.Error as e:
         log.error(f"Database error adding project '{project_name}' for user {user_id}: {e}")
+        if conn: conn.rollback()
         project_id = None # Ensure None is returned on error
-    finally:
-        if conn:
-            conn.close()
     return project_id
 
 def get_projects(user_id, status: int = STATUS_ACTIVE):
     """Gets projects for a user, filtered by status (default: active)."""
-    conn = None
+    cached = _get_cached_list('projects', user_id, status)
+    if cached is not None:
+        return cached
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('SELECT project_id, project_name FROM projects WHERE user_id = ? AND status = ?', 
-                       (user_id, status))
-        projects = cursor.fetchall()
+        conn = get_cached_connection()
+        projects = conn.execute(_SQL_GET_PROJECTS, (user_id, status)).fetchall()
+        _cache_list('projects', user_id, status, projects)
         return projects
     except sqlite3.Error as e:
         log.error(f"Database error getting projects for user {user_id}: {e}")
         return [] # Return empty list on error
-    finally:
-        if conn:
-            conn.close()
+
+def find_project_by_name(user_id, project_name, status: int = STATUS_ACTIVE):
+    """Finds a user's project by name (case-insensitive). Returns (project_id, project_name) or None."""
+    try:
+        conn = get_cached_connection()
+        return conn.execute(_SQL_FIND_PROJECT, (user_id, status, project_name.casefold())).fetchone()
+    except sqlite3.Error as e:
+        log.error(f"Database error finding project '{project_name}' for user {user_id}: {e}")
+        return None
 
 def get_project_name(project_id):
     """Gets the name of a specific project."""
-    conn = None
+    name = _get_cached_name('project', project_id)
+    if name is not None:
+        return name
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('SELECT project_name FROM projects WHERE project_id = ?', (project_id,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+        conn = get_cached_connection()
+        result = conn.execute(_SQL_GET_PROJECT_NAME, (project_id,)).fetchone()
+        if not result:
+            return None
+        _cache_name('project', project_id, result[0])
+        return result[0]
     except sqlite3.Error as e:
         log.error(f"Database error getting name for project {project_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
-def rename_project(project_id, new_name):
-    """Renames a project. Returns True on success, False on failure."""
+def get_owned_project_name(user_id, project_id):
+    """Returns the project's name if it belongs to the user, else None."""
+    try:
+        conn = get_cached_connection()
+        row = conn.execute(_SQL_OWNED_PROJECT, (project_id, user_id)).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        log.error(f"Database error looking up project {project_id} for user {user_id}: {e}")
+        return None
+
+def rename_project(user_id, project_id, new_name):
+    """Renames one of the user's projects. Returns True on success, False on failure."""
     conn = None
     renamed = False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
 
-        # Get the user_id for this project to check for duplicates
-        cursor.execute('SELECT user_id FROM projects WHERE project_id = ?', (project_id,))
-        result = cursor.fetchone()
-        if not result:
-            log.warning(f"Attempted to rename non-existent project {project_id}")
+        if not cursor.execute(_SQL_OWNED_PROJECT, (project_id, user_id)).fetchone():
+            log.warning(f"User {user_id} attempted to rename non-existent or foreign project {project_id}")
             return False
-        user_id = result[0]
 
         # Check for duplicate names (case-insensitive)
-        cursor.execute('SELECT project_id FROM projects WHERE user_id = ? AND LOWER(project_name) = LOWER(?) AND project_id != ?',
-                       (user_id, new_name, project_id))
+        cursor.execute('SELECT 1 FROM projects WHERE user_id = ? AND PY_CASEFOLD(project_name) = ? AND project_id != ? LIMIT 1',
+                       (user_id, new_name.casefold(), project_id))
         if cursor.fetchone():
             log.info(f"Rename project {project_id} failed: duplicate name '{new_name}' for user {user_id}")
             return False
 
         # Update the project name
-        cursor.execute('UPDATE projects SET project_name = ? WHERE project_id = ?', (new_name, project_id))
+        cursor.execute('UPDATE projects SET project_name = ? WHERE project_id = ? AND user_id = ?', (new_name, project_id, user_id))
         conn.commit()
+        invalidate_name_cache('project', project_id)
+        invalidate_list_cache('projects', user_id)
+        invalidate_report_cache(user_id)
+        _forget_current_context(project_id=project_id)
         log.info(f"Project {project_id} renamed to '{new_name}' successfully.")
         renamed = True
     except sqlite3.Error as e:
         log.error(f"Database error renaming project {project_id}: {e}")
         if conn: conn.rollback()
         renamed = False
-    finally:
-        if conn:
-            conn.close()
     return renamed
 
-def delete_project(project_id):
-    """Deletes a project. Associated tasks/sessions are handled by CASCADE constraints."""
+def delete_project(user_id, project_id):
+    """Deletes one of the user's projects. Associated tasks/sessions are handled by CASCADE constraints."""
+    flush_pomodoro_sessions()
     conn = None
     deleted = False
     try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.execute("PRAGMA foreign_keys = ON") # Ensure constraints are enforced
+        conn = get_cached_connection()
         cursor = conn.cursor()
+        if not cursor.execute(_SQL_OWNED_PROJECT, (project_id, user_id)).fetchone():
+            log.warning(f"User {user_id} attempted to delete non-existent or foreign project {project_id}")
+            return False
         # Clear this project as current project for any user
         cursor.execute("UPDATE users SET current_project_id = NULL, current_task_id = NULL WHERE current_project_id = ?", (project_id,))
 
         # Delete the project (CASCADE should handle tasks and sessions)
-        cursor.execute("DELETE FROM projects WHERE project_id = ?", (project_id,))
+        cursor.execute("DELETE FROM projects WHERE project_id = ? AND user_id = ?", (project_id, user_id))
 
         conn.commit()
+        invalidate_name_cache('project', project_id)
+        invalidate_name_cache('task') # Its tasks were removed by CASCADE
+        invalidate_list_cache('projects', user_id)
+        invalidate_list_cache('tasks', project_id)
+        invalidate_report_cache(user_id)
+        _forget_current_context(project_id=project_id)
         log.info(f"Project {project_id} deleted successfully (CASCADE handled related data).")
         deleted = True
     except sqlite3.Error as e:
         log.error(f"Database error during project deletion: {e}")
         if conn: conn.rollback()
         deleted = False
-    finally:
-        if conn:
-            conn.close()
     return deleted
 
 def add_task(project_id, task_name):
@@ -492,74 +786,87 @@ def add_task(project_id, task_name):
     conn = None
     task_id = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         # Insert with default status (active)
         cursor.execute('INSERT INTO tasks (project_id, task_name, status) VALUES (?, ?, ?)', 
                        (project_id, task_name, STATUS_ACTIVE))
         task_id = cursor.lastrowid
         conn.commit()
+        invalidate_list_cache('tasks', project_id)
         log.info(f"Added task '{task_name}' ({task_id}) to project {project_id}.")
     except sqlite3.Error as e:
         log.error(f"Database error adding task '{task_name}' to project {project_id}: {e}")
+        if conn: conn.rollback()
         task_id = None
-    finally:
-        if conn:
-            conn.close()
     return task_id
 
 def get_tasks(project_id, status: int = STATUS_ACTIVE):
     """Gets tasks for a specific project, filtered by status (default: active)."""
-    conn = None
+    cached = _get_cached_list('tasks', project_id, status)
+    if cached is not None:
+        return cached
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('SELECT task_id, task_name FROM tasks WHERE project_id = ? AND status = ?', 
-                       (project_id, status))
-        tasks = cursor.fetchall()
+        conn = get_cached_connection()
+        tasks = conn.execute(_SQL_GET_TASKS, (project_id, status)).fetchall()
+        _cache_list('tasks', project_id, status, tasks)
         return tasks
     except sqlite3.Error as e:
         log.error(f"Database error getting tasks for project {project_id}: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
+
+def find_task_by_name(project_id, task_name, status: int = STATUS_ACTIVE):
+    """Finds a project's task by name (case-insensitive). Returns (task_id, task_name) or None."""
+    try:
+        conn = get_cached_connection()
+        return conn.execute(_SQL_FIND_TASK, (project_id, status, task_name.casefold())).fetchone()
+    except sqlite3.Error as e:
+        log.error(f"Database error finding task '{task_name}' in project {project_id}: {e}")
+        return None
 
 def get_task_name(task_id):
     """Gets the name of a specific task."""
-    conn = None
+    name = _get_cached_name('task', task_id)
+    if name is not None:
+        return name
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('SELECT task_name FROM tasks WHERE task_id = ?', (task_id,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+        conn = get_cached_connection()
+        result = conn.execute(_SQL_GET_TASK_NAME, (task_id,)).fetchone()
+        if not result:
+            return None
+        _cache_name('task', task_id, result[0])
+        return result[0]
     except sqlite3.Error as e:
         log.error(f"Database error getting name for task {task_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
-def rename_task(task_id, new_name):
-    """Renames a task. Returns True on success, False on failure."""
+def get_owned_task(user_id, task_id):
+    """Returns (project_id, task_name) if the task belongs to one of the user's projects, else None."""
+    try:
+        conn = get_cached_connection()
+        return conn.execute(_SQL_OWNED_TASK, (task_id, user_id)).fetchone()
+    except sqlite3.Error as e:
+        log.error(f"Database error looking up task {task_id} for user {user_id}: {e}")
+        return None
+
+def rename_task(user_id, task_id, new_name):
+    """Renames a task in one of the user's projects. Returns True on success, False on failure."""
     conn = None
     renamed = False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
 
         # Get the project_id for this task to check for duplicates
-        cursor.execute('SELECT project_id FROM tasks WHERE task_id = ?', (task_id,))
-        result = cursor.fetchone()
+        result = cursor.execute(_SQL_OWNED_TASK, (task_id, user_id)).fetchone()
         if not result:
-            log.warning(f"Attempted to rename non-existent task {task_id}")
+            log.warning(f"User {user_id} attempted to rename non-existent or foreign task {task_id}")
             return False
         project_id = result[0]
 
         # Check for duplicate names (case-insensitive) within the same project
-        cursor.execute('SELECT task_id FROM tasks WHERE project_id = ? AND LOWER(task_name) = LOWER(?) AND task_id != ?',
-                       (project_id, new_name, task_id))
+        cursor.execute('SELECT 1 FROM tasks WHERE project_id = ? AND PY_CASEFOLD(task_name) = ? AND task_id != ? LIMIT 1',
+                       (project_id, new_name.casefold(), task_id))
         if cursor.fetchone():
             log.info(f"Rename task {task_id} failed: duplicate name '{new_name}' in project {project_id}")
             return False
@@ -567,25 +874,31 @@ def rename_task(task_id, new_name):
         # Update the task name
         cursor.execute('UPDATE tasks SET task_name = ? WHERE task_id = ?', (new_name, task_id))
         conn.commit()
+        invalidate_name_cache('task', task_id)
+        invalidate_list_cache('tasks', project_id)
+        invalidate_report_cache(user_id)
+        _forget_current_context(task_id=task_id)
         log.info(f"Task {task_id} renamed to '{new_name}' successfully.")
         renamed = True
     except sqlite3.Error as e:
         log.error(f"Database error renaming task {task_id}: {e}")
         if conn: conn.rollback()
         renamed = False
-    finally:
-        if conn:
-            conn.close()
     return renamed
 
-def delete_task(task_id):
-    """Deletes a task. Associated sessions are handled by CASCADE constraints."""
+def delete_task(user_id, task_id):
+    """Deletes a task in one of the user's projects. Associated sessions are handled by CASCADE constraints."""
+    flush_pomodoro_sessions()
     conn = None
     deleted = False
     try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.execute("PRAGMA foreign_keys = ON") # Ensure constraints are enforced
+        conn = get_cached_connection()
         cursor = conn.cursor()
+        owned = cursor.execute(_SQL_OWNED_TASK, (task_id, user_id)).fetchone()
+        if not owned:
+            log.warning(f"User {user_id} attempted to delete non-existent or foreign task {task_id}")
+            return False
+        project_id = owned[0]
         # Clear this task as current task for any user
         cursor.execute("UPDATE users SET current_task_id = NULL WHERE current_task_id = ?", (task_id,))
 
@@ -593,63 +906,115 @@ def delete_task(task_id):
         cursor.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
 
         conn.commit()
+        invalidate_name_cache('task', task_id)
+        invalidate_list_cache('tasks', project_id)
+        invalidate_report_cache(user_id)
+        _forget_current_context(task_id=task_id)
         log.info(f"Task {task_id} deleted successfully (CASCADE handled related sessions).")
         deleted = True
     except sqlite3.Error as e:
         log.error(f"Database error during task deletion: {e}")
         if conn: conn.rollback()
         deleted = False
-    finally:
-        if conn:
-            conn.close()
     return deleted
 
-def add_pomodoro_session(user_id, start_time, duration_minutes, completed=0, session_type='work', project_id=None, task_id=None):
+# --- Buffered Session Writes ---
+# Finished sessions are queued and written in batches (one transaction per flush).
+# Anything that reads or cascades into pomodoro_sessions flushes first.
+SESSION_FLUSH_INTERVAL_SECONDS = 60
+_SQL_INSERT_SESSION = '''
+    INSERT INTO pomodoro_sessions
+    (user_id, project_id, task_id, start_time, end_time, work_duration, session_type, completed)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_pending_sessions = []
+_pending_sessions_lock = threading.Lock()
+
+def queue_pomodoro_session(user_id, start_time, duration_minutes, completed=0, session_type='work', project_id=None, task_id=None):
+    """Buffers a finished session (work or break) for the next flush.
+
+    `completed` is 1 if the full duration was run; project/task are dropped for breaks.
     """
-    Add a completed session (work or break) to the database.
-    
-    Parameters:
-    user_id (int): Telegram user ID
-    start_time (datetime): When the timer was started (initial start)
-    duration_minutes (float): Time worked/break duration in minutes
-    completed (int): 1 if the full duration was completed, 0 otherwise
-    session_type (str): 'work' or 'break'
-    project_id (int, optional): ID of the project (for work sessions)
-    task_id (int, optional): ID of the task (for work sessions)
-    
-    Returns:
-    int: The ID of the inserted session
+    # Ensure project/task are NULL if it's a break session
+    if session_type == 'break':
+        project_id = None
+        task_id = None
+    row = (user_id, project_id, task_id, start_time.isoformat(), datetime.now().isoformat(),
+           duration_minutes, session_type, completed)
+    with _pending_sessions_lock:
+        _pending_sessions.append(row)
+    invalidate_report_cache(user_id)
+    log.debug(f"Queued {session_type} session for user {user_id}.")
+
+def _invalidate_flushed_reports(rows):
+    """Drops reports cached between the rows leaving the buffer and their commit."""
+    for user_id in {row[0] for row in rows}:
+        invalidate_report_cache(user_id)
+
+def flush_pomodoro_sessions():
+    """Writes all buffered sessions. Returns the number of rows written."""
+    with _pending_sessions_lock:
+        if not _pending_sessions:
+            return 0
+        rows = _pending_sessions[:]
+        _pending_sessions.clear()
+    conn = get_cached_connection()
+    try:
+        with conn:
+            conn.executemany(_SQL_INSERT_SESSION, rows)
+        _invalidate_flushed_reports(rows)
+        log.info(f"Flushed {len(rows)} buffered session(s).")
+        return len(rows)
+    except sqlite3.IntegrityError as e:
+        # A referenced project/task vanished; write the rows one by one and drop the bad ones
+        log.warning(f"Batch session insert failed ({e}); retrying row by row.")
+        written = 0
+        for row in rows:
+            try:
+                with conn:
+                    conn.execute(_SQL_INSERT_SESSION, row)
+                written += 1
+            except sqlite3.IntegrityError as row_err:
+                log.error(f"Dropping buffered session for user {row[0]}: {row_err}")
+        _invalidate_flushed_reports(rows)
+        return written
+    except sqlite3.Error as e:
+        log.error(f"Database error flushing {len(rows)} buffered session(s): {e}")
+        with _pending_sessions_lock:
+            _pending_sessions[:0] = rows # Keep them for the next attempt
+        return 0
+
+# --- Active Timer Snapshots ---
+def save_active_timers(rows) -> bool:
+    """Replaces the stored timer snapshot in one transaction.
+
+    Each row is (user_id, state, session_type, duration, accumulated_time,
+    start_time_iso, initial_start_time_iso, project_id, task_id).
     """
-    conn = None
-    session_id = None
+    conn = get_cached_connection()
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        start_time_str = start_time.isoformat()
-        end_time_str = datetime.now().isoformat() 
-        
-        # Ensure project/task are NULL if it's a break session
-        if session_type == 'break':
-            project_id = None
-            task_id = None
+        with conn:
+            conn.execute("DELETE FROM active_timers")
+            conn.executemany(
+                "INSERT INTO active_timers (user_id, state, session_type, duration, accumulated_time, start_time, initial_start_time, project_id, task_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return True
+    except sqlite3.Error as e:
+        log.error(f"Database error saving {len(rows)} active timer(s): {e}")
+        return False
 
-        cursor.execute('''
-            INSERT INTO pomodoro_sessions 
-            (user_id, project_id, task_id, start_time, end_time, work_duration, session_type, completed)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, project_id, task_id, start_time_str, end_time_str, duration_minutes, session_type, completed))
-        
-        session_id = cursor.lastrowid
-        conn.commit()
-        log.info(f"Added {session_type} session {session_id} for user {user_id}.")
+def get_active_timers():
+    """Returns the stored timer snapshot rows (same layout as save_active_timers)."""
+    try:
+        conn = get_cached_connection()
+        return conn.execute(
+            "SELECT user_id, state, session_type, duration, accumulated_time, start_time, initial_start_time, project_id, task_id FROM active_timers"
+        ).fetchall()
     except sqlite3.Error as e:
-        log.error(f"Database error adding {session_type} session for user {user_id}: {e}")
-        session_id = None
-    finally:
-        if conn:
-            conn.close()
-    return session_id
+        log.error(f"Database error loading active timers: {e}")
+        return []
 
 # Helper function to structure report data
 def _structure_report_data(rows):
@@ -693,50 +1058,38 @@ def get_daily_report(user_id: int, offset: int = 0):
         total_minutes (float): Total minutes worked for that day.
         detailed_breakdown (list): Project/task breakdown for that day.
     """
+    cached = _get_cached_report('daily', user_id, offset)
+    if cached is not None:
+        return cached
+    flush_pomodoro_sessions()
     conn = None
     report_date = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         
-        # Calculate the target date based on the offset
-        cursor.execute("SELECT DATE('now', ?, 'localtime')", (f"{offset} days",))
+        # Calculate the target date (and the day after, as the exclusive bound) based on the offset
+        cursor.execute(_SQL_DATE_RANGE_DAYS, (f"{offset} days", f"{offset + 1} days"))
         target_date_result = cursor.fetchone()
         if not target_date_result:
             log.error(f"Could not calculate target date for offset {offset}")
             return None, 0.0, []
-        report_date = target_date_result[0]
+        report_date, next_date = target_date_result
         
         # Get detailed breakdown by project and task for the target date
-        cursor.execute('''
-            SELECT 
-                p.project_name, 
-                t.task_name, 
-                SUM(COALESCE(ps.work_duration, 0)) as task_minutes
-            FROM pomodoro_sessions ps
-            JOIN projects p ON ps.project_id = p.project_id
-            JOIN tasks t ON ps.task_id = t.task_id
-            WHERE ps.user_id = ? 
-              AND DATE(ps.start_time) = ? 
-              AND ps.session_type = 'work'
-              AND ps.project_id IS NOT NULL
-              AND ps.task_id IS NOT NULL
-            GROUP BY ps.project_id, ps.task_id, p.project_name, t.task_name
-            ORDER BY p.project_name, task_minutes DESC
-        ''', (user_id, report_date))
+        cursor.execute(_SQL_REPORT_BREAKDOWN, (user_id, report_date, next_date))
         
         rows = cursor.fetchall()
         total_minutes, detailed_breakdown = _structure_report_data(rows)
         
         log.debug(f"Generated daily report for user {user_id}, date {report_date}, offset {offset}")
-        return (report_date, total_minutes, detailed_breakdown)
+        result = (report_date, total_minutes, detailed_breakdown)
+        _cache_report('daily', user_id, offset, result)
+        return result
         
     except sqlite3.Error as e:
         log.error(f"Database error getting daily report for user {user_id}, offset {offset}: {e}", exc_info=True)
         return None, 0.0, [] 
-    finally:
-        if conn:
-            conn.close()
 
 def get_weekly_report(user_id: int, offset: int = 0):
     """
@@ -753,77 +1106,46 @@ def get_weekly_report(user_id: int, offset: int = 0):
         daily_breakdown (list): List of (date_str, minutes) tuples for that week.
         detailed_project_task_breakdown (list): Project/task breakdown for that week.
     """
+    cached = _get_cached_report('weekly', user_id, offset)
+    if cached is not None:
+        return cached
+    flush_pomodoro_sessions()
     conn = None
     week_start_date = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
 
         # Calculate week start/end based on offset
         # offset * 7 days shifts to the target week, 'weekday 0' finds Monday, '-6 days' adjusts to start of week
         week_start_modifier = f"{offset * 7 - 6} days"
         week_end_modifier = f"{offset * 7 + 1} days"
-        cursor.execute("SELECT DATE('now', 'weekday 0', ?, 'localtime')", (week_start_modifier,))
-        week_start_result = cursor.fetchone()
-        cursor.execute("SELECT DATE('now', 'weekday 0', ?, 'localtime')", (week_end_modifier,))
-        week_end_result = cursor.fetchone()
+        cursor.execute(_SQL_WEEK_RANGE, (week_start_modifier, week_end_modifier))
+        week_range_result = cursor.fetchone()
 
-        if not week_start_result or not week_end_result:
+        if not week_range_result:
             log.error(f"Could not calculate week dates for offset {offset}")
             return None, 0.0, [], []
-        week_start_date = week_start_result[0]
-        week_end_date_exclusive = week_end_result[0]
+        week_start_date, week_end_date_exclusive = week_range_result
 
         # Get WORK breakdown by day
-        conn.row_factory = sqlite3.Row  # Use Row factory for daily breakdown
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT DATE(start_time) as day, SUM(COALESCE(work_duration, 0)) as minutes
-            FROM pomodoro_sessions
-            WHERE user_id = ?
-            AND DATE(start_time) >= ?
-            AND DATE(start_time) < ?
-            AND session_type = 'work'
-            GROUP BY day
-            ORDER BY day
-        ''', (user_id, week_start_date, week_end_date_exclusive))
-        daily_breakdown = [(row['day'], row['minutes']) for row in cursor.fetchall()]
-        
-        # Reset row_factory to get tuples for project/task breakdown
-        conn.row_factory = None 
-        cursor = conn.cursor() 
+        cursor.execute(_SQL_REPORT_DAILY_TOTALS, (user_id, week_start_date, week_end_date_exclusive))
+        daily_breakdown = cursor.fetchall() # [(day, minutes), ...]
 
         # Get detailed project/task breakdown for the week
-        cursor.execute('''
-            SELECT 
-                p.project_name, 
-                t.task_name, 
-                SUM(COALESCE(ps.work_duration, 0)) as task_minutes
-            FROM pomodoro_sessions ps
-            JOIN projects p ON ps.project_id = p.project_id
-            JOIN tasks t ON ps.task_id = t.task_id
-            WHERE ps.user_id = ? 
-              AND DATE(ps.start_time) >= ?
-              AND DATE(ps.start_time) < ?
-              AND ps.session_type = 'work'
-              AND ps.project_id IS NOT NULL
-              AND ps.task_id IS NOT NULL
-            GROUP BY ps.project_id, ps.task_id, p.project_name, t.task_name
-            ORDER BY p.project_name, task_minutes DESC
-        ''', (user_id, week_start_date, week_end_date_exclusive))
+        cursor.execute(_SQL_REPORT_BREAKDOWN, (user_id, week_start_date, week_end_date_exclusive))
         
         rows = cursor.fetchall()
         total_minutes, detailed_project_task_breakdown = _structure_report_data(rows)
 
         log.debug(f"Generated weekly report for user {user_id}, week starting {week_start_date}, offset {offset}")
-        return (week_start_date, total_minutes, daily_breakdown, detailed_project_task_breakdown)
+        result = (week_start_date, total_minutes, daily_breakdown, detailed_project_task_breakdown)
+        _cache_report('weekly', user_id, offset, result)
+        return result
 
     except sqlite3.Error as e:
         log.error(f"Database error getting weekly report for user {user_id}, offset {offset}: {e}", exc_info=True)
         return None, 0.0, [], []
-    finally:
-        if conn:
-            conn.close()
 
 def get_monthly_report(user_id: int, offset: int = 0):
     """
@@ -839,63 +1161,48 @@ def get_monthly_report(user_id: int, offset: int = 0):
         total_minutes (float): Total minutes worked for that month.
         detailed_breakdown (list): Project/task breakdown for that month.
     """
+    cached = _get_cached_report('monthly', user_id, offset)
+    if cached is not None:
+        return cached
+    flush_pomodoro_sessions()
     conn = None
     month_start_date = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         
         # Calculate the target month's start and end dates
         month_start_modifier = f"{offset} months"
         next_month_start_modifier = f"{offset + 1} months"
-        cursor.execute("SELECT DATE('now', 'start of month', ?, 'localtime')", (month_start_modifier,))
-        month_start_result = cursor.fetchone()
-        cursor.execute("SELECT DATE('now', 'start of month', ?, 'localtime')", (next_month_start_modifier,))
-        next_month_start_result = cursor.fetchone()
+        cursor.execute(_SQL_MONTH_RANGE, (month_start_modifier, next_month_start_modifier))
+        month_range_result = cursor.fetchone()
         
-        if not month_start_result or not next_month_start_result:
+        if not month_range_result:
             log.error(f"Could not calculate month dates for offset {offset}")
             return None, 0.0, []
-        month_start_date = month_start_result[0]
-        next_month_start_date = next_month_start_result[0]
+        month_start_date, next_month_start_date = month_range_result
 
         # Get detailed project/task breakdown for the month
-        cursor.execute('''
-            SELECT 
-                p.project_name, 
-                t.task_name, 
-                SUM(COALESCE(ps.work_duration, 0)) as task_minutes
-            FROM pomodoro_sessions ps
-            JOIN projects p ON ps.project_id = p.project_id
-            JOIN tasks t ON ps.task_id = t.task_id
-            WHERE ps.user_id = ? 
-              AND DATE(ps.start_time) >= ?
-              AND DATE(ps.start_time) < ?
-              AND ps.session_type = 'work'
-              AND ps.project_id IS NOT NULL
-              AND ps.task_id IS NOT NULL
-            GROUP BY ps.project_id, ps.task_id, p.project_name, t.task_name
-            ORDER BY p.project_name, task_minutes DESC
-        ''', (user_id, month_start_date, next_month_start_date))
+        cursor.execute(_SQL_REPORT_BREAKDOWN, (user_id, month_start_date, next_month_start_date))
         
         rows = cursor.fetchall()
         total_minutes, detailed_breakdown = _structure_report_data(rows)
         
         log.debug(f"Generated monthly report for user {user_id}, month starting {month_start_date}, offset {offset}")
-        return (month_start_date, total_minutes, detailed_breakdown)
+        result = (month_start_date, total_minutes, detailed_breakdown)
+        _cache_report('monthly', user_id, offset, result)
+        return result
 
     except sqlite3.Error as e:
         log.error(f"Database error getting monthly report for user {user_id}, offset {offset}: {e}", exc_info=True)
         return None, 0.0, []
-    finally:
-        if conn:
-            conn.close()
 
 def get_last_session_details(user_id: int, task_id: int) -> tuple | None:
     """Fetches the details (session_id, start_time, type) of the most recent session for a given task and user."""
+    flush_pomodoro_sessions()
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute(
             """
@@ -911,9 +1218,6 @@ def get_last_session_details(user_id: int, task_id: int) -> tuple | None:
     except sqlite3.Error as e:
         log.error(f"Error fetching last session details for user {user_id}, task {task_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 # --- Google Credentials --- 
 def store_google_credentials(user_id, credentials_json: str):
@@ -921,7 +1225,7 @@ def store_google_credentials(user_id, credentials_json: str):
     conn = None
     success = False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET google_credentials_json = ? WHERE user_id = ?", (credentials_json, user_id))
         conn.commit()
@@ -932,16 +1236,14 @@ def store_google_credentials(user_id, credentials_json: str):
              log.warning(f"Attempted to store Google credentials for non-existent user {user_id}.")
     except sqlite3.Error as e:
         log.error(f"Database error storing Google credentials for user {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+        if conn: conn.rollback()
     return success
 
 def get_google_credentials(user_id):
     """Retrieves the user's Google OAuth credentials JSON string."""
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT google_credentials_json FROM users WHERE user_id = ?", (user_id,))
         result = cursor.fetchone()
@@ -954,16 +1256,13 @@ def get_google_credentials(user_id):
     except sqlite3.Error as e:
         log.error(f"Database error retrieving Google credentials for user {user_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 def store_google_sheet_id(user_id: int, sheet_id: str):
     """Stores the user's default Google Sheet ID."""
     conn = None
     success = False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET google_sheet_id = ? WHERE user_id = ?", (sheet_id, user_id))
         conn.commit()
@@ -974,16 +1273,14 @@ def store_google_sheet_id(user_id: int, sheet_id: str):
             log.warning(f"Attempted to store Google Sheet ID for non-existent user {user_id}.")
     except sqlite3.Error as e:
         log.error(f"Database error storing Google Sheet ID for user {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+        if conn: conn.rollback()
     return success
 
 def get_google_sheet_id(user_id: int):
     """Retrieves the user's default Google Sheet ID."""
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT google_sheet_id FROM users WHERE user_id = ?", (user_id,))
         result = cursor.fetchone()
@@ -996,9 +1293,6 @@ def get_google_sheet_id(user_id: int):
     except sqlite3.Error as e:
         log.error(f"Database error retrieving Google Sheet ID for user {user_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 # --- Jira Credentials ---
 def store_jira_credentials(user_id, credentials_json: str, cloud_id: str):
@@ -1006,7 +1300,7 @@ def store_jira_credentials(user_id, credentials_json: str, cloud_id: str):
     conn = None
     success = False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET jira_credentials_json = ?, jira_cloud_id = ? WHERE user_id = ?", (credentials_json, cloud_id, user_id))
         conn.commit()
@@ -1017,16 +1311,14 @@ def store_jira_credentials(user_id, credentials_json: str, cloud_id: str):
             log.warning(f"Attempted to store Jira credentials for non-existent user {user_id}.")
     except sqlite3.Error as e:
         log.error(f"Database error storing Jira credentials for user {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+        if conn: conn.rollback()
     return success
 
 def get_jira_credentials(user_id):
     """Retrieves the user's Jira OAuth credentials JSON string and cloud_id."""
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT jira_credentials_json, jira_cloud_id FROM users WHERE user_id = ?", (user_id,))
         result = cursor.fetchone()
@@ -1039,24 +1331,19 @@ def get_jira_credentials(user_id):
     except sqlite3.Error as e:
         log.error(f"Database error retrieving Jira credentials for user {user_id}: {e}")
         return None, None
-    finally:
-        if conn:
-            conn.close()
 
 def clear_jira_credentials(user_id):
     """Removes the user's Jira OAuth credentials and cloud_id."""
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET jira_credentials_json = NULL, jira_cloud_id = NULL WHERE user_id = ?", (user_id,))
         conn.commit()
         log.info(f"Cleared Jira credentials for user {user_id}.")
     except sqlite3.Error as e:
         log.error(f"Database error clearing Jira credentials for user {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+        if conn: conn.rollback()
 
 # --- Data Export Functions ---
 def get_all_user_sessions_for_export(user_id):
@@ -1064,9 +1351,10 @@ def get_all_user_sessions_for_export(user_id):
     Retrieves all session data for a user, joining project/task names.
     Returns a list of lists, suitable for CSV or Sheets export, including headers.
     """
+    flush_pomodoro_sessions()
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         
         # Select relevant columns, join with projects and tasks, handle NULLs
@@ -1097,9 +1385,6 @@ def get_all_user_sessions_for_export(user_id):
     except sqlite3.Error as e:
         log.error(f"Database error retrieving sessions for export for user {user_id}: {e}")
         return None # Return None on error
-    finally:
-        if conn:
-            conn.close()
 
 # --- Initialization ---
 if __name__ == '__main__':
@@ -1116,7 +1401,7 @@ def set_admin(user_id: int) -> bool:
     conn = None
     success = False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         # Reset any other admins first to ensure only one (optional, depends on design)
         # cursor.execute("UPDATE users SET is_admin = 0 WHERE is_admin = 1")
@@ -1130,9 +1415,6 @@ def set_admin(user_id: int) -> bool:
     except sqlite3.Error as e:
         log.error(f"DB error setting admin for user {user_id}: {e}")
         if conn: conn.rollback()
-    finally:
-        if conn:
-            conn.close()
     return success
 
 def is_user_admin(user_id: int) -> bool:
@@ -1140,7 +1422,7 @@ def is_user_admin(user_id: int) -> bool:
     conn = None
     is_admin = False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT is_admin FROM users WHERE user_id = ?", (user_id,))
         result = cursor.fetchone()
@@ -1148,9 +1430,6 @@ def is_user_admin(user_id: int) -> bool:
             is_admin = True
     except sqlite3.Error as e:
         log.error(f"DB error checking admin status for user {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
     log.debug(f"Admin check for user {user_id}: {is_admin}")
     return is_admin
 
@@ -1159,7 +1438,7 @@ def check_if_admin_exists() -> bool:
     conn = None
     admin_exists = False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         # Check if any row has is_admin = 1
         cursor.execute("SELECT 1 FROM users WHERE is_admin = 1 LIMIT 1")
@@ -1167,9 +1446,6 @@ def check_if_admin_exists() -> bool:
             admin_exists = True
     except sqlite3.Error as e:
         log.error(f"DB error checking if admin exists: {e}")
-    finally:
-        if conn:
-            conn.close()
     log.debug(f"Admin exists check: {admin_exists}")
     return admin_exists
 
@@ -1178,7 +1454,7 @@ def get_admin_user_id() -> int | None:
     conn = None
     admin_id = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT user_id FROM users WHERE is_admin = 1 LIMIT 1")
         result = cursor.fetchone()
@@ -1186,9 +1462,6 @@ def get_admin_user_id() -> int | None:
             admin_id = result[0]
     except sqlite3.Error as e:
         log.error(f"DB error getting admin user ID: {e}")
-    finally:
-        if conn:
-            conn.close()
     log.debug(f"Admin user ID found: {admin_id}")
     return admin_id
 
@@ -1198,7 +1471,7 @@ def get_setting(key: str, default: str | None = None) -> str | None:
     conn = None
     value = default
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT setting_value FROM bot_settings WHERE setting_key = ?", (key,))
         result = cursor.fetchone()
@@ -1206,9 +1479,6 @@ def get_setting(key: str, default: str | None = None) -> str | None:
             value = result[0]
     except sqlite3.Error as e:
         log.error(f"DB error getting setting '{key}': {e}")
-    finally:
-        if conn:
-            conn.close()
     log.debug(f"Setting '{key}' value: {value}")
     return value
 
@@ -1217,7 +1487,7 @@ def set_setting(key: str, value: str) -> bool:
     conn = None
     success = False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("INSERT OR REPLACE INTO bot_settings (setting_key, setting_value) VALUES (?, ?)", (key, value))
         conn.commit()
@@ -1226,9 +1496,6 @@ def set_setting(key: str, value: str) -> bool:
     except sqlite3.Error as e:
         log.error(f"DB error setting '{key}' to '{value}': {e}")
         if conn: conn.rollback()
-    finally:
-        if conn:
-            conn.close()
     return success
 
 # --- Statistics Functions ---
@@ -1237,7 +1504,7 @@ def get_total_users() -> int:
     conn = None
     count = 0
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM users")
         result = cursor.fetchone()
@@ -1245,9 +1512,6 @@ def get_total_users() -> int:
             count = result[0]
     except sqlite3.Error as e:
         log.error(f"DB error getting total users: {e}")
-    finally:
-        if conn:
-            conn.close()
     return count
 
 def get_total_projects() -> int:
@@ -1255,7 +1519,7 @@ def get_total_projects() -> int:
     conn = None
     count = 0
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM projects")
         result = cursor.fetchone()
@@ -1263,9 +1527,6 @@ def get_total_projects() -> int:
             count = result[0]
     except sqlite3.Error as e:
         log.error(f"DB error getting total projects: {e}")
-    finally:
-        if conn:
-            conn.close()
     return count
 
 def get_total_tasks() -> int:
@@ -1273,7 +1534,7 @@ def get_total_tasks() -> int:
     conn = None
     count = 0
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM tasks")
         result = cursor.fetchone()
@@ -1281,17 +1542,15 @@ def get_total_tasks() -> int:
             count = result[0]
     except sqlite3.Error as e:
         log.error(f"DB error getting total tasks: {e}")
-    finally:
-        if conn:
-            conn.close()
     return count
 
 def get_total_work_minutes() -> float:
     """Gets the total summed work duration (in minutes) across all work sessions."""
+    flush_pomodoro_sessions()
     conn = None
     total_minutes = 0.0
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
         # Sum only 'work' sessions, handling NULL duration just in case
         cursor.execute("SELECT SUM(COALESCE(work_duration, 0)) FROM pomodoro_sessions WHERE session_type = 'work'")
@@ -1300,101 +1559,98 @@ def get_total_work_minutes() -> float:
             total_minutes = result[0]
     except sqlite3.Error as e:
         log.error(f"DB error getting total work minutes: {e}")
-    finally:
-        if conn:
-            conn.close()
     return total_minutes
 
-# --- Project Management ---
-def mark_project_status(project_id: int, status: int) -> bool:
-    """Updates the status of a project."""
+# --- Project/Task Status ---
+def mark_task_status(user_id: int, task_id: int, status: int) -> bool:
+    """Updates the status of a task in one of the user's projects."""
     conn = None
     success = False
     if status not in [STATUS_ACTIVE, STATUS_DONE]:
-        log.warning(f"Invalid status ({status}) provided for project {project_id}.")
+        log.warning(f"Invalid status ({status}) provided for task {task_id}.")
         return False
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_cached_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE projects SET status = ? WHERE project_id = ?", (status, project_id))
+        owned = cursor.execute(_SQL_OWNED_TASK, (task_id, user_id)).fetchone()
+        if not owned:
+            log.warning(f"Task {task_id} of user {user_id} not found for status update.")
+            return False
+        project_id = owned[0]
+        cursor.execute("UPDATE tasks SET status = ? WHERE task_id = ? AND project_id = ?", (status, task_id, project_id))
         conn.commit()
+        invalidate_list_cache('tasks', project_id)
         if cursor.rowcount > 0:
-            log.info(f"Updated status for project {project_id} to {status}.")
+            log.info(f"Updated status for task {task_id} to {status}.")
             success = True
         else:
-            log.warning(f"Project {project_id} not found for status update.")
+            log.warning(f"Task {task_id} of user {user_id} not found for status update.")
     except sqlite3.Error as e:
-        log.error(f"DB error updating status for project {project_id}: {e}")
+        log.error(f"DB error updating status for task {task_id}: {e}")
         if conn: conn.rollback()
-    finally:
-        if conn:
-            conn.close()
     return success
 
-def get_project_status(project_id: int) -> int | None:
-    """Gets the status of a specific project."""
-    conn = None
+def mark_project_status_and_list(user_id: int, project_id: int, status: int, list_status: int):
+    """Updates one of the user's projects and fetches their projects with list_status, in one transaction.
+
+    Used by list redraws after archiving/reactivating. Returns (project_name, projects)
+    or None if the user has no such project or on error.
+    """
+    if status not in [STATUS_ACTIVE, STATUS_DONE]:
+        log.warning(f"Invalid status ({status}) provided for project {project_id}.")
+        return None
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('SELECT status FROM projects WHERE project_id = ?', (project_id,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+        conn = get_cached_connection()
+        with conn: # Commits on success, rolls back on error
+            conn.execute("BEGIN IMMEDIATE") # Take the write lock up front; a deferred read-then-write can fail with SQLITE_BUSY
+            row = conn.execute(_SQL_OWNED_PROJECT, (project_id, user_id)).fetchone()
+            if not row:
+                log.warning(f"Project {project_id} of user {user_id} not found for status update.")
+                return None
+            project_name = row[0]
+            conn.execute("UPDATE projects SET status = ? WHERE project_id = ?", (status, project_id))
+            projects = conn.execute(_SQL_GET_PROJECTS, (user_id, list_status)).fetchall()
+        invalidate_list_cache('projects', user_id)
+        _cache_list('projects', user_id, list_status, projects)
+        log.info(f"Updated status for project {project_id} to {status}.")
+        return project_name, projects
     except sqlite3.Error as e:
-        log.error(f"Database error getting status for project {project_id}: {e}")
+        log.error(f"DB error updating status for project {project_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
-# --- Task Management ---
-def mark_task_status(task_id: int, status: int) -> bool:
-    """Updates the status of a task."""
-    conn = None
-    success = False
+def mark_task_status_and_list(user_id: int, task_id: int, status: int, list_status: int):
+    """Updates a task of one of the user's projects and fetches that project's tasks with list_status, in one transaction.
+
+    Returns (task_name, project_id, tasks) or None if the user has no such task or on error.
+    """
     if status not in [STATUS_ACTIVE, STATUS_DONE]:
         log.warning(f"Invalid status ({status}) provided for task {task_id}.")
-        return False
+        return None
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute("UPDATE tasks SET status = ? WHERE task_id = ?", (status, task_id))
-        conn.commit()
-        if cursor.rowcount > 0:
-            log.info(f"Updated status for task {task_id} to {status}.")
-            success = True
-        else:
-            log.warning(f"Task {task_id} not found for status update.")
+        conn = get_cached_connection()
+        with conn: # Commits on success, rolls back on error
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(_SQL_OWNED_TASK, (task_id, user_id)).fetchone()
+            if not row:
+                log.warning(f"Task {task_id} of user {user_id} not found for status update.")
+                return None
+            project_id, task_name = row
+            conn.execute("UPDATE tasks SET status = ? WHERE task_id = ?", (status, task_id))
+            tasks = conn.execute(_SQL_GET_TASKS, (project_id, list_status)).fetchall()
+        invalidate_list_cache('tasks', project_id)
+        _cache_list('tasks', project_id, list_status, tasks)
+        log.info(f"Updated status for task {task_id} to {status}.")
+        return task_name, project_id, tasks
     except sqlite3.Error as e:
         log.error(f"DB error updating status for task {task_id}: {e}")
-        if conn: conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-    return success
-
-def get_task_status(task_id: int) -> int | None:
-    """Gets the status of a specific task."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('SELECT status FROM tasks WHERE task_id = ?', (task_id,))
-        result = cursor.fetchone()
-        return result[0] if result else None
-    except sqlite3.Error as e:
-        log.error(f"Database error getting status for task {task_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 # --- Forwarded Messages Management ---
 def add_forwarded_message(user_id, project_id, message_text, original_sender_name, forwarded_date, tg_message_id, tg_chat_id):
     """Inserts a forwarded message into the database."""
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO forwarded_messages (user_id, project_id, message_text, original_sender_name, forwarded_date, tg_message_id, tg_chat_id)
@@ -1405,17 +1661,16 @@ def add_forwarded_message(user_id, project_id, message_text, original_sender_nam
         return cursor.lastrowid
     except sqlite3.Error as e:
         log.error(f"Database error adding forwarded message for user {user_id}: {e}")
+        if conn: conn.rollback()
         return None
-    finally:
-        if conn:
-            conn.close()
 
 def get_forwarded_messages_by_project(project_id):
     """Retrieves all forwarded messages for a given project."""
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_cached_connection()
         cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row # Callers get dictionary-like rows, as before
         cursor.execute('''
             SELECT id, user_id, message_text, original_sender_name, forwarded_date, tg_message_id, tg_chat_id
             FROM forwarded_messages WHERE project_id = ?
@@ -1425,15 +1680,13 @@ def get_forwarded_messages_by_project(project_id):
     except sqlite3.Error as e:
         log.error(f"Database error retrieving forwarded messages for project {project_id}: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
 
 def get_task_statistics(task_id):
     """Get statistics for a task (total elapsed time from completed work sessions)."""
+    flush_pomodoro_sessions()
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT
@@ -1452,15 +1705,13 @@ def get_task_statistics(task_id):
     except sqlite3.Error as e:
         log.error(f"Database error getting statistics for task {task_id}: {e}")
         return {'total_minutes': 0.0, 'session_count': 0}
-    finally:
-        if conn:
-            conn.close()
 
 def get_project_statistics(project_id):
     """Get statistics for a project (total elapsed time and task counts)."""
+    flush_pomodoro_sessions()
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_cached_connection()
         cursor = conn.cursor()
 
         # Get total work time
@@ -1491,15 +1742,13 @@ def get_project_statistics(project_id):
     except sqlite3.Error as e:
         log.error(f"Database error getting statistics for project {project_id}: {e}")
         return {'total_minutes': 0.0, 'total_tasks': 0, 'completed_tasks': 0, 'active_tasks': 0}
-    finally:
-        if conn:
-            conn.close()
 
 def get_all_tasks_with_stats(user_id):
     """Get all tasks for a user with their statistics."""
+    flush_pomodoro_sessions()
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_cached_connection()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT
@@ -1532,6 +1781,3 @@ def get_all_tasks_with_stats(user_id):
     except sqlite3.Error as e:
         log.error(f"Database error getting all tasks with stats for user {user_id}: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -116,4 +116,9 @@ async def send_admin_notification(context: ContextTypes.DEFAULT_TYPE, message: s
         await context.bot.send_message(chat_id=admin_id, text=notification_text)
         
     except Exception as e:
-        log.error(f"Failed to send admin notification: {e}", exc_info=True) 
\ No newline at end of file
+        log.error(f"Failed to send admin notification: {e}", exc_info=True)
+
+def notify_admin_in_background(context: ContextTypes.DEFAULT_TYPE, message: str):
+    """Schedules send_admin_notification without awaiting it, so user replies don't wait on it."""
+    # Application.create_task keeps a reference to the task and logs anything it raises
+    context.application.create_task(send_admin_notification(context, message), name="admin_notification") 
\ No newline at end of file
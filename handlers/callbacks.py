@@ -1,555 +1,687 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from telegram.ext import ContextTypes, ConversationHandler
+from telegram.error import BadRequest
 import database
+from state import get_pending_input
 from database import STATUS_ACTIVE, STATUS_DONE # Import status constants
-from config import timer_states # timer_states might be needed if we check active timers here
+from config import timer_states, ACTIVE_TIMER_STATES # timer_states might be needed if we check active timers here
 from . import commands as cmd_handlers # Import commands module to call list handlers
-from .commands import report_daily, report_weekly, report_monthly, start_break_timer # Import report functions and break starter
+from .commands import REPORT_HANDLERS, start_break_timer, static_button # Report handlers by type, break starter, cached buttons
 from i18n_utils import _, set_user_lang, get_language_name # Import i18n utils
 import logging # Added previously
+import re
 import sqlite3 # Need this for the exception type
-import traceback
 
 log = logging.getLogger(__name__)
 
+_SQLiteError = sqlite3.Error # Module-level alias for the except clauses below
+
+# report_nav:<type>:<offset> payload (after the prefix), validated in one pass
+_REPORT_NAV_RE = re.compile(r'^(daily|weekly|monthly):(-?\d+)$')
+
+def _delete_confirm_markup(user_id: int, confirm_callback_data: str) -> InlineKeyboardMarkup:
+    """Builds the Confirm/Cancel keyboard for a delete confirmation dialog."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(_(user_id, 'button_confirm_delete'), callback_data=confirm_callback_data)],
+        [static_button(user_id, 'button_cancel_delete', "cancel_delete")]
+    ])
+
+def _task_not_found_text(user_id: int) -> str:
+    """'Task not found' message naming the user's current project."""
+    project_name = database.get_current_context(user_id)[1] or _(user_id, 'text_current_project')
+    return _(user_id, 'task_not_found', project_name=project_name)
+
+class _QueryAck:
+    """Answers one dispatch's callback query at most once (Telegram accepts a single answer).
+
+    button_callback creates one per update and passes it to the handler as `ack`.
+    """
+    __slots__ = ('query', 'answered')
+
+    def __init__(self, query: CallbackQuery):
+        self.query = query
+        self.answered = False
+
+    async def __call__(self, text=None, show_alert=False):
+        if self.answered:
+            return
+        self.answered = True
+        await self.query.answer(text, show_alert=show_alert)
+
+async def _safe_edit(query: CallbackQuery, text: str, reply_markup=None):
+    """Edits the callback's message, ignoring Telegram's 'message is not modified' error."""
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        if 'Message is not modified' in str(e):
+            return
+        raise
+
 # --- Helper Functions for Displaying Lists --- 
 
+async def _render_archived_projects(query: CallbackQuery, user_id: int, projects):
+    """Shows the archived projects list built from already-fetched rows."""
+    title = _(user_id, 'archived_projects_title')
+    if not projects:
+         keyboard = [[static_button(user_id, 'archived_project_no_archive', "noop_no_archive")]]
+    else:
+         reactivate_label = _(user_id, 'button_reactivate') # Same label on every row
+         encode = cmd_handlers.encode_callback_id
+         keyboard = [
+             [
+                 InlineKeyboardButton(project_name, callback_data=f"noop_project:{encode(project_id)}"),
+                 InlineKeyboardButton(reactivate_label, callback_data=f"mark_project_active:{encode(project_id)}")
+             ]
+             for project_id, project_name in projects
+         ]
+    keyboard.append([static_button(user_id, 'button_back_to_active_projects', "list_projects_active")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await _safe_edit(query, title, reply_markup=reply_markup)
+    log.debug(f"Displayed archived projects for user {user_id}.")
+
 async def _display_archived_projects(query: CallbackQuery, user_id: int):
     """Helper to fetch and display the archived projects list."""
     try:
         projects = database.get_projects(user_id, status=STATUS_DONE)
-        keyboard = []
-        title = _(user_id, 'archived_projects_title')
-        if not projects:
-             keyboard.append([InlineKeyboardButton(_(user_id, 'archived_project_no_archive'), callback_data="noop_no_archive")])
-        else:
-             for project_id, project_name in projects:
-                 keyboard.append([
-                     InlineKeyboardButton(project_name, callback_data=f"noop_project:{project_id}"), 
-                     InlineKeyboardButton(_(user_id, 'button_reactivate'), callback_data=f"mark_project_active:{project_id}")
-                 ])
-        keyboard.append([InlineKeyboardButton(_(user_id, 'button_back_to_active_projects'), callback_data="list_projects_active")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(title, reply_markup=reply_markup)
-        log.debug(f"Displayed archived projects for user {user_id}.")
+        await _render_archived_projects(query, user_id, projects)
     except Exception as e:
         log.error(f"Error displaying archived projects for user {user_id}: {e}", exc_info=True)
         try: await query.edit_message_text(_(user_id, 'error_list_archived_projects'))
         except Exception: pass # Ignore if edit fails
 
+async def _render_archived_tasks(query: CallbackQuery, user_id: int, project_id: int, tasks, project_name=None):
+    """Shows a project's archived tasks list built from already-fetched rows."""
+    project_name = project_name or database.get_project_name(project_id) or _(user_id, 'text_selected_project')
+    title = _(user_id, 'archived_tasks_title', project_name=project_name)
+    if not tasks:
+        keyboard = [[static_button(user_id, 'archived_task_no_archive', "noop_no_archive")]]
+    else:
+         reactivate_label = _(user_id, 'button_reactivate') # Same label on every row
+         encode = cmd_handlers.encode_callback_id
+         keyboard = [
+             [
+                 InlineKeyboardButton(task_name, callback_data=f"noop_task:{encode(task_id)}"),
+                 InlineKeyboardButton(reactivate_label, callback_data=f"mark_task_active:{encode(task_id)}")
+             ]
+             for task_id, task_name in tasks
+         ]
+    keyboard.append([static_button(user_id, 'button_back_to_active_tasks', "list_tasks_active")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await _safe_edit(query, title, reply_markup=reply_markup)
+    log.debug(f"Displayed archived tasks for user {user_id} in project {project_id}.")
+
 async def _display_archived_tasks(query: CallbackQuery, user_id: int):
     """Helper to fetch and display the archived tasks list for the current project."""
     try:
-        current_project_id = database.get_current_project(user_id)
-        if not current_project_id:
+        current_project = database.get_current_project_with_name(user_id)
+        if not current_project:
              await query.edit_message_text(_(user_id, 'task_create_no_project'))
              return
-        project_name = database.get_project_name(current_project_id) or _(user_id, 'text_selected_project')
+        current_project_id, project_name = current_project
         tasks = database.get_tasks(current_project_id, status=STATUS_DONE)
-        keyboard = []
-        title = _(user_id, 'archived_tasks_title', project_name=project_name)
-        if not tasks:
-            keyboard.append([InlineKeyboardButton(_(user_id, 'archived_task_no_archive'), callback_data="noop_no_archive")])
-        else:
-             for task_id, task_name in tasks:
-                 keyboard.append([
-                     InlineKeyboardButton(task_name, callback_data=f"noop_task:{task_id}"),
-                     InlineKeyboardButton(_(user_id, 'button_reactivate'), callback_data=f"mark_task_active:{task_id}")
-                 ])
-        keyboard.append([InlineKeyboardButton(_(user_id, 'button_back_to_active_tasks'), callback_data="list_tasks_active")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(title, reply_markup=reply_markup)
-        log.debug(f"Displayed archived tasks for user {user_id} in project {current_project_id}.")
+        await _render_archived_tasks(query, user_id, current_project_id, tasks, project_name)
     except Exception as e:
         log.error(f"Error displaying archived tasks for user {user_id}: {e}", exc_info=True)
         try: await query.edit_message_text(_(user_id, 'error_list_archived_tasks'))
         except Exception: pass
 
+def _schedule_redraw(context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, redraw):
+    """Runs a list redraw in the background so the callback returns right after its DB write."""
+    async def _run():
+        try:
+            await redraw
+        except Exception as e:
+            log.error(f"Error redrawing list for user {user_id}: {e}", exc_info=True)
+            # The query was already answered by the handler, so report the failure in the chat
+            try: await query.message.reply_text(_(user_id, 'error_generic'))
+            except Exception: pass
+    context.application.create_task(_run())
+
+# --- Specific No-op Callbacks with Instructions ---
+async def _h_noop_create_project(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `noop_create_project` callback."""
+    log.debug(f"Handling create project instruction callback: {query.data}")
+    await query.edit_message_text(text=_(user_id, 'instruction_create_project'))
+
+async def _h_noop_create_task(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `noop_create_task` callback."""
+    log.debug(f"Handling create task instruction callback: {query.data}")
+    project_name = database.get_current_context(user_id)[1] or _(user_id, 'text_current_project')
+    await query.edit_message_text(text=_(user_id, 'instruction_create_task', project_name=project_name))
+
+# --- Report Navigation Callback ---
+async def _h_report_nav(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `report_nav:<type>:<offset>` callback."""
+    match = _REPORT_NAV_RE.match(arg)
+    if not match:
+        log.warning(f"Invalid report navigation callback data: {query.data}")
+        await ack("Error processing navigation.")
+        return
+    report_type, offset = match.group(1), int(match.group(2))
+    try:
+        log.info(f"Handling report navigation: type={report_type}, offset={offset} for user {user_id}")
+        await REPORT_HANDLERS[report_type](update, context, offset=offset)
+    except Exception as e:
+        # Catch other potential errors during report generation
+        log.error(f"Error during report navigation callback '{query.data}': {e}", exc_info=True)
+        await ack("An error occurred generating the report.")
+        # Attempt to edit the message to show error, might fail if original message deleted
+        try: await query.edit_message_text("An error occurred generating the report.")
+        except Exception: pass
+
+# --- Deprecated Report Callbacks (kept for safety, but should be unused now) ---
+async def _h_deprecated_report(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the legacy `report_daily|weekly|monthly` callbacks by showing the current period."""
+    report_type = query.data.removeprefix("report_")
+    log.info(f"User {user_id} triggered DEPRECATED {report_type} report via callback. Redirecting.")
+    await REPORT_HANDLERS[report_type](update, context, offset=0)
+
+# --- Selection Callbacks ---
+async def _h_select_project(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `select_project:<id>` callback."""
+    try:
+        project_id = cmd_handlers.decode_callback_id(arg)
+        project_name = database.get_owned_project_name(user_id, project_id)
+        if project_name is None:
+            log.warning(f"User {user_id} tried to select non-existent or foreign project {project_id} via callback.")
+            await query.edit_message_text(text=_(user_id, 'project_not_found'))
+            return
+
+        database.set_current_project(user_id, project_id) # Also clears the current task
+        log.info(f"User {user_id} selected project {project_id} ('{project_name}') via callback.")
+        await query.edit_message_text(text=_(user_id, 'project_selected_callback', project_name=project_name)) # New key
+    except (IndexError, ValueError) as e:
+        log.warning(f"Error parsing select_project callback data '{query.data}' for user {user_id}: {e}")
+        await query.edit_message_text(text=_(user_id, 'error_processing_selection'))
+    except _SQLiteError as e:
+        log.error(f"DB Error selecting project via callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text(text=_(user_id, 'error_selecting_project_db'))
+    except Exception as e:
+        log.error(f"Unexpected error handling select_project callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text(text=_(user_id, 'error_selecting_project_unexpected'))
+
+async def _h_select_task(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `select_task:<task_id>[:<project_id>]` callback."""
+    try:
+        task_part, _sep, project_part = arg.partition(":")
+        task_id = cmd_handlers.decode_callback_id(task_part)
+        # Newer buttons carry the parent project ID; older ones fall back to the current project
+        if project_part:
+            current_project_id = cmd_handlers.decode_callback_id(project_part)
+        else:
+            current_project_id = database.get_current_project(user_id)
+        if not current_project_id:
+             log.warning(f"User {user_id} tried to select task via callback with no project selected.")
+             await query.edit_message_text(text=_(user_id, 'error_selecting_task_no_project'))
+             return
+
+        owned = database.get_owned_task(user_id, task_id)
+        if owned is None or owned[0] != current_project_id:
+            log.warning(f"User {user_id} tried to select non-existent/mismatched task ID {task_id} via callback.")
+            await query.edit_message_text(text=_(user_id, 'error_task_not_found_or_mismatch'))
+            return
+        task_name = owned[1]
+
+        # Select the task's project too: the list may be older than the current selection
+        database.set_current_selection(user_id, current_project_id, task_id)
+        log.info(f"User {user_id} selected task {task_id} ('{task_name}') via callback.")
+        await query.edit_message_text(text=_(user_id, 'task_selected_callback', task_name=task_name)) # New key
+    except (IndexError, ValueError) as e:
+         log.warning(f"Error parsing select_task callback data '{query.data}' for user {user_id}: {e}")
+         await query.edit_message_text(text=_(user_id, 'error_processing_selection'))
+    except _SQLiteError as e:
+        log.error(f"DB Error selecting task via callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text(text=_(user_id, 'error_selecting_task_db'))
+    except Exception as e:
+        log.error(f"Unexpected error handling select_task callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text(text=_(user_id, 'error_selecting_task_unexpected'))
+
+async def _h_forwarded_select_project(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `forwarded_select_project:<id>` callback."""
+    try:
+        project_id = cmd_handlers.decode_callback_id(arg)
+        # Call the handler but capture its return value for conversation state
+        conversation_state = await cmd_handlers.handle_forwarded_project_selection(update, context, project_id)
+        # Return the conversation state to the ConversationHandler
+        return conversation_state
+    except (IndexError, ValueError):
+        log.warning(f"Error parsing forwarded_select_project callback data '{query.data}' for user {user_id}")
+        await query.edit_message_text(_(user_id, 'error_processing_selection'))
+        return ConversationHandler.END
+    except Exception as e:
+        log.error(f"Unexpected error handling forwarded_select_project callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text(_(user_id, 'error_selecting_project_unexpected'))
+        return ConversationHandler.END
+
+async def _h_forwarded_create_new_project(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `forwarded_create_new_project` callback."""
+    try:
+        log.info(f"User {user_id} clicked 'Create New Project' for forwarded message")
+        # Call the handler but capture its return value for conversation state
+        conversation_state = await cmd_handlers.handle_forwarded_create_new_project(update, context)
+        # Return the conversation state to the ConversationHandler
+        return conversation_state
+    except Exception as e:
+        log.error(f"Unexpected error handling forwarded_create_new_project callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text(_(user_id, 'error_unexpected'))
+        # Return ConversationHandler.END on error
+        return ConversationHandler.END
+
+async def _h_cancel_forwarded_message(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `cancel_forwarded_message` callback."""
+    log.info(f"User {user_id} cancelled the forwarded message workflow")
+    # Clear any pending data
+    state = get_pending_input(context.user_data, user_id)
+    state.pending_forwarded_message = None
+    state.expecting_forwarded_project_name = False
+
+    await query.edit_message_text(_(user_id, 'forwarded_workflow_cancelled'))
+    return ConversationHandler.END
+
+# --- Deletion Callbacks ---
+async def _h_cancel_delete(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `cancel_delete` callback."""
+    log.debug(f"User {user_id} cancelled deletion via callback.")
+    await query.edit_message_text(text=_(user_id, 'deletion_cancelled'))
+
+async def _h_confirm_delete_project(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `confirm_delete_project:<id>` callback."""
+    try:
+        project_id = cmd_handlers.decode_callback_id(arg)
+    except (IndexError, ValueError):
+        log.warning(f"Invalid confirm_delete_project data from user {user_id}: {query.data}")
+        await query.edit_message_text(_(user_id, 'error_invalid_delete_data'))
+        return
+
+    project_name = database.get_owned_project_name(user_id, project_id)
+    if project_name is None:
+        await query.edit_message_text(_(user_id, 'project_not_found'))
+        return
+    reply_markup = _delete_confirm_markup(user_id, f"delete_project:{cmd_handlers.encode_callback_id(project_id)}")
+    await query.edit_message_text(
+        _(user_id, 'delete_confirm_project', project_name=project_name),
+        reply_markup=reply_markup
+    )
+    log.debug(f"Sent final project deletion confirmation for project {project_id} to user {user_id}")
+
+async def _h_delete_project(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `delete_project:<id>` callback."""
+    project_id = None
+    project_name_for_log = "unknown"
+    try:
+        project_id = cmd_handlers.decode_callback_id(arg)
+        project_name = database.get_owned_project_name(user_id, project_id)
+        project_name_for_log = project_name or _(user_id, 'text_unknown_project')
+        if project_name is None:
+            log.warning(f"Attempt to delete non-existent project ID {project_id} by user {user_id} via callback")
+            await ack(_(user_id, 'error_project_not_found_delete'), show_alert=True)
+            await query.edit_message_text(text=_(user_id, 'error_finding_project_delete'))
+            return
+
+        deleted = database.delete_project(user_id, project_id)
+        if deleted:
+            log.info(f"User {user_id} deleted project {project_id} ('{project_name}') via callback.")
+            await query.edit_message_text(text=_(user_id, 'project_deleted_success', project_name=project_name))
+        else:
+            log.warning(f"Failed to delete project {project_id} ('{project_name}') for user {user_id} via callback. DB function returned false.")
+            await query.edit_message_text(text=_(user_id, 'project_deleted_fail', project_name=project_name))
+    except (IndexError, ValueError) as e:
+         log.warning(f"Error parsing delete_project callback data '{query.data}' for user {user_id}: {e}")
+         await query.edit_message_text(text=_(user_id, 'error_processing_delete'))
+    except _SQLiteError as e:
+        log.error(f"DB Error deleting project via callback for user {user_id}, project_id {project_id}: {e}", exc_info=True)
+        await query.edit_message_text(text=_(user_id, 'error_db_delete_project'))
+        await ack(_(user_id, 'error_db_short'), show_alert=True)
+    except Exception as e:
+        log.error(f"Unexpected error handling delete_project callback for user {user_id}, project_id {project_id} ('{project_name_for_log}'): {e}", exc_info=True)
+        await query.edit_message_text(text=_(user_id, 'error_unexpected_delete_project'))
+        await ack(_(user_id, 'error_unexpected_short'), show_alert=True)
+
+async def _h_confirm_delete_task(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `confirm_delete_task:<id>` callback."""
+    try:
+        task_id = cmd_handlers.decode_callback_id(arg)
+    except (IndexError, ValueError):
+        log.warning(f"Invalid confirm_delete_task data from user {user_id}: {query.data}")
+        await query.edit_message_text(_(user_id, 'error_invalid_delete_data'))
+        return
+
+    owned = database.get_owned_task(user_id, task_id)
+    if owned is None:
+        await query.edit_message_text(_task_not_found_text(user_id))
+        return
+    task_name = owned[1]
+    reply_markup = _delete_confirm_markup(user_id, f"delete_task:{cmd_handlers.encode_callback_id(task_id)}")
+    await query.edit_message_text(
+        _(user_id, 'delete_confirm_task', task_name=task_name),
+        reply_markup=reply_markup
+    )
+    log.debug(f"Sent final task deletion confirmation for task {task_id} to user {user_id}")
+
+async def _h_delete_task(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `delete_task:<id>` callback."""
+    task_id = None
+    task_name_for_log = "unknown"
+    try:
+        task_id = cmd_handlers.decode_callback_id(arg)
+        owned = database.get_owned_task(user_id, task_id)
+        task_name = owned[1] if owned else None
+        task_name_for_log = task_name or _(user_id, 'text_unknown_task')
+        if task_name is None:
+            log.warning(f"Attempt to delete non-existent task ID {task_id} by user {user_id} via callback")
+            await ack(_(user_id, 'error_task_not_found_delete'), show_alert=True)
+            await query.edit_message_text(text=_(user_id, 'error_finding_task_delete'))
+            return
+
+        deleted = database.delete_task(user_id, task_id)
+        if deleted:
+            log.info(f"User {user_id} deleted task {task_id} ('{task_name}') via callback.")
+            await query.edit_message_text(text=_(user_id, 'task_deleted_success', task_name=task_name))
+        else:
+            log.warning(f"Failed to delete task {task_id} ('{task_name}') for user {user_id} via callback. DB function returned false.")
+            await query.edit_message_text(text=_(user_id, 'task_deleted_fail', task_name=task_name))
+    except (IndexError, ValueError) as e:
+         log.warning(f"Error parsing delete_task callback data '{query.data}' for user {user_id}: {e}")
+         await query.edit_message_text(text=_(user_id, 'error_processing_delete'))
+    except _SQLiteError as e:
+        log.error(f"DB Error deleting task via callback for user {user_id}, task_id {task_id}: {e}", exc_info=True)
+        await query.edit_message_text(text=_(user_id, 'error_db_delete_task'))
+        await ack(_(user_id, 'error_db_short'), show_alert=True)
+    except Exception as e:
+        log.error(f"Unexpected error handling delete_task callback for user {user_id}, task_id {task_id} ('{task_name_for_log}'): {e}", exc_info=True)
+        await query.edit_message_text(text=_(user_id, 'error_unexpected_delete_task'))
+        await ack(_(user_id, 'error_unexpected_short'), show_alert=True)
+
+# --- Break Timer Callback ---
+async def _h_start_break(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `start_break:<minutes>` callback."""
+    log.debug(f"Handling start_break callback for user {user_id}")
+    existing_state = timer_states.get(user_id)
+    if existing_state and existing_state.state in ACTIVE_TIMER_STATES:
+        log.warning(f"User {user_id} tried to start a break timer via callback while another timer is active.")
+        await ack(_(user_id, 'error_timer_active_break'), show_alert=True)
+        return
+
+    try:
+        duration_minutes = int(arg)
+        log.info(f"User {user_id} starting {duration_minutes} min break via callback.")
+        await start_break_timer(context, user_id, duration_minutes)
+        # Remove the break buttons from the original message (timer start sends its own message)
+        await query.edit_message_reply_markup(reply_markup=None)
+    except (IndexError, ValueError) as e:
+        log.warning(f"Error parsing break duration from callback '{query.data}' for user {user_id}: {e}")
+        await query.edit_message_text(text=_(user_id, 'error_start_break'))
+    except Exception as e:
+        log.error(f"Unexpected error handling start_break callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text(text=_(user_id, 'error_start_break_unexpected'))
+        await ack(_(user_id, 'error_unexpected_short'), show_alert=True)
+
+# --- Done/Archive Callbacks ---
+async def _h_mark_project_done(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `mark_project_done:<id>[:<page>]` callback."""
+    try:
+        encoded_id, _sep, page_arg = arg.partition(':')
+        page = cmd_handlers.parse_list_page(page_arg)
+        project_id = cmd_handlers.decode_callback_id(encoded_id)
+        result = database.mark_project_status_and_list(user_id, project_id, STATUS_DONE, list_status=STATUS_ACTIVE)
+        if result:
+            project_name, active_projects = result
+            log.info(f"User {user_id} marked project {project_id} ('{project_name}') as done.")
+            await ack(_(user_id, 'project_archived_toast', project_name=project_name))
+            _schedule_redraw(context, query, user_id,
+                             cmd_handlers.render_projects_list(query.edit_message_text, user_id, active_projects, page))
+        else:
+            await ack(_(user_id, 'project_archive_fail'), show_alert=True)
+    except Exception as e:
+        log.error(f"Error marking project done for user {user_id}, data {query.data}: {e}", exc_info=True)
+        await ack(_(user_id, 'error_generic'), show_alert=True)
+
+async def _h_mark_task_done(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `mark_task_done:<id>[:<page>]` callback."""
+    try:
+        encoded_id, _sep, page_arg = arg.partition(':')
+        page = cmd_handlers.parse_list_page(page_arg)
+        task_id = cmd_handlers.decode_callback_id(encoded_id)
+        result = database.mark_task_status_and_list(user_id, task_id, STATUS_DONE, list_status=STATUS_ACTIVE)
+        if result:
+            task_name, project_id, active_tasks = result
+            log.info(f"User {user_id} marked task {task_id} ('{task_name}') as done.")
+            await ack(_(user_id, 'task_archived_toast', task_name=task_name))
+            _schedule_redraw(context, query, user_id,
+                             cmd_handlers.render_tasks_list(query.edit_message_text, user_id, project_id, active_tasks,
+                                                            page=page))
+        else:
+            await ack(_(user_id, 'task_archive_fail'), show_alert=True)
+    except Exception as e:
+        log.error(f"Error marking task done for user {user_id}, data {query.data}: {e}", exc_info=True)
+        await ack(_(user_id, 'error_generic'), show_alert=True)
+
+async def _h_list_projects_done(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `list_projects_done` callback."""
+    log.debug(f"User {user_id} requested archived projects list.")
+    _schedule_redraw(context, query, user_id, _display_archived_projects(query, user_id))
+
+async def _h_list_tasks_done(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `list_tasks_done` callback."""
+    log.debug(f"User {user_id} requested archived tasks list.")
+    _schedule_redraw(context, query, user_id, _display_archived_tasks(query, user_id))
+
+async def _h_mark_project_active(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `mark_project_active:<id>` callback."""
+    try:
+        project_id = cmd_handlers.decode_callback_id(arg)
+        result = database.mark_project_status_and_list(user_id, project_id, STATUS_ACTIVE, list_status=STATUS_DONE)
+        if result:
+            project_name, archived_projects = result
+            log.info(f"User {user_id} reactivated project {project_id} ('{project_name}').")
+            await ack(_(user_id, 'project_reactivated_toast', project_name=project_name))
+            _schedule_redraw(context, query, user_id, _render_archived_projects(query, user_id, archived_projects))
+        else:
+            await ack(_(user_id, 'project_reactivate_fail'), show_alert=True)
+    except Exception as e:
+        log.error(f"Error reactivating project for user {user_id}, data {query.data}: {e}", exc_info=True)
+        await ack(_(user_id, 'error_generic'), show_alert=True)
+
+async def _h_mark_task_active(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `mark_task_active:<id>` callback."""
+    try:
+        task_id = cmd_handlers.decode_callback_id(arg)
+        result = database.mark_task_status_and_list(user_id, task_id, STATUS_ACTIVE, list_status=STATUS_DONE)
+        if result:
+            task_name, project_id, archived_tasks = result
+            log.info(f"User {user_id} reactivated task {task_id} ('{task_name}').")
+            await ack(_(user_id, 'task_reactivated_toast', task_name=task_name))
+            _schedule_redraw(context, query, user_id, _render_archived_tasks(query, user_id, project_id, archived_tasks))
+        else:
+            await ack(_(user_id, 'task_reactivate_fail'), show_alert=True)
+    except Exception as e:
+        log.error(f"Error reactivating task for user {user_id}, data {query.data}: {e}", exc_info=True)
+        await ack(_(user_id, 'error_generic'), show_alert=True)
+
+async def _h_list_projects_active(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `list_projects_active[:<page>]` callback."""
+    log.debug(f"User {user_id} requested active projects list (page arg '{arg}').")
+    await cmd_handlers.show_projects_list(query.edit_message_text, user_id, cmd_handlers.parse_list_page(arg))
+
+async def _h_list_tasks_active(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `list_tasks_active[:<page>]` callback."""
+    log.debug(f"User {user_id} requested active tasks list (page arg '{arg}').")
+    await cmd_handlers.show_tasks_list(query.edit_message_text, user_id, cmd_handlers.parse_list_page(arg))
+
+# --- Create New Project/Task Callbacks --- (Handled by prompting user_data flags)
+async def _h_create_new_project(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `create_new_project` callback."""
+    log.debug(f"User {user_id} requested to create a new project via button.")
+    await query.edit_message_text(_(user_id, 'callback_create_project_prompt'))
+    get_pending_input(context.user_data, user_id).expecting_project_name = True
+
+async def _h_create_new_task(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `create_new_task` callback."""
+    log.debug(f"User {user_id} requested to create a new task via button.")
+    current_project = database.get_current_project_with_name(user_id)
+    if not current_project:
+        await query.edit_message_text(_(user_id, 'task_create_no_project'))
+        return
+
+    project_name = current_project[1] or _(user_id, 'text_current_project')
+    await query.edit_message_text(_(user_id, 'callback_create_task_prompt', project_name=project_name))
+    get_pending_input(context.user_data, user_id).expecting_task_name = True
+
+# --- Rename Project/Task Callbacks ---
+async def _h_rename_project(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `rename_project:<id>` callback."""
+    try:
+        project_id = cmd_handlers.decode_callback_id(arg)
+        project_name = database.get_owned_project_name(user_id, project_id)
+        if not project_name:
+            log.warning(f"User {user_id} tried to rename non-existent or foreign project {project_id}")
+            await query.edit_message_text(_(user_id, 'project_not_found'))
+            return
+
+        log.info(f"User {user_id} initiated rename for project {project_id} ('{project_name}')")
+        # Store project_id in context for the conversation handler
+        get_pending_input(context.user_data, user_id).renaming_project_id = project_id
+
+        # Prompt for new name
+        await query.edit_message_text(_(user_id, 'rename_project_prompt', project_name=project_name))
+        # The conversation handler will pick up the next message
+        return cmd_handlers.WAITING_RENAME_PROJECT_NAME
+    except (IndexError, ValueError) as e:
+        log.warning(f"Error parsing rename_project callback data '{query.data}' for user {user_id}: {e}")
+        await query.edit_message_text(_(user_id, 'error_unexpected'))
+    except Exception as e:
+        log.error(f"Error handling rename_project callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text(_(user_id, 'error_unexpected'))
+
+async def _h_rename_task(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `rename_task:<id>` callback."""
+    try:
+        task_id = cmd_handlers.decode_callback_id(arg)
+        owned = database.get_owned_task(user_id, task_id)
+        if not owned:
+            log.warning(f"User {user_id} tried to rename non-existent or foreign task {task_id}")
+            await query.edit_message_text(_task_not_found_text(user_id))
+            return
+        task_name = owned[1]
+
+        log.info(f"User {user_id} initiated rename for task {task_id} ('{task_name}')")
+        # Store task_id in context for the conversation handler
+        get_pending_input(context.user_data, user_id).renaming_task_id = task_id
+
+        # Prompt for new name
+        await query.edit_message_text(_(user_id, 'rename_task_prompt', task_name=task_name))
+        # The conversation handler will pick up the next message
+        return cmd_handlers.WAITING_RENAME_TASK_NAME
+    except (IndexError, ValueError) as e:
+        log.warning(f"Error parsing rename_task callback data '{query.data}' for user {user_id}: {e}")
+        await query.edit_message_text(_(user_id, 'error_unexpected'))
+    except Exception as e:
+        log.error(f"Error handling rename_task callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text(_(user_id, 'error_unexpected'))
+
+# --- Language Selection Callback ---
+async def _h_set_lang(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user_id: int, arg: str, ack: _QueryAck):
+    """Handles the `set_lang:<code>` callback."""
+    try:
+        lang_code = arg
+        if set_user_lang(user_id, lang_code):
+            lang_name = get_language_name(lang_code)
+            success_message = _(user_id, 'language_set', language_name=lang_name)
+            log.info(f"User {user_id} set language to {lang_code}")
+            await query.edit_message_text(text=success_message)
+            # Resend the main menu prompt with the translated keyboard
+            main_menu_text = _(user_id, 'main_menu_prompt')
+            reply_markup = cmd_handlers.get_main_keyboard(user_id) # Get translated keyboard
+            await context.bot.send_message(user_id, main_menu_text, reply_markup=reply_markup)
+        else:
+            log.warning(f"Failed to set language to {lang_code} for user {user_id} (unsupported or DB error)")
+            await query.edit_message_text(text=_(user_id, 'error_set_language_fail')) # Use generic error in default lang
+    except Exception as e:
+         log.error(f"Unexpected error handling set_lang callback for user {user_id}: {e}", exc_info=True)
+         await query.edit_message_text(_(user_id, 'error_set_language_unexpected'))
+
+# --- Dispatch Tables ---
+# Exact callback_data matches
+EXACT_HANDLERS = {
+    "noop_create_project": _h_noop_create_project,
+    "noop_create_task": _h_noop_create_task,
+    "report_daily": _h_deprecated_report,
+    "report_weekly": _h_deprecated_report,
+    "report_monthly": _h_deprecated_report,
+    "forwarded_create_new_project": _h_forwarded_create_new_project,
+    "cancel_forwarded_message": _h_cancel_forwarded_message,
+    "cancel_delete": _h_cancel_delete,
+    "list_projects_done": _h_list_projects_done,
+    "list_tasks_done": _h_list_tasks_done,
+    "list_projects_active": _h_list_projects_active,
+    "list_tasks_active": _h_list_tasks_active,
+    "create_new_project": _h_create_new_project,
+    "create_new_task": _h_create_new_task,
+}
+
+# Parameterized callback_data, keyed by the part before the first ":"
+PREFIX_HANDLERS = {
+    "report_nav": _h_report_nav,
+    "select_project": _h_select_project,
+    "select_task": _h_select_task,
+    "forwarded_select_project": _h_forwarded_select_project,
+    "confirm_delete_project": _h_confirm_delete_project,
+    "delete_project": _h_delete_project,
+    "confirm_delete_task": _h_confirm_delete_task,
+    "delete_task": _h_delete_task,
+    "start_break": _h_start_break,
+    "mark_project_done": _h_mark_project_done,
+    "mark_task_done": _h_mark_task_done,
+    "mark_project_active": _h_mark_project_active,
+    "mark_task_active": _h_mark_task_active,
+    "list_projects_active": _h_list_projects_active,
+    "list_tasks_active": _h_list_tasks_active,
+    "rename_project": _h_rename_project,
+    "rename_task": _h_rename_task,
+    "set_lang": _h_set_lang,
+}
+
 # --- Callback Query Handler ---
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer() # Acknowledge immediately
 
     data = query.data
     user_id = query.from_user.id
     log.debug(f"Callback received from user {user_id}: {data}")
+    ack = _QueryAck(query)
 
     try:
-        # --- Specific No-op Callbacks with Instructions --- 
-        if data == "noop_create_project":
-            log.debug(f"Handling create project instruction callback: {data}")
-            await query.edit_message_text(
-                text=_(user_id, 'instruction_create_project'),
-                reply_markup=None 
-            )
-            return
-        elif data == "noop_create_task":
-            log.debug(f"Handling create task instruction callback: {data}")
-            current_project_id = database.get_current_project(user_id)
-            project_name = database.get_project_name(current_project_id) if current_project_id else _(user_id, 'text_current_project')
-            await query.edit_message_text(
-                text=_(user_id, 'instruction_create_task', project_name=project_name),
-                reply_markup=None 
-            )
-            return
-            
-        # --- Generic No-op Callbacks (e.g., for archived item names) ---
-        elif data.startswith("noop_"):
-            log.debug(f"Handled generic no-op callback: {data}")
-            # Just acknowledge, don't change the message or remove buttons
-            return 
-
-        # --- Report Navigation Callback --- 
-        elif data.startswith("report_nav:"):
-            try:
-                parts = data.split(':')
-                report_type = parts[1]
-                offset = int(parts[2])
-                log.info(f"Handling report navigation: type={report_type}, offset={offset} for user {user_id}")
-                
-                if report_type == "daily":
-                    await cmd_handlers.report_daily(update, context, offset=offset)
-                elif report_type == "weekly":
-                    await cmd_handlers.report_weekly(update, context, offset=offset)
-                elif report_type == "monthly":
-                    await cmd_handlers.report_monthly(update, context, offset=offset)
-                else:
-                    log.warning(f"Unknown report type '{report_type}' in callback data: {data}")
-                    await query.answer("Unknown report type for navigation.")
-            except (IndexError, ValueError) as e:
-                log.error(f"Error parsing report navigation callback '{data}': {e}")
-                await query.answer("Error processing navigation.")
-            except Exception as e:
-                # Catch other potential errors during report generation
-                log.error(f"Error during report navigation callback '{data}': {e}", exc_info=True)
-                await query.answer("An error occurred generating the report.")
-                # Attempt to edit the message to show error, might fail if original message deleted
-                try: await query.edit_message_text("An error occurred generating the report.")
-                except Exception: pass 
-            return # Handled this callback type
-            
-        # --- Deprecated Report Callbacks (kept for safety, but should be unused now) ---
-        elif data == "report_daily":
-            log.info(f"User {user_id} triggered DEPRECATED daily report via callback. Redirecting.")
-            await cmd_handlers.report_daily(update, context, offset=0) # Call with offset 0
-        elif data == "report_weekly":
-            log.info(f"User {user_id} triggered DEPRECATED weekly report via callback. Redirecting.")
-            await cmd_handlers.report_weekly(update, context, offset=0) 
-        elif data == "report_monthly":
-            log.info(f"User {user_id} triggered DEPRECATED monthly report via callback. Redirecting.")
-            await cmd_handlers.report_monthly(update, context, offset=0)
-        
-        # --- Selection Callbacks ---
-        elif data.startswith("select_project:"):
-            try:
-                project_id = int(data.split(":")[1])
-                project_name = database.get_project_name(project_id) or _(user_id, 'text_unknown_project') # New key
-
-                database.set_current_project(user_id, project_id)
-                database.set_current_task(user_id, None)
-                log.info(f"User {user_id} selected project {project_id} ('{project_name}') via callback.")
-                await query.edit_message_text(text=_(user_id, 'project_selected_callback', project_name=project_name)) # New key
-            except (IndexError, ValueError) as e:
-                log.warning(f"Error parsing select_project callback data '{data}' for user {user_id}: {e}")
-                await query.edit_message_text(text=_(user_id, 'error_processing_selection'))
-            except sqlite3.Error as e:
-                log.error(f"DB Error selecting project via callback for user {user_id}: {e}\n{traceback.format_exc()}")
-                await query.edit_message_text(text=_(user_id, 'error_selecting_project_db'))
-            except Exception as e:
-                log.error(f"Unexpected error handling select_project callback for user {user_id}: {e}\n{traceback.format_exc()}")
-                await query.edit_message_text(text=_(user_id, 'error_selecting_project_unexpected'))
-        
-        elif data.startswith("select_task:"):
-            try:
-                task_id = int(data.split(":")[1])
-                current_project_id = database.get_current_project(user_id)
-                if not current_project_id:
-                     log.warning(f"User {user_id} tried to select task via callback with no project selected.")
-                     await query.edit_message_text(text=_(user_id, 'error_selecting_task_no_project'))
-                     return
-                    
-                task_name = database.get_task_name(task_id)
-                if task_name is None:
-                    log.warning(f"User {user_id} tried to select non-existent/mismatched task ID {task_id} via callback.")
-                    await query.edit_message_text(text=_(user_id, 'error_task_not_found_or_mismatch'))
-                    return
-                    
-                database.set_current_task(user_id, task_id)
-                log.info(f"User {user_id} selected task {task_id} ('{task_name}') via callback.")
-                await query.edit_message_text(text=_(user_id, 'task_selected_callback', task_name=task_name)) # New key
-            except (IndexError, ValueError) as e:
-                 log.warning(f"Error parsing select_task callback data '{data}' for user {user_id}: {e}")
-                 await query.edit_message_text(text=_(user_id, 'error_processing_selection'))
-            except sqlite3.Error as e:
-                log.error(f"DB Error selecting task via callback for user {user_id}: {e}\n{traceback.format_exc()}")
-                await query.edit_message_text(text=_(user_id, 'error_selecting_task_db'))
-            except Exception as e:
-                log.error(f"Unexpected error handling select_task callback for user {user_id}: {e}\n{traceback.format_exc()}")
-                await query.edit_message_text(text=_(user_id, 'error_selecting_task_unexpected'))
-
-        elif data.startswith("forwarded_select_project:"):
-            try:
-                project_id = int(data.split(":")[1])
-                # Call the handler but capture its return value for conversation state
-                conversation_state = await cmd_handlers.handle_forwarded_project_selection(update, context, project_id)
-                # Return the conversation state to the ConversationHandler
-                return conversation_state
-            except (IndexError, ValueError):
-                log.warning(f"Error parsing forwarded_select_project callback data '{data}' for user {user_id}")
-                await query.edit_message_text(_(user_id, 'error_processing_selection'))
-                return ConversationHandler.END
-            except Exception as e:
-                log.error(f"Unexpected error handling forwarded_select_project callback for user {user_id}: {e}", exc_info=True)
-                await query.edit_message_text(_(user_id, 'error_selecting_project_unexpected'))
-                return ConversationHandler.END
-        elif data == "forwarded_create_new_project":
-            try:
-                log.info(f"User {user_id} clicked 'Create New Project' for forwarded message")
-                # Call the handler but capture its return value for conversation state
-                conversation_state = await cmd_handlers.handle_forwarded_create_new_project(update, context)
-                # Return the conversation state to the ConversationHandler
-                return conversation_state
-            except Exception as e:
-                log.error(f"Unexpected error handling forwarded_create_new_project callback for user {user_id}: {e}", exc_info=True)
-                await query.edit_message_text(_(user_id, 'error_unexpected'))
-                # Return ConversationHandler.END on error
-                return ConversationHandler.END
-                
-        elif data == "cancel_forwarded_message":
-            log.info(f"User {user_id} cancelled the forwarded message workflow")
-            # Clear any pending data
-            if user_id in context.user_data and 'pending_forwarded_message' in context.user_data[user_id]:
-                del context.user_data[user_id]['pending_forwarded_message']
-            if user_id in context.user_data and 'expecting_forwarded_project_name' in context.user_data[user_id]:
-                del context.user_data[user_id]['expecting_forwarded_project_name']
-                
-            await query.edit_message_text(_(user_id, 'forwarded_workflow_cancelled'))
-            return ConversationHandler.END
-
-        # --- Deletion Callbacks ---
-        elif data == "cancel_delete":
-            log.debug(f"User {user_id} cancelled deletion via callback.")
-            await query.edit_message_text(text=_(user_id, 'deletion_cancelled'))
-            
-        elif data.startswith("confirm_delete_project:"):
-            try:
-                project_id_str = data.split(":")[1]
-                project_id = int(project_id_str)
-            except (IndexError, ValueError):
-                log.warning(f"Invalid confirm_delete_project data from user {user_id}: {data}")
-                await query.edit_message_text(_(user_id, 'error_invalid_delete_data'))
-                return
-            
-            project_name = database.get_project_name(project_id) or _(user_id, 'text_unknown_project') # New key
-            keyboard = [
-                [InlineKeyboardButton(_(user_id, 'button_confirm_delete'), callback_data=f"delete_project:{project_id}")], # New key
-                [InlineKeyboardButton(_(user_id, 'button_cancel_delete'), callback_data="cancel_delete")] # New key
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(
-                _(user_id, 'delete_confirm_project', project_name=project_name), 
-                reply_markup=reply_markup
-            )
-            log.debug(f"Sent final project deletion confirmation for project {project_id} to user {user_id}")
-
-        elif data.startswith("delete_project:"):
-            project_id = None
-            project_name_for_log = "unknown"
-            try:
-                project_id = int(data.split(":")[1])
-                project_name = database.get_project_name(project_id)
-                project_name_for_log = project_name or _(user_id, 'text_unknown_project')
-                if project_name is None:
-                    log.warning(f"Attempt to delete non-existent project ID {project_id} by user {user_id} via callback")
-                    await query.answer(_(user_id, 'error_project_not_found_delete'), show_alert=True)
-                    await query.edit_message_text(text=_(user_id, 'error_finding_project_delete'))
-                    return
-
-                deleted = database.delete_project(project_id)
-                if deleted:
-                    log.info(f"User {user_id} deleted project {project_id} ('{project_name}') via callback.")
-                    await query.edit_message_text(text=_(user_id, 'project_deleted_success', project_name=project_name))
-                else:
-                    log.warning(f"Failed to delete project {project_id} ('{project_name}') for user {user_id} via callback. DB function returned false.")
-                    await query.edit_message_text(text=_(user_id, 'project_deleted_fail', project_name=project_name))
-            except (IndexError, ValueError) as e:
-                 log.warning(f"Error parsing delete_project callback data '{data}' for user {user_id}: {e}")
-                 await query.edit_message_text(text=_(user_id, 'error_processing_delete'))
-            except sqlite3.Error as e:
-                log.error(f"DB Error deleting project via callback for user {user_id}, project_id {project_id}: {e}\n{traceback.format_exc()}")
-                await query.edit_message_text(text=_(user_id, 'error_db_delete_project'))
-                await query.answer(_(user_id, 'error_db_short'), show_alert=True)
-            except Exception as e:
-                log.error(f"Unexpected error handling delete_project callback for user {user_id}, project_id {project_id} ('{project_name_for_log}'): {e}\n{traceback.format_exc()}")
-                await query.edit_message_text(text=_(user_id, 'error_unexpected_delete_project'))
-                await query.answer(_(user_id, 'error_unexpected_short'), show_alert=True)
-            
-        elif data.startswith("confirm_delete_task:"):
-            try:
-                task_id_str = data.split(":")[1]
-                task_id = int(task_id_str)
-            except (IndexError, ValueError):
-                log.warning(f"Invalid confirm_delete_task data from user {user_id}: {data}")
-                await query.edit_message_text(_(user_id, 'error_invalid_delete_data'))
+        handler = EXACT_HANDLERS.get(data)
+        if handler is None:
+            # Generic no-op callbacks (e.g., for archived item names): just acknowledge
+            if data.startswith("noop_"):
+                log.debug(f"Handled generic no-op callback: {data}")
                 return
-            
-            task_name = database.get_task_name(task_id) or _(user_id, 'text_unknown_task') # New key
-            keyboard = [
-                [InlineKeyboardButton(_(user_id, 'button_confirm_delete'), callback_data=f"delete_task:{task_id}")],
-                [InlineKeyboardButton(_(user_id, 'button_cancel_delete'), callback_data="cancel_delete")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(
-                _(user_id, 'delete_confirm_task', task_name=task_name), 
-                reply_markup=reply_markup
-            )
-            log.debug(f"Sent final task deletion confirmation for task {task_id} to user {user_id}")
-
-        elif data.startswith("delete_task:"):
-            task_id = None
-            task_name_for_log = "unknown"
-            try:
-                task_id = int(data.split(":")[1])
-                task_name = database.get_task_name(task_id)
-                task_name_for_log = task_name or _(user_id, 'text_unknown_task')
-                if task_name is None:
-                    log.warning(f"Attempt to delete non-existent task ID {task_id} by user {user_id} via callback")
-                    await query.answer(_(user_id, 'error_task_not_found_delete'), show_alert=True)
-                    await query.edit_message_text(text=_(user_id, 'error_finding_task_delete'))
-                    return
-                
-                deleted = database.delete_task(task_id)
-                if deleted:
-                    log.info(f"User {user_id} deleted task {task_id} ('{task_name}') via callback.")
-                    await query.edit_message_text(text=_(user_id, 'task_deleted_success', task_name=task_name))
-                else:
-                    log.warning(f"Failed to delete task {task_id} ('{task_name}') for user {user_id} via callback. DB function returned false.")
-                    await query.edit_message_text(text=_(user_id, 'task_deleted_fail', task_name=task_name))
-            except (IndexError, ValueError) as e:
-                 log.warning(f"Error parsing delete_task callback data '{data}' for user {user_id}: {e}")
-                 await query.edit_message_text(text=_(user_id, 'error_processing_delete'))
-            except sqlite3.Error as e:
-                log.error(f"DB Error deleting task via callback for user {user_id}, task_id {task_id}: {e}\n{traceback.format_exc()}")
-                await query.edit_message_text(text=_(user_id, 'error_db_delete_task'))
-                await query.answer(_(user_id, 'error_db_short'), show_alert=True)
-            except Exception as e:
-                log.error(f"Unexpected error handling delete_task callback for user {user_id}, task_id {task_id} ('{task_name_for_log}'): {e}\n{traceback.format_exc()}")
-                await query.edit_message_text(text=_(user_id, 'error_unexpected_delete_task'))
-                await query.answer(_(user_id, 'error_unexpected_short'), show_alert=True)
-
-        # --- Break Timer Callback ---
-        elif data.startswith("start_break:"):
-            log.debug(f"Handling start_break callback for user {user_id}")
-            existing_state = timer_states.get(user_id)
-            if existing_state and existing_state.get('state') in ['running', 'paused']:
-                log.warning(f"User {user_id} tried to start a break timer via callback while another timer is active.")
-                await query.answer(_(user_id, 'error_timer_active_break'), show_alert=True)
-                return
-
-            try:
-                duration_minutes = int(data.split(":")[1])
-                log.info(f"User {user_id} starting {duration_minutes} min break via callback.")
-                await start_break_timer(context, user_id, duration_minutes)
-                # Remove the break buttons from the original message (timer start sends its own message)
-                await query.edit_message_reply_markup(reply_markup=None)
-            except (IndexError, ValueError) as e:
-                log.warning(f"Error parsing break duration from callback '{data}' for user {user_id}: {e}")
-                await query.edit_message_text(text=_(user_id, 'error_start_break'))
-            except Exception as e:
-                log.error(f"Unexpected error handling start_break callback for user {user_id}: {e}\n{traceback.format_exc()}")
-                await query.edit_message_text(text=_(user_id, 'error_start_break_unexpected'))
-                await query.answer(_(user_id, 'error_unexpected_short'), show_alert=True)
-
-        # --- Done/Archive Callbacks --- 
-        elif data.startswith("mark_project_done:"):
-            try:
-                project_id = int(data.split(":")[1])
-                project_name = database.get_project_name(project_id) or _(user_id, 'text_unknown_project')
-                success = database.mark_project_status(project_id, STATUS_DONE)
-                if success:
-                    log.info(f"User {user_id} marked project {project_id} ('{project_name}') as done.")
-                    fake_update = Update(0, message=query.message)
-                    fake_update._effective_user = query.from_user
-                    await cmd_handlers.list_projects(fake_update, context)
-                    await query.answer(_(user_id, 'project_archived_toast', project_name=project_name))
-                else:
-                    await query.answer(_(user_id, 'project_archive_fail'), show_alert=True)
-            except Exception as e:
-                log.error(f"Error marking project done for user {user_id}, data {data}: {e}", exc_info=True)
-                await query.answer(_(user_id, 'error_generic'), show_alert=True)
-        
-        elif data.startswith("mark_task_done:"):
-            try:
-                task_id = int(data.split(":")[1])
-                task_name = database.get_task_name(task_id) or _(user_id, 'text_unknown_task')
-                success = database.mark_task_status(task_id, STATUS_DONE)
-                if success:
-                    log.info(f"User {user_id} marked task {task_id} ('{task_name}') as done.")
-                    fake_update = Update(0, message=query.message)
-                    fake_update._effective_user = query.from_user
-                    await cmd_handlers.list_tasks(fake_update, context)
-                    await query.answer(_(user_id, 'task_archived_toast', task_name=task_name))
-                else:
-                    await query.answer(_(user_id, 'task_archive_fail'), show_alert=True)
-            except Exception as e:
-                log.error(f"Error marking task done for user {user_id}, data {data}: {e}", exc_info=True)
-                await query.answer(_(user_id, 'error_generic'), show_alert=True)
-        
-        elif data == "list_projects_done":
-            log.debug(f"User {user_id} requested archived projects list.")
-            await _display_archived_projects(query, user_id) # Use helper
-        
-        elif data == "list_tasks_done":
-            log.debug(f"User {user_id} requested archived tasks list.")
-            await _display_archived_tasks(query, user_id) # Use helper
-
-        elif data.startswith("mark_project_active:"):
-            try:
-                project_id = int(data.split(":")[1])
-                project_name = database.get_project_name(project_id) or _(user_id, 'text_unknown_project')
-                success = database.mark_project_status(project_id, STATUS_ACTIVE)
-                if success:
-                    log.info(f"User {user_id} reactivated project {project_id} ('{project_name}').")
-                    await _display_archived_projects(query, user_id)
-                    await query.answer(_(user_id, 'project_reactivated_toast', project_name=project_name))
-                else:
-                    await query.answer(_(user_id, 'project_reactivate_fail'), show_alert=True)
-            except Exception as e:
-                log.error(f"Error reactivating project for user {user_id}, data {data}: {e}", exc_info=True)
-                await query.answer(_(user_id, 'error_generic'), show_alert=True)
-
-        elif data.startswith("mark_task_active:"):
-            try:
-                task_id = int(data.split(":")[1])
-                task_name = database.get_task_name(task_id) or _(user_id, 'text_unknown_task')
-                success = database.mark_task_status(task_id, STATUS_ACTIVE)
-                if success:
-                    log.info(f"User {user_id} reactivated task {task_id} ('{task_name}').")
-                    await _display_archived_tasks(query, user_id)
-                    await query.answer(_(user_id, 'task_reactivated_toast', task_name=task_name))
-                else:
-                    await query.answer(_(user_id, 'task_reactivate_fail'), show_alert=True)
-            except Exception as e:
-                log.error(f"Error reactivating task for user {user_id}, data {data}: {e}", exc_info=True)
-                await query.answer(_(user_id, 'error_generic'), show_alert=True)
-                
-        elif data == "list_projects_active":
-            log.debug(f"User {user_id} requested switch back to active projects list.")
-            fake_update = Update(0, message=query.message)
-            fake_update._effective_user = query.from_user
-            await cmd_handlers.list_projects(fake_update, context)
-            
-        elif data == "list_tasks_active":
-            log.debug(f"User {user_id} requested switch back to active tasks list.")
-            fake_update = Update(0, message=query.message)
-            fake_update._effective_user = query.from_user
-            await cmd_handlers.list_tasks(fake_update, context)
-            
-        # --- Create New Project/Task Callbacks --- (Handled by prompting user_data flags)
-        elif data == "create_new_project":
-            log.debug(f"User {user_id} requested to create a new project via button.")
-            await query.edit_message_text(_(user_id, 'callback_create_project_prompt'))
-            context.user_data[user_id] = context.user_data.get(user_id, {})
-            context.user_data[user_id]['expecting_project_name'] = True
-            
-        elif data == "create_new_task":
-            log.debug(f"User {user_id} requested to create a new task via button.")
-            current_project_id = database.get_current_project(user_id)
-            if not current_project_id:
-                await query.edit_message_text(_(user_id, 'task_create_no_project'))
-                return
-
-            project_name = database.get_project_name(current_project_id) or _(user_id, 'text_current_project')
-            await query.edit_message_text(_(user_id, 'callback_create_task_prompt', project_name=project_name))
-            context.user_data[user_id] = context.user_data.get(user_id, {})
-            context.user_data[user_id]['expecting_task_name'] = True
-
-        # --- Rename Project/Task Callbacks ---
-        elif data.startswith("rename_project:"):
-            try:
-                project_id = int(data.split(":")[1])
-                project_name = database.get_project_name(project_id)
-                if not project_name:
-                    log.warning(f"User {user_id} tried to rename non-existent project {project_id}")
-                    await query.edit_message_text(_(user_id, 'error_unexpected'))
-                    return
-
-                log.info(f"User {user_id} initiated rename for project {project_id} ('{project_name}')")
-                # Store project_id in context for the conversation handler
-                context.user_data[user_id] = context.user_data.get(user_id, {})
-                context.user_data[user_id]['renaming_project_id'] = project_id
-
-                # Prompt for new name
-                await query.edit_message_text(_(user_id, 'rename_project_prompt', project_name=project_name))
-                # The conversation handler will pick up the next message
-                return cmd_handlers.WAITING_RENAME_PROJECT_NAME
-            except (IndexError, ValueError) as e:
-                log.warning(f"Error parsing rename_project callback data '{data}' for user {user_id}: {e}")
-                await query.edit_message_text(_(user_id, 'error_unexpected'))
-            except Exception as e:
-                log.error(f"Error handling rename_project callback for user {user_id}: {e}", exc_info=True)
-                await query.edit_message_text(_(user_id, 'error_unexpected'))
-
-        elif data.startswith("rename_task:"):
-            try:
-                task_id = int(data.split(":")[1])
-                task_name = database.get_task_name(task_id)
-                if not task_name:
-                    log.warning(f"User {user_id} tried to rename non-existent task {task_id}")
-                    await query.edit_message_text(_(user_id, 'error_unexpected'))
-                    return
-
-                log.info(f"User {user_id} initiated rename for task {task_id} ('{task_name}')")
-                # Store task_id in context for the conversation handler
-                context.user_data[user_id] = context.user_data.get(user_id, {})
-                context.user_data[user_id]['renaming_task_id'] = task_id
-
-                # Prompt for new name
-                await query.edit_message_text(_(user_id, 'rename_task_prompt', task_name=task_name))
-                # The conversation handler will pick up the next message
-                return cmd_handlers.WAITING_RENAME_TASK_NAME
-            except (IndexError, ValueError) as e:
-                log.warning(f"Error parsing rename_task callback data '{data}' for user {user_id}: {e}")
-                await query.edit_message_text(_(user_id, 'error_unexpected'))
-            except Exception as e:
-                log.error(f"Error handling rename_task callback for user {user_id}: {e}", exc_info=True)
-                await query.edit_message_text(_(user_id, 'error_unexpected'))
-
-        # --- Language Selection Callback ---
-        elif data.startswith("set_lang:"):
-            try:
-                lang_code = data.split(":")[1]
-                if set_user_lang(user_id, lang_code):
-                    lang_name = get_language_name(lang_code)
-                    success_message = _(user_id, 'language_set', language_name=lang_name)
-                    log.info(f"User {user_id} set language to {lang_code}")
-                    await query.edit_message_text(text=success_message)
-                    # Resend the main menu prompt with the translated keyboard
-                    main_menu_text = _(user_id, 'main_menu_prompt')
-                    reply_markup = cmd_handlers.get_main_keyboard(user_id) # Get translated keyboard
-                    await context.bot.send_message(user_id, main_menu_text, reply_markup=reply_markup) 
-                else:
-                    log.warning(f"Failed to set language to {lang_code} for user {user_id} (unsupported or DB error)")
-                    await query.edit_message_text(text=_(user_id, 'error_set_language_fail')) # Use generic error in default lang
-            except IndexError:
-                 log.warning(f"Invalid set_lang callback data from user {user_id}: {data}")
-                 await query.edit_message_text(_(user_id, 'error_set_language_invalid'))
-            except Exception as e:
-                 log.error(f"Unexpected error handling set_lang callback for user {user_id}: {e}", exc_info=True)
-                 await query.edit_message_text(_(user_id, 'error_set_language_unexpected'))
-
-        # --- Default Case --- 
+            prefix, _sep, arg = data.partition(':')
+            handler = PREFIX_HANDLERS.get(prefix)
         else:
+            arg = ''
+
+        if handler is None:
             log.warning(f"Unhandled callback data from user {user_id}: {data}")
-            await query.answer(_(user_id, 'action_unknown'))
+            await ack(_(user_id, 'action_unknown'))
+            return
+        return await handler(update, context, query, user_id, arg, ack)
 
     # Catch broader errors, including DB errors during the callback processing
-    except sqlite3.Error as e:
-        log.error(f"DB Error processing callback '{data}' for user {user_id}: {e}\n{traceback.format_exc()}")
+    except _SQLiteError as e:
+        log.error(f"DB Error processing callback '{data}' for user {user_id}: {e}", exc_info=True)
         try: await query.edit_message_text(_(user_id, 'error_db')) # Use i18n error message
-        except Exception: await query.answer(_(user_id, 'error_db_short'), show_alert=True) # Short i18n alert
+        except Exception: await ack(_(user_id, 'error_db_short'), show_alert=True) # Short i18n alert
     except Exception as e:
-        log.error(f"Unexpected error processing callback '{data}' for user {user_id}: {e}\n{traceback.format_exc()}")
+        log.error(f"Unexpected error processing callback '{data}' for user {user_id}: {e}", exc_info=True)
         try: await query.edit_message_text(_(user_id, 'error_unexpected')) # Use i18n error message
-        except Exception: await query.answer(_(user_id, 'error_unexpected_short'), show_alert=True) # Short i18n alert 
\ No newline at end of file
+        except Exception: await ack(_(user_id, 'error_unexpected_short'), show_alert=True) # Short i18n alert
+    finally:
+        # Plain acknowledgement for handlers that didn't answer with a toast/alert
+        try:
+            if not ack.answered:
+                await query.answer()
+        except Exception as e:
+            log.debug(f"Could not acknowledge callback '{data}' for user {user_id}: {e}")
\ No newline at end of file
@@ -3,17 +3,22 @@ from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filt
 from telegram.helpers import escape_markdown # Import escape_markdown
 from telegram import constants # For ParseMode
 import database
+from state import get_pending_input
 from datetime import datetime, timedelta, timezone
-from config import timer_states, DOMAIN_URL, SUPPORTED_LANGUAGES
+from config import timer_states, TimerState, DOMAIN_URL, SUPPORTED_LANGUAGES
+from config import TIMER_RUNNING, TIMER_PAUSED, TIMER_STOPPED, TIMER_FINISHED, ACTIVE_TIMER_STATES, SESSION_WORK, SESSION_BREAK
 import logging
 import sqlite3
 from . import google_auth as google_auth_handlers # Import the module itself
 from . import admin as admin_handlers # Import admin handlers
 from database import STATUS_ACTIVE, STATUS_DONE # Import status constants
 import math # For formatting time
-from i18n_utils import _, get_language_name, set_user_lang # Import the translation helper and name getter
+from i18n_utils import _, get_language_name, set_user_lang, get_user_lang # Import the translation helper and name getter
 import json
 import re
+import asyncio
+import functools
+from collections import OrderedDict
 
 log = logging.getLogger(__name__)
 
@@ -43,9 +48,98 @@ def format_minutes_as_mmss(minutes: float) -> str:
     secs = total_seconds % 60
     return f"{mins}:{secs:02d}"
 
+# Marks hex-encoded IDs; buttons sent before the switch carry plain decimal IDs
+CALLBACK_HEX_ID_MARKER = 'x'
+
+def encode_callback_id(value: int) -> str:
+    """Encode a database ID for callback data as marked lowercase hex (shorter than decimal)."""
+    return f"{CALLBACK_HEX_ID_MARKER}{value:x}"
+
+def decode_callback_id(value: str) -> int:
+    """Decode an ID from callback data: marked hex, or decimal from older keyboards.
+
+    Raises ValueError on bad input.
+    """
+    if value.startswith(CALLBACK_HEX_ID_MARKER):
+        return int(value[len(CALLBACK_HEX_ID_MARKER):], 16)
+    return int(value, 10)
+
+# --- Static Inline Menus ---
+# (label_key, callback_data) per row; markups are built once per language
+_REPORT_MENU_ROWS = (
+    ('report_button_daily', "report_nav:daily:0"),
+    ('report_button_weekly', "report_nav:weekly:0"),
+    ('report_button_monthly', "report_nav:monthly:0"),
+)
+_BREAK_MENU_ROWS = (
+    ('timer_button_break_5', "start_break:5"),
+    ('timer_button_break_10', "start_break:10"),
+    ('timer_button_break_15', "start_break:15"),
+)
+_STATIC_MENUS = {} # {(language_code, rows): InlineKeyboardMarkup}
+
+def _static_menu(user_id: int, rows) -> InlineKeyboardMarkup:
+    """Returns a one-button-per-row inline menu with translated labels, cached per language."""
+    cache_key = (get_user_lang(user_id), rows)
+    markup = _STATIC_MENUS.get(cache_key)
+    if markup is None:
+        markup = _STATIC_MENUS[cache_key] = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(_(user_id, label_key), callback_data=callback_data)] for label_key, callback_data in rows]
+        )
+    return markup
+
+# Buttons whose label and callback data never change, cached per (language, label key, callback data)
+_STATIC_BUTTONS = {}
+
+def static_button(user_id: int, label_key: str, callback_data: str) -> InlineKeyboardButton:
+    """Returns a shared button for a fixed label/callback pair in the user's language."""
+    cache_key = (get_user_lang(user_id), label_key, callback_data)
+    button = _STATIC_BUTTONS.get(cache_key)
+    if button is None:
+        button = InlineKeyboardButton(_(user_id, label_key), callback_data=callback_data)
+        _STATIC_BUTTONS[cache_key] = button
+    return button
+
+# Names longer than this keep single-column pick lists (Telegram truncates wide buttons)
+GRID_MAX_NAME_LENGTH = 20
+
+def _button_grid(buttons, names) -> list:
+    """Lays out one-action pick buttons two per row when all names are short, else one per row."""
+    cols = 1 if any(len(name) > GRID_MAX_NAME_LENGTH for name in names) else 2
+    return [buttons[i:i + cols] for i in range(0, len(buttons), cols)]
+
+# Rows per page in the active project/task lists (each row has 3 buttons; Telegram caps keyboards at 100)
+LIST_PAGE_SIZE = 10
+
+def _list_page(rows, page: int):
+    """Returns (page_rows, page, has_next) with `page` clamped to the available pages."""
+    last_page = max(len(rows) - 1, 0) // LIST_PAGE_SIZE
+    page = min(max(page, 0), last_page)
+    start = page * LIST_PAGE_SIZE
+    return rows[start:start + LIST_PAGE_SIZE], page, page < last_page
+
+def _pager_row(user_id: int, list_callback: str, page: int, has_next: bool) -> list:
+    """Previous/Next page buttons for a paginated list; empty when everything fits on one page."""
+    row = []
+    if page > 0:
+        row.append(static_button(user_id, 'button_prev_page', f"{list_callback}:{page - 1}"))
+    if has_next:
+        row.append(static_button(user_id, 'button_next_page', f"{list_callback}:{page + 1}"))
+    return row
+
+def parse_list_page(arg: str) -> int:
+    """Parses the optional page number from list callback data; anything invalid means the first page."""
+    return int(arg) if arg.isdecimal() else 0
+
 # --- Dynamic Reply Keyboard Generation ---
+_MAIN_KEYBOARDS = {} # {language_code: ReplyKeyboardMarkup}, labels only depend on the language
+
 def get_main_keyboard(user_id: int) -> ReplyKeyboardMarkup:
-    """Generates the main ReplyKeyboardMarkup with translated button labels."""
+    """Returns the main ReplyKeyboardMarkup with translated button labels (built once per language)."""
+    lang = get_user_lang(user_id)
+    markup = _MAIN_KEYBOARDS.get(lang)
+    if markup is not None:
+        return markup
     keyboard = [
         [_ (user_id, 'button_start_work')],                     # Row 1
         [
@@ -59,7 +153,46 @@ def get_main_keyboard(user_id: int) -> ReplyKeyboardMarkup:
             _(user_id, 'button_list_tasks')
         ]                                                     # Row 4
     ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    markup = _MAIN_KEYBOARDS[lang] = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return markup
+
+VIEW_TIMER_CACHE_MAX_SIZE = 10_000
+_VIEW_TIMER_MARKUPS = OrderedDict() # {user_id: (language_code, InlineKeyboardMarkup)}, least recently used first
+
+def get_timer_view_markup(user_id: int) -> InlineKeyboardMarkup:
+    """Returns the inline 'View Timer' web app button for a user, reusing the markup built on an earlier start."""
+    lang = get_user_lang(user_id)
+    cached = _VIEW_TIMER_MARKUPS.get(user_id)
+    if cached is not None and cached[0] == lang:
+        _VIEW_TIMER_MARKUPS.move_to_end(user_id)
+        return cached[1]
+    timer_url = f'{DOMAIN_URL}/timer/{user_id}'
+    keyboard = [[InlineKeyboardButton(_(user_id, 'timer_view_button'), web_app=WebAppInfo(url=timer_url))]]
+    markup = InlineKeyboardMarkup(keyboard)
+    _VIEW_TIMER_MARKUPS[user_id] = (lang, markup)
+    _VIEW_TIMER_MARKUPS.move_to_end(user_id)
+    if len(_VIEW_TIMER_MARKUPS) > VIEW_TIMER_CACHE_MAX_SIZE:
+        _VIEW_TIMER_MARKUPS.popitem(last=False)
+    return markup
+
+def require_current_project(no_project_key: str = 'task_create_no_project', end_value=None):
+    """Decorator for message handlers that need a selected project.
+
+    Replies with `no_project_key` and returns `end_value` when the user has no
+    current project; otherwise calls the handler with the extra arguments
+    `project_id` and `project_name` (from the cached current context).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+            user_id = update.message.from_user.id
+            project_id, project_name, _tid, _tname = database.get_current_context(user_id)
+            if not project_id:
+                await update.message.reply_text(_(user_id, no_project_key))
+                return end_value
+            return await func(update, context, project_id, project_name, *args, **kwargs)
+        return wrapper
+    return decorator
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start command handler - sets up a new user and shows main keyboard."""
@@ -69,15 +202,19 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Get user's language from Telegram client if available
     user_language = user.language_code
-    if user_language and user_language in SUPPORTED_LANGUAGES:
-        # Set the user's language in the database if it's a supported language
-        if set_user_lang(user_id, user_language):
-            log.info(f"User {user_id} language automatically set to {user_language} from Telegram client")
-    
-    # Add user to database (this will only insert if new, ignore if exists)
+    if user_language not in SUPPORTED_LANGUAGES:
+        user_language = None
+
+    # Add user to database (this will only insert if new, ignore if exists); a new
+    # row starts with the client language, so no separate language write is needed
     first_name = getattr(user, 'first_name', '')
     last_name = getattr(user, 'last_name', '')
-    database.add_user(user_id, first_name, last_name)
+    is_new_user = database.add_user(user_id, first_name, last_name, language_code=user_language or 'en')
+
+    if user_language and not is_new_user and get_user_lang(user_id) != user_language:
+        # Set the user's language in the database if it's a supported language (and not already set)
+        if set_user_lang(user_id, user_language):
+            log.info(f"User {user_id} language automatically set to {user_language} from Telegram client")
     
     # Show welcome message in user's language
     welcome_message = _(user_id, 'welcome')
@@ -97,14 +234,13 @@ async def _create_project_logic(user: User, context: ContextTypes.DEFAULT_TYPE,
     """Handles the actual creation of a project, including checks and notifications."""
     user_id = user.id
     try:
-        existing_projects = database.get_projects(user_id)
-        for _, existing_name in existing_projects:
-            if existing_name.lower() == project_name.lower():
-                await context.bot.send_message(
-                    chat_id=user_id, 
-                    text=_(user_id, 'project_already_exists', existing_name=existing_name)
-                )
-                return None # Indicate failure (duplicate)
+        existing = database.find_project_by_name(user_id, project_name)
+        if existing:
+            await context.bot.send_message(
+                chat_id=user_id, 
+                text=_(user_id, 'project_already_exists', existing_name=existing[1])
+            )
+            return None # Indicate failure (duplicate)
                 
         added_id = database.add_project(user_id, project_name)
         if added_id:
@@ -112,7 +248,7 @@ async def _create_project_logic(user: User, context: ContextTypes.DEFAULT_TYPE,
             database.set_current_project(user_id, added_id)
             log.info(f"User {user_id} created project '{project_name}' (ID: {added_id}) and set as current")
             # Notify admin
-            await admin_handlers.send_admin_notification(
+            admin_handlers.notify_admin_in_background(
                 context, 
                 f"Project created by {user.first_name} ({user_id}): '{project_name}' (ID: {added_id})"
             )
@@ -180,17 +316,13 @@ async def select_project(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
         
     try:
-        projects = database.get_projects(user_id)
-        project_found = False
-        for proj_id, proj_name_db in projects:
-            if proj_name_db.lower() == project_name.lower(): 
-                database.set_current_project(user_id, proj_id)
-                log.info(f"User {user_id} selected project {proj_id} ('{proj_name_db}') via command.")
-                await update.message.reply_text(_(user_id, 'project_selected', project_name=proj_name_db))
-                project_found = True
-                break
-                
-        if not project_found:
+        project = database.find_project_by_name(user_id, project_name)
+        if project:
+            proj_id, proj_name_db = project
+            database.set_current_project(user_id, proj_id)
+            log.info(f"User {user_id} selected project {proj_id} ('{proj_name_db}') via command.")
+            await update.message.reply_text(_(user_id, 'project_selected', project_name=proj_name_db))
+        else:
             await update.message.reply_text(_(user_id, 'project_not_found'))
             
     except sqlite3.Error as e:
@@ -200,51 +332,66 @@ async def select_project(update: Update, context: ContextTypes.DEFAULT_TYPE):
         log.error(f"Error in select_project command for user {user_id}: {e}", exc_info=True)
         await update.message.reply_text(_(user_id, 'error_unexpected'))
 
+async def render_projects_list(send, user_id: int, projects, page: int = 0):
+    """Sends one page of the active projects list built from already-fetched rows.
+
+    `send` is a coroutine function taking (text, reply_markup=...), e.g.
+    `message.reply_text` or `callback_query.edit_message_text`.
+    """
+    keyboard = []
+    list_title = _(user_id, 'project_list_title') # Translate title
+
+    if not projects:
+        keyboard.append([static_button(user_id, 'project_none_found', "noop_create_project")])
+    else:
+        projects, page, has_next = _list_page(projects, page)
+        current_project_id = database.get_current_project(user_id)
+        done_label = _(user_id, 'button_mark_project_done') # Same labels on every row
+        rename_label = _(user_id, 'button_rename')
+        # Row: [Select Button (➡️ marks the current project), Mark Done Button, Rename Button]
+        # Mark Done carries the page so the redraw stays where the user was
+        keyboard = [
+            [
+                InlineKeyboardButton(f"➡️ {project_name}" if project_id == current_project_id else project_name,
+                                     callback_data=f"select_project:{encoded_id}"),
+                InlineKeyboardButton(done_label, callback_data=f"mark_project_done:{encoded_id}:{page}"),
+                InlineKeyboardButton(rename_label, callback_data=f"rename_project:{encoded_id}")
+            ]
+            for project_id, project_name in projects
+            for encoded_id in (encode_callback_id(project_id),)
+        ]
+        pager = _pager_row(user_id, "list_projects_active", page, has_next)
+        if pager:
+            keyboard.append(pager)
+            
+    # Add button to view archived projects
+    keyboard.append([static_button(user_id, 'button_view_archived_projects', "list_projects_done")])
+    # Add button to create a new project
+    keyboard.append([static_button(user_id, 'button_create_new_project', "create_new_project")])
+        
+    await send(list_title, reply_markup=InlineKeyboardMarkup(keyboard))
+    log.debug(f"Displayed active project list for user {user_id}")
+
+async def show_projects_list(send, user_id: int, page: int = 0):
+    """Fetches the user's active projects and sends one page of the list via `send` (see render_projects_list)."""
+    # Fetch only active projects
+    projects = database.get_projects(user_id, status=STATUS_ACTIVE)
+    await render_projects_list(send, user_id, projects, page)
+
 async def list_projects(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Lists user's active projects with buttons for selection and marking done."""
     user_id = update.effective_user.id
     log.debug(f"User {user_id} requested active project list.")
     try:
-        # Fetch only active projects
-        projects = database.get_projects(user_id, status=STATUS_ACTIVE)
-        
-        keyboard = []
-        list_title = _(user_id, 'project_list_title') # Translate title
-
-        if not projects:
-            keyboard.append([InlineKeyboardButton(_(user_id, 'project_none_found'), callback_data="noop_create_project")]) 
-        else:
-            current_project_id = database.get_current_project(user_id)
-            for project_id, project_name in projects:
-                button_text = project_name
-                if project_id == current_project_id:
-                    button_text = f"➡️ {project_name}" # Indicate current project
-                # Row: [Select Button, Mark Done Button, Rename Button]
-                keyboard.append([
-                    InlineKeyboardButton(button_text, callback_data=f"select_project:{project_id}"),
-                    InlineKeyboardButton(_(user_id, 'button_mark_project_done'), callback_data=f"mark_project_done:{project_id}"),
-                    InlineKeyboardButton(_(user_id, 'button_rename'), callback_data=f"rename_project:{project_id}")
-                ])
-                
-        # Add button to view archived projects
-        keyboard.append([InlineKeyboardButton(_(user_id, 'button_view_archived_projects'), callback_data="list_projects_done")])
-        # Add button to create a new project
-        keyboard.append([InlineKeyboardButton(_(user_id, 'button_create_new_project'), callback_data="create_new_project")])
-            
-        reply_markup = InlineKeyboardMarkup(keyboard)
         # Use edit_message_text if called from a callback, otherwise reply_text
-        if update.callback_query:
-            await update.callback_query.edit_message_text(list_title, reply_markup=reply_markup)
-        else:
-            await update.message.reply_text(list_title, reply_markup=reply_markup)
-        
-        log.debug(f"Displayed active project list for user {user_id}")
+        send = update.callback_query.edit_message_text if update.callback_query else update.message.reply_text
+        await show_projects_list(send, user_id)
     except Exception as e:
         log.error(f"Error listing/editing projects for user {user_id}: {e}", exc_info=True)
         error_msg = _(user_id, 'error_unexpected') # Generic error
         if update.callback_query:
              try: await update.callback_query.message.reply_text(error_msg)
-             except: pass
+             except Exception: pass
         else: 
              await update.message.reply_text(error_msg)
 
@@ -258,11 +405,11 @@ async def delete_project_command(update: Update, context: ContextTypes.DEFAULT_T
             await update.message.reply_text(_(user_id, 'delete_project_none'))
             return
             
-        keyboard = []
-        for project_id, project_name in projects:
-            keyboard.append([InlineKeyboardButton(f"🗑️ {project_name}", callback_data=f"confirm_delete_project:{project_id}")])
-            
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        buttons = [
+            InlineKeyboardButton(f"🗑️ {project_name}", callback_data=f"confirm_delete_project:{encode_callback_id(project_id)}")
+            for project_id, project_name in projects
+        ]
+        reply_markup = InlineKeyboardMarkup(_button_grid(buttons, [name for _pid, name in projects]))
         await update.message.reply_text(_(user_id, 'delete_project_prompt'), reply_markup=reply_markup)
         
         log.debug(f"Displayed project deletion confirmation list for user {user_id}")
@@ -278,29 +425,27 @@ async def _create_task_logic(user: User, context: ContextTypes.DEFAULT_TYPE, tas
     """Handles the actual creation of a task, including checks and notifications."""
     user_id = user.id
     try:
-        current_project_id = database.get_current_project(user_id)
+        current_project_id, project_name = database.get_current_context(user_id)[:2]
         if not current_project_id:
             # This check might be redundant if create_task handles it, but good failsafe
             await context.bot.send_message(chat_id=user_id, text=_(user_id, 'task_create_no_project'))
             return None 
             
-        existing_tasks = database.get_tasks(current_project_id)
-        for _, existing_name in existing_tasks:
-            if existing_name.lower() == task_name.lower():
-                await context.bot.send_message(
-                    chat_id=user_id, 
-                    text=_(user_id, 'task_already_exists', existing_name=existing_name)
-                )
-                return None # Indicate failure (duplicate)
+        existing = database.find_task_by_name(current_project_id, task_name)
+        if existing:
+            await context.bot.send_message(
+                chat_id=user_id, 
+                text=_(user_id, 'task_already_exists', existing_name=existing[1])
+            )
+            return None # Indicate failure (duplicate)
                 
-        project_name = database.get_project_name(current_project_id) # Get project name for logging/notification
         added_id = database.add_task(current_project_id, task_name)
         if added_id and project_name:
             # Set the newly created task as the current/active task
             database.set_current_task(user_id, added_id)
             log.info(f"User {user_id} created task '{task_name}' (ID: {added_id}) in project {current_project_id} ('{project_name}') and set as current")
             # Notify admin
-            await admin_handlers.send_admin_notification(
+            admin_handlers.notify_admin_in_background(
                 context, 
                 f"Task created by {user.first_name} ({user_id}) in project '{project_name}': '{task_name}' (ID: {added_id})"
             )
@@ -325,25 +470,15 @@ async def _create_task_logic(user: User, context: ContextTypes.DEFAULT_TYPE, tas
         return None # Indicate failure (exception)
 
 # --- Task Management Commands ---
-async def create_task(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int | str:
+@require_current_project(end_value=ConversationHandler.END) # End immediately if no project selected
+async def create_task(update: Update, context: ContextTypes.DEFAULT_TYPE, current_project_id: int, project_name: str | None) -> int | str:
     """Starts the task creation conversation or creates directly if name provided."""
     user = update.message.from_user
     user_id = user.id
     task_name = ' '.join(context.args).strip()
     log.debug(f"User {user_id} using /create_task. Args: {context.args}")
 
-    # Check if project is selected BEFORE starting conversation or direct creation
-    try:
-        current_project_id = database.get_current_project(user_id)
-        if not current_project_id:
-            await update.message.reply_text(_(user_id, 'task_create_no_project'))
-            return ConversationHandler.END # End immediately if no project selected
-    except Exception as e:
-        log.error(f"Error checking current project for user {user_id} in create_task: {e}", exc_info=True)
-        await update.message.reply_text(_(user_id, 'error_unexpected'))
-        return ConversationHandler.END
-
-    project_name = database.get_project_name(current_project_id) or "Current Project" # Fallback for prompt
+    project_name = project_name or "Current Project" # Fallback for prompt
 
     if task_name:
         added_id = await _create_task_logic(user, context, task_name)
@@ -372,7 +507,7 @@ async def receive_task_name(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     added_id = await _create_task_logic(user, context, task_name)
     if added_id:
-        project_name = database.get_project_name(database.get_current_project(user_id)) or _(user_id, 'text_the_project') # Fallback text
+        project_name = database.get_current_context(user_id)[1] or _(user_id, 'text_the_project') # Fallback text
         await update.message.reply_text(
             _(user_id, 'task_created_selected', task_name=task_name, project_name=project_name)
         )
@@ -393,9 +528,9 @@ async def cancel_rename(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     user_id = update.message.from_user.id
     log.info(f"User {user_id} cancelled the rename process.")
     # Clean up context data
-    if user_id in context.user_data:
-        context.user_data[user_id].pop('renaming_project_id', None)
-        context.user_data[user_id].pop('renaming_task_id', None)
+    state = get_pending_input(context.user_data, user_id)
+    state.renaming_project_id = None
+    state.renaming_task_id = None
     await update.message.reply_text(_(user_id, 'rename_cancelled'))
     return ConversationHandler.END
 
@@ -413,7 +548,7 @@ async def handle_rename_project_name(update: Update, context: ContextTypes.DEFAU
         return WAITING_RENAME_PROJECT_NAME  # Stay in same state
 
     # Get the project_id from context
-    project_id = context.user_data.get(user_id, {}).get('renaming_project_id')
+    project_id = get_pending_input(context.user_data, user_id).renaming_project_id
     if not project_id:
         log.error(f"No renaming_project_id found in context for user {user_id}")
         await update.message.reply_text(_(user_id, 'error_unexpected'))
@@ -424,13 +559,12 @@ async def handle_rename_project_name(update: Update, context: ContextTypes.DEFAU
 
     # Attempt rename
     try:
-        success = database.rename_project(project_id, new_name)
+        success = database.rename_project(user_id, project_id, new_name)
         if success:
             log.info(f"User {user_id} renamed project {project_id} from '{old_name}' to '{new_name}'")
             await update.message.reply_text(_(user_id, 'project_renamed_success', new_name=new_name))
             # Clean up context
-            if user_id in context.user_data:
-                context.user_data[user_id].pop('renaming_project_id', None)
+            get_pending_input(context.user_data, user_id).renaming_project_id = None
         else:
             # Rename failed, likely duplicate
             await update.message.reply_text(_(user_id, 'rename_project_duplicate', new_name=new_name))
@@ -455,7 +589,7 @@ async def handle_rename_task_name(update: Update, context: ContextTypes.DEFAULT_
         return WAITING_RENAME_TASK_NAME  # Stay in same state
 
     # Get the task_id from context
-    task_id = context.user_data.get(user_id, {}).get('renaming_task_id')
+    task_id = get_pending_input(context.user_data, user_id).renaming_task_id
     if not task_id:
         log.error(f"No renaming_task_id found in context for user {user_id}")
         await update.message.reply_text(_(user_id, 'error_unexpected'))
@@ -466,13 +600,12 @@ async def handle_rename_task_name(update: Update, context: ContextTypes.DEFAULT_
 
     # Attempt rename
     try:
-        success = database.rename_task(task_id, new_name)
+        success = database.rename_task(user_id, task_id, new_name)
         if success:
             log.info(f"User {user_id} renamed task {task_id} from '{old_name}' to '{new_name}'")
             await update.message.reply_text(_(user_id, 'task_renamed_success', new_name=new_name))
             # Clean up context
-            if user_id in context.user_data:
-                context.user_data[user_id].pop('renaming_task_id', None)
+            get_pending_input(context.user_data, user_id).renaming_task_id = None
         else:
             # Rename failed, likely duplicate
             await update.message.reply_text(_(user_id, 'rename_task_duplicate', new_name=new_name))
@@ -483,37 +616,29 @@ async def handle_rename_task_name(update: Update, context: ContextTypes.DEFAULT_
 
     return ConversationHandler.END
 
-async def select_task(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@require_current_project()
+async def select_task(update: Update, context: ContextTypes.DEFAULT_TYPE, current_project_id: int, project_name: str | None):
     """Selects a task by name or lists tasks if no name is given."""
     user_id = update.message.from_user.id
     task_name = ' '.join(context.args)
     log.debug(f"User {user_id} attempting to select task '{task_name}' (or list)")
     
     try:
-        current_project_id = database.get_current_project(user_id)
-        if not current_project_id:
-            await update.message.reply_text(_(user_id, 'task_create_no_project'))
-            return
-            
-        project_name = database.get_project_name(current_project_id) or _(user_id, 'text_selected_project') # Fallback
+        project_name = project_name or _(user_id, 'text_selected_project') # Fallback
 
         if not task_name:
             await list_tasks(update, context)
             return
             
-        tasks = database.get_tasks(current_project_id)
-        task_found = False
-        for task_id, t_name_db in tasks:
-            if t_name_db.lower() == task_name.lower(): 
-                database.set_current_task(user_id, task_id)
-                log.info(f"User {user_id} selected task {task_id} ('{t_name_db}') via command.")
-                await update.message.reply_text(
-                    _(user_id, 'task_selected', task_name=t_name_db, project_name=project_name)
-                )
-                task_found = True
-                break
-                
-        if not task_found:
+        task = database.find_task_by_name(current_project_id, task_name)
+        if task:
+            task_id, t_name_db = task
+            database.set_current_task(user_id, task_id)
+            log.info(f"User {user_id} selected task {task_id} ('{t_name_db}') via command.")
+            await update.message.reply_text(
+                _(user_id, 'task_selected', task_name=t_name_db, project_name=project_name)
+            )
+        else:
             await update.message.reply_text(
                 _(user_id, 'task_not_found', project_name=project_name)
             )
@@ -525,88 +650,96 @@ async def select_task(update: Update, context: ContextTypes.DEFAULT_TYPE):
         log.error(f"Error in select_task command for user {user_id}: {e}", exc_info=True)
         await update.message.reply_text(_(user_id, 'error_unexpected'))
 
+async def render_tasks_list(send, user_id: int, project_id: int, tasks, project_name: str | None = None, page: int = 0):
+    """Sends one page of a project's active tasks list built from already-fetched rows.
+
+    `send` works as in render_projects_list. Pass `project_name` when the caller already has it.
+    """
+    project_name = project_name or database.get_project_name(project_id) or _(user_id, 'text_current_project') # Fallback
+    keyboard = []
+    list_title = _(user_id, 'task_list_title', project_name=project_name)
+    
+    if not tasks:
+        keyboard.append([InlineKeyboardButton(
+            _(user_id, 'task_none_found_in_project', project_name=project_name), 
+            callback_data="noop_create_task"
+        )]) 
+    else:
+        tasks, page, has_next = _list_page(tasks, page)
+        current_task_id = database.get_current_task(user_id)
+        done_label = _(user_id, 'button_mark_task_done') # Same labels on every row
+        rename_label = _(user_id, 'button_rename')
+        encoded_project_id = encode_callback_id(project_id)
+        # Row: [Select Button (➡️ marks the current task), Mark Done Button, Rename Button]
+        keyboard = [
+            [
+                InlineKeyboardButton(f"➡️ {task_name}" if task_id == current_task_id else task_name,
+                                     callback_data=f"select_task:{encoded_id}:{encoded_project_id}"),
+                InlineKeyboardButton(done_label, callback_data=f"mark_task_done:{encoded_id}:{page}"),
+                InlineKeyboardButton(rename_label, callback_data=f"rename_task:{encoded_id}")
+            ]
+            for task_id, task_name in tasks
+            for encoded_id in (encode_callback_id(task_id),)
+        ]
+        pager = _pager_row(user_id, "list_tasks_active", page, has_next)
+        if pager:
+            keyboard.append(pager)
+            
+    # Add button to view archived tasks for this project
+    keyboard.append([static_button(user_id, 'button_view_archived_tasks', "list_tasks_done")])
+    # Add button to create a new task in the current project
+    keyboard.append([static_button(user_id, 'button_create_new_task', "create_new_task")])
+    # Add button to go back to project list
+    keyboard.append([static_button(user_id, 'button_back_to_projects', "list_projects_active")])
+        
+    await send(list_title, reply_markup=InlineKeyboardMarkup(keyboard))
+    log.debug(f"Displayed active task list for user {user_id}")
+
+async def show_tasks_list(send, user_id: int, page: int = 0):
+    """Fetches the active tasks of the user's current project and sends one page of the list via `send`."""
+    current_project_id, project_name = database.get_current_context(user_id)[:2]
+    if not current_project_id:
+         await send(_(user_id, 'task_create_no_project'))
+         return
+        
+    # Fetch only active tasks for the current project
+    tasks = database.get_tasks(current_project_id, status=STATUS_ACTIVE)
+    await render_tasks_list(send, user_id, current_project_id, tasks, project_name, page)
+
 async def list_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Lists active tasks in the current project with selection/done buttons."""
     user_id = update.effective_user.id
     log.debug(f"User {user_id} requested active task list.")
     try:
-        current_project_id = database.get_current_project(user_id)
-        if not current_project_id:
-             message_text = _(user_id, 'task_create_no_project') 
-             if update.callback_query: await update.callback_query.edit_message_text(text=message_text) 
-             else: await update.message.reply_text(text=message_text)
-             return
-            
-        project_name = database.get_project_name(current_project_id) or _(user_id, 'text_current_project') # Fallback
-        # Fetch only active tasks for the current project
-        tasks = database.get_tasks(current_project_id, status=STATUS_ACTIVE)
-        
-        keyboard = []
-        list_title = _(user_id, 'task_list_title', project_name=project_name)
-        
-        if not tasks:
-            keyboard.append([InlineKeyboardButton(
-                _(user_id, 'task_none_found_in_project', project_name=project_name), 
-                callback_data="noop_create_task"
-            )]) 
-        else:
-            current_task_id = database.get_current_task(user_id)
-            for task_id, task_name in tasks:
-                button_text = task_name
-                if task_id == current_task_id:
-                     button_text = f"➡️ {task_name}"
-                # Row: [Select Button, Mark Done Button, Rename Button]
-                keyboard.append([
-                    InlineKeyboardButton(button_text, callback_data=f"select_task:{task_id}"),
-                    InlineKeyboardButton(_(user_id, 'button_mark_task_done'), callback_data=f"mark_task_done:{task_id}"),
-                    InlineKeyboardButton(_(user_id, 'button_rename'), callback_data=f"rename_task:{task_id}")
-                ])
-                
-        # Add button to view archived tasks for this project
-        keyboard.append([InlineKeyboardButton(_(user_id, 'button_view_archived_tasks'), callback_data="list_tasks_done")])
-        # Add button to create a new task in the current project
-        keyboard.append([InlineKeyboardButton(_(user_id, 'button_create_new_task'), callback_data="create_new_task")])
-        # Add button to go back to project list
-        keyboard.append([InlineKeyboardButton(_(user_id, 'button_back_to_projects'), callback_data="list_projects_active")])
-            
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        if update.callback_query:
-            await update.callback_query.edit_message_text(text=list_title, reply_markup=reply_markup)
-        else:
-            await update.message.reply_text(text=list_title, reply_markup=reply_markup)
-        
-        log.debug(f"Displayed active task list for user {user_id}")
+        send = update.callback_query.edit_message_text if update.callback_query else update.message.reply_text
+        await show_tasks_list(send, user_id)
     except Exception as e:
         log.error(f"Error listing/editing tasks for user {user_id}: {e}", exc_info=True)
         error_msg = _(user_id, 'error_unexpected') # Generic error
         if update.callback_query:
              try: await update.callback_query.message.reply_text(error_msg) 
-             except: pass
+             except Exception: pass
         else: 
              await update.message.reply_text(error_msg)
 
-async def delete_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@require_current_project('delete_task_no_project')
+async def delete_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE, current_project_id: int, project_name: str | None):
     """Initiates the task deletion process."""
     user_id = update.message.from_user.id
     log.debug(f"User {user_id} initiated task deletion process.")
     try:
-        current_project_id = database.get_current_project(user_id) 
-        if not current_project_id:
-            await update.message.reply_text(_(user_id, 'delete_task_no_project'))
-            return
-            
         tasks = database.get_tasks(current_project_id)
-        project_name = database.get_project_name(current_project_id) or _(user_id, 'text_current_project') # Fallback
+        project_name = project_name or _(user_id, 'text_current_project') # Fallback
         
         if not tasks:
             await update.message.reply_text(_(user_id, 'delete_task_none', project_name=project_name))
             return
             
-        keyboard = []
-        for task_id, task_name in tasks:
-            keyboard.append([InlineKeyboardButton(f"🗑️ {task_name}", callback_data=f"confirm_delete_task:{task_id}")])
-            
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        buttons = [
+            InlineKeyboardButton(f"🗑️ {task_name}", callback_data=f"confirm_delete_task:{encode_callback_id(task_id)}")
+            for task_id, task_name in tasks
+        ]
+        reply_markup = InlineKeyboardMarkup(_button_grid(buttons, [name for _tid, name in tasks]))
         await update.message.reply_text(
             _(user_id, 'delete_task_prompt', project_name=project_name), 
             reply_markup=reply_markup
@@ -621,64 +754,60 @@ async def delete_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text(_(user_id, 'error_unexpected'))
 
 # --- Helper Function for Starting Timers ---
-async def _start_timer_internal(context: ContextTypes.DEFAULT_TYPE, user_id: int, duration_minutes: int, session_type: str, project_name: str = None, task_name: str = None):
+async def _safe_send(bot, user_id: int, text: str, **kwargs) -> bool:
+    """Sends a message to the user, logging (not raising) delivery failures. Returns True if sent."""
+    try:
+        await bot.send_message(chat_id=user_id, text=text, **kwargs)
+        return True
+    except Exception as bot_error:
+        log.error(f"Failed to send message to user {user_id}: {bot_error}")
+        return False
+
+def schedule_timer_job(job_queue, user_id: int, duration_minutes, session_type: str, run_in_minutes=None):
+    """Schedules timer_finished for a timer; it fires after `run_in_minutes` (default: the full duration)."""
+    if run_in_minutes is None:
+        run_in_minutes = duration_minutes
+    job_data = {'user_id': user_id, 'duration': duration_minutes, 'session_type': session_type}
+    return job_queue.run_once(timer_finished, run_in_minutes * 60, data=job_data, name=f"timer_{user_id}")
+
+async def _start_timer_internal(context: ContextTypes.DEFAULT_TYPE, user_id: int, duration_minutes: int, session_type: str, project_name: str = None, task_name: str = None,
+                                project_id: int = None, task_id: int = None):
     """Internal helper to start a timer job (work or break)."""
     existing_state = timer_states.get(user_id)
-    if existing_state and existing_state.get('state') not in ('finished', 'stopped', None):
-        log.warning(f"Attempted to start timer for user {user_id} but another timer is active (state: {existing_state.get('state')}).")
-        try:
-             await context.bot.send_message(chat_id=user_id, text=_(user_id, 'timer_already_active'))
-        except Exception as bot_error:
-             log.error(f"Failed to send message to user {user_id}: {bot_error}")
+    if existing_state and existing_state.state not in (TIMER_FINISHED, TIMER_STOPPED, None):
+        log.warning(f"Attempted to start timer for user {user_id} but another timer is active (state: {existing_state.state}).")
+        await _safe_send(context.bot, user_id, _(user_id, 'timer_already_active'))
         return False
 
     # Clear any finished/stopped state before starting new timer
     if existing_state:
-        del timer_states[user_id]
+        timer_states.pop(user_id, None)
 
     log.info(f"Starting {session_type} timer ({duration_minutes} min) for user {user_id}")
-    job_data = {'user_id': user_id, 'duration': duration_minutes, 'session_type': session_type}
-    
     try:
-        job = context.job_queue.run_once(timer_finished, duration_minutes * 60, data=job_data, name=f"timer_{user_id}")
+        job = schedule_timer_job(context.job_queue, user_id, duration_minutes, session_type)
     except Exception as job_error:
         log.error(f"Failed to schedule timer job for user {user_id}: {job_error}", exc_info=True)
-        try:
-            await context.bot.send_message(chat_id=user_id, text=_(user_id, 'timer_schedule_failed'))
-        except Exception as bot_error:
-             log.error(f"Failed to send error message to user {user_id}: {bot_error}")
+        await _safe_send(context.bot, user_id, _(user_id, 'timer_schedule_failed'))
         return False
         
     now = datetime.now()
-    timer_states[user_id] = {
-        'state': 'running',
-        'accumulated_time': 0,
-        'start_time': now,
-        'initial_start_time': now,
-        'duration': duration_minutes,
-        'session_type': session_type, 
-        'job': job
-    }
+    timer_states[user_id] = TimerState(
+        duration=duration_minutes, session_type=session_type, job=job,
+        start_time=now, initial_start_time=now, project_id=project_id, task_id=task_id
+    )
 
-    timer_url = f'{DOMAIN_URL}/timer/{user_id}'
-    keyboard = [[InlineKeyboardButton(_(user_id, 'timer_view_button'), web_app=WebAppInfo(url=timer_url))]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = get_timer_view_markup(user_id)
     
     message = ""
-    if session_type == 'work' and project_name and task_name:
+    if session_type == SESSION_WORK and project_name and task_name:
         message = _(user_id, 'timer_work_started', task_name=task_name, project_name=project_name, duration_minutes=duration_minutes)
-    elif session_type == 'work':
+    elif session_type == SESSION_WORK:
          message = _(user_id, 'timer_work_started_no_project', duration_minutes=duration_minutes)
-    elif session_type == 'break':
+    elif session_type == SESSION_BREAK:
         message = _(user_id, 'timer_break_started', duration_minutes=duration_minutes)
 
-    try:
-        await context.bot.send_message(chat_id=user_id, text=message, reply_markup=reply_markup)
-    except Exception as bot_error:
-        log.error(f"Failed to send timer start confirmation to user {user_id}: {bot_error}")
-        return False
-        
-    return True
+    return await _safe_send(context.bot, user_id, message, reply_markup=reply_markup)
 
 # --- Task Manager Command ---
 async def open_task_manager(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -705,23 +834,19 @@ async def start_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     log.debug(f"/start_timer command received from user {user_id}")
     try:
         existing_state = timer_states.get(user_id)
-        if existing_state and existing_state.get('state') in ('running', 'paused'):
+        if existing_state and existing_state.state in ACTIVE_TIMER_STATES:
             await update.message.reply_text(_(user_id, 'timer_already_active'))
             return
         # Clear any finished/stopped state
         if existing_state:
-            del timer_states[user_id]
+            timer_states.pop(user_id, None)
             
-        project_id = database.get_current_project(user_id)
-        task_id = database.get_current_task(user_id)
+        project_id, project_name, project_status, task_id, task_name, task_status = database.get_timer_start_context(user_id)
         if not project_id or not task_id:
             await update.message.reply_text(_(user_id, 'timer_needs_project_task'))
             return
             
         # --- Check Project and Task Status --- 
-        project_status = database.get_project_status(project_id)
-        task_status = database.get_task_status(task_id)
-        
         if project_status != database.STATUS_ACTIVE:
             log.warning(f"User {user_id} tried to start timer on inactive/done project {project_id}.")
             await update.message.reply_text(_(user_id, 'timer_project_archived'))
@@ -735,29 +860,28 @@ async def start_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         # --- End Status Check --- 
             
-        project_name = database.get_project_name(project_id)
-        task_name = database.get_task_name(task_id)
-        
         if not project_name or not task_name:
             # This check might be redundant now with status check, but keep as fallback
             await update.message.reply_text(_(user_id, 'timer_project_task_missing'))
-            database.clear_current_task(user_id)
-            database.clear_current_project(user_id)
+            database.clear_current_project(user_id) # Clears the task too, in one UPDATE
             return
 
         duration_minutes = 25 
         if context.args:
-            try:
-                requested_duration = int(context.args[0])
-                if 1 <= requested_duration <= 120: 
+            duration_arg = context.args[0]
+            # int() takes one leading sign plus the digits isdecimal() accepts
+            unsigned_arg = duration_arg[1:] if duration_arg.startswith(('+', '-')) else duration_arg
+            if unsigned_arg.isdecimal():
+                requested_duration = int(duration_arg)
+                if 1 <= requested_duration <= 120:
                     duration_minutes = requested_duration
                 else:
                     await update.message.reply_text(_(user_id, 'timer_invalid_duration'))
                     return
-            except (ValueError, IndexError):
+            else:
                 await update.message.reply_text(_(user_id, 'timer_invalid_duration_fallback', default_duration=25))
         
-        await _start_timer_internal(context, user_id, duration_minutes, 'work', project_name, task_name)
+        await _start_timer_internal(context, user_id, duration_minutes, SESSION_WORK, project_name, task_name, project_id, task_id)
 
     except sqlite3.Error as e:
         log.error(f"DB Error in start_timer for user {user_id}: {e}")
@@ -769,13 +893,22 @@ async def start_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def start_break_timer(context: ContextTypes.DEFAULT_TYPE, user_id: int, duration_minutes: int):
     log.debug(f"Starting break timer ({duration_minutes} min) for user {user_id}")
     try:
-        await _start_timer_internal(context, user_id, duration_minutes, 'break')
+        await _start_timer_internal(context, user_id, duration_minutes, SESSION_BREAK)
     except Exception as e:
         log.error(f"Error in start_break_timer for user {user_id}: {e}", exc_info=True)
-        try:
-            await context.bot.send_message(chat_id=user_id, text=_(user_id, 'timer_error_starting_break'))
-        except Exception as bot_error:
-             log.error(f"Failed to send error message to user {user_id}: {bot_error}")
+        await _safe_send(context.bot, user_id, _(user_id, 'timer_error_starting_break'))
+
+def work_session_target(user_id: int, timer: TimerState):
+    """Returns (project_id, project_name, task_id, task_name) a work session should be logged against.
+
+    Uses the project/task recorded when the timer started; names come from the
+    name cache, so a project/task deleted meanwhile shows up as a missing name.
+    Timers without a recorded target fall back to the user's current selection.
+    """
+    if timer.project_id and timer.task_id:
+        return (timer.project_id, database.get_project_name(timer.project_id),
+                timer.task_id, database.get_task_name(timer.task_id))
+    return database.get_current_context(user_id)
 
 # --- Timer Finish Callback ---
 async def timer_finished(context: ContextTypes.DEFAULT_TYPE):
@@ -783,55 +916,47 @@ async def timer_finished(context: ContextTypes.DEFAULT_TYPE):
     user_id = job.data['user_id']
     duration_minutes = job.data['duration'] 
     session_type = job.data['session_type']
-    log.info(f"Timer finished job running for user {user_id}, type: {session_type}, duration: {duration_minutes}")
+    log.info("Timer finished job running for user %s, type: %s, duration: %s", user_id, session_type, duration_minutes)
     
     try:
         timer_state_entry = timer_states.get(user_id)
-        if timer_state_entry and timer_state_entry.get('job') == job:
-            log.debug(f"Timer state found for user {user_id}, processing completion.")
+        if timer_state_entry and timer_state_entry.job == job:
+            log.debug("Timer state found for user %s, processing completion.", user_id)
             project_id, task_id, project_name, task_name = None, None, None, None
-            initial_start_time = timer_state_entry['initial_start_time']
+            initial_start_time = timer_state_entry.initial_start_time
             is_completed = 1 # Timer finished naturally
             
-            if session_type == 'work':
-                project_id = database.get_current_project(user_id)
-                task_id = database.get_current_task(user_id)
+            if session_type == SESSION_WORK:
+                project_id, project_name, task_id, task_name = work_session_target(user_id, timer_state_entry)
                 if project_id and task_id:
-                     project_name = database.get_project_name(project_id)
-                     task_name = database.get_task_name(task_id)
                      if not project_name or not task_name:
-                          log.warning(f"Work timer finished for {user_id}, but project/task name missing (deleted?).")
+                          log.warning("Work timer finished for %s, but project/task name missing (deleted?).", user_id)
                           project_id, task_id = None, None # Ensure they are None if names missing
                 else:
-                    log.warning(f"Work timer finished for {user_id}, but project/task not selected in DB.")
+                    log.warning("Work timer finished for %s, but project/task not selected in DB.", user_id)
                     await context.bot.send_message(
                         chat_id=user_id,
                         text=_(user_id, 'timer_finished_work_unselected', duration_minutes=duration_minutes)
                     )
                     # Mark as finished instead of deleting
-                    timer_state_entry['state'] = 'finished'
-                    timer_state_entry['job'] = None
+                    timer_state_entry.state = TIMER_FINISHED
+                    timer_state_entry.job = None
                     return 
             
-            # Add session to DB
-            session_added_id = database.add_pomodoro_session(
+            # Queue session for the next batched DB write
+            database.queue_pomodoro_session(
                 user_id=user_id, project_id=project_id, task_id=task_id,
                 start_time=initial_start_time, duration_minutes=duration_minutes, 
                 session_type=session_type, completed=is_completed       
             )
             
             # Prepare message and attempt auto-append *if* it was a work session
-            if session_type == 'work' and project_id and task_id:
+            if session_type == SESSION_WORK and project_id and task_id:
                 success_message = _(user_id, 'timer_finished_work_success', 
                                     project_name=project_name, 
                                     task_name=task_name, 
                                     duration_minutes=duration_minutes)
-                keyboard = [
-                    [InlineKeyboardButton(_(user_id, 'timer_button_break_5'), callback_data="start_break:5")],
-                    [InlineKeyboardButton(_(user_id, 'timer_button_break_10'), callback_data="start_break:10")],
-                    [InlineKeyboardButton(_(user_id, 'timer_button_break_15'), callback_data="start_break:15")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = _static_menu(user_id, _BREAK_MENU_ROWS)
                 await context.bot.send_message(chat_id=user_id, text=success_message, reply_markup=reply_markup)
                 # Jira worklog prompt if task is Jira-linked
                 jira_key = get_jira_key_from_task_name(task_name)
@@ -847,56 +972,107 @@ async def timer_finished(context: ContextTypes.DEFAULT_TYPE):
                         reply_markup=jira_reply_markup
                     )
                 
-            elif session_type == 'break':
+            elif session_type == SESSION_BREAK:
                  success_message = _(user_id, 'timer_finished_break_success', duration_minutes=duration_minutes)
                  await context.bot.send_message(chat_id=user_id, text=success_message)
 
-            log.info(f"Session type '{session_type}' completed and logged for user {user_id}.")
+            log.info("Session type '%s' completed and logged for user %s.", session_type, user_id)
             # Mark as finished instead of deleting, so web app knows what type of session finished
-            timer_state_entry['state'] = 'finished'
-            timer_state_entry['job'] = None  # Clear the job reference
+            timer_state_entry.state = TIMER_FINISHED
+            timer_state_entry.job = None  # Clear the job reference
                 
         else:
-            log.warning(f"Timer finished job executed for user {user_id}, but state was missing or job outdated.")
+            log.warning("Timer finished job executed for user %s (%s), but state was missing or job outdated.", user_id, session_type)
 
     except Exception as e: # Broader catch for unexpected errors during processing
-        log.error(f"Unexpected error processing finished timer job for user {user_id}: {e}", exc_info=True)
-        try: await context.bot.send_message(chat_id=user_id, text=_(user_id, 'timer_error_finishing'))
-        except: pass
+        log.error("Unexpected error processing finished timer job for user %s: %s", user_id, e, exc_info=True)
+        await _safe_send(context.bot, user_id, _(user_id, 'timer_error_finishing'))
         # Mark as finished even on error, so web app can handle it
-        if user_id in timer_states:
-            timer_states[user_id]['state'] = 'finished'
-            timer_states[user_id]['job'] = None
+        timer_state_entry = timer_states.get(user_id)
+        if timer_state_entry:
+            timer_state_entry.state = TIMER_FINISHED
+            timer_state_entry.job = None
+
+_last_timer_snapshot = None # Rows written by the last save_timer_states(), to skip unchanged snapshots
+
+def save_timer_states():
+    """Writes running/paused timers to the database so they survive a restart."""
+    global _last_timer_snapshot
+    rows = sorted(
+        (user_id, timer.state, timer.session_type, timer.duration, timer.accumulated_time,
+         timer.start_time.isoformat() if timer.start_time else None,
+         timer.initial_start_time.isoformat() if timer.initial_start_time else None,
+         timer.project_id, timer.task_id)
+        for user_id, timer in list(timer_states.items())
+        if timer.state in ACTIVE_TIMER_STATES
+    )
+    if rows == _last_timer_snapshot:
+        return
+    if database.save_active_timers(rows):
+        _last_timer_snapshot = rows
+
+def restore_timer_states(job_queue):
+    """Rebuilds timer_states from the stored snapshot and reschedules running timers.
+
+    Timers that ran out while the bot was down fire right away, so the session is
+    logged and the user notified as usual.
+    """
+    global _last_timer_snapshot
+    rows = database.get_active_timers()
+    now = datetime.now()
+    for user_id, state, session_type, duration, accumulated_time, start_iso, initial_iso, project_id, task_id in rows:
+        start_time = datetime.fromisoformat(start_iso) if start_iso else None
+        timer = TimerState(
+            duration=duration, session_type=session_type, state=state,
+            accumulated_time=accumulated_time, start_time=start_time,
+            initial_start_time=datetime.fromisoformat(initial_iso) if initial_iso else start_time,
+            project_id=project_id, task_id=task_id
+        )
+        if state == TIMER_RUNNING:
+            running_seconds = max((now - start_time).total_seconds(), 0) if start_time else 0
+            timer.start_monotonic -= running_seconds
+            remaining_minutes = max(duration - accumulated_time - running_seconds / 60, 0)
+            timer.job = schedule_timer_job(job_queue, user_id, duration, session_type, run_in_minutes=remaining_minutes)
+        timer_states[user_id] = timer
+    _last_timer_snapshot = sorted(rows)
+    if rows:
+        log.info(f"Restored {len(rows)} active timer(s) from the database.")
+
+def _persist_state():
+    """Writes buffered pomodoro sessions, then the active timer snapshot."""
+    database.flush_pomodoro_sessions()
+    save_timer_states()
+
+async def persist_state_job(context: ContextTypes.DEFAULT_TYPE):
+    """Repeating job for _persist_state, run in a worker thread so the commits don't block the event loop."""
+    await asyncio.to_thread(_persist_state)
 
 async def pause_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     log.debug(f"/pause_timer received from user {user_id}")
     try:
         state_data = timer_states.get(user_id)
-        timer_type = state_data.get('session_type', 'timer') if state_data else 'timer'
-        if not state_data or state_data['state'] != 'running':
+        timer_type = state_data.session_type if state_data else 'timer'
+        if not state_data or state_data.state != TIMER_RUNNING:
             await update.message.reply_text(_(user_id, 'timer_not_running', timer_type=timer_type))
             return
             
-        current_time = datetime.now()
-        start_time = state_data.get('start_time')
-        if not start_time:
+        if not state_data.start_time:
              log.error(f"Missing start_time in timer state for user {user_id} during pause.")
              await update.message.reply_text(_(user_id, 'timer_state_inconsistent'))
              return
 
-        time_worked = (current_time - start_time).total_seconds() / 60
-        state_data['accumulated_time'] += time_worked
-        state_data['state'] = 'paused'
+        state_data.accumulated_time += state_data.running_minutes()
+        state_data.state = TIMER_PAUSED
         
-        job = state_data.get('job')
+        job = state_data.job
         if job:
             job.schedule_removal()
-            state_data['job'] = None
+            state_data.job = None
             log.debug(f"Removed scheduled job for paused timer (user {user_id}).")
 
         # Format accumulated_time as MM:SS for user-facing message
-        accumulated_time_formatted = format_minutes_as_mmss(state_data.get('accumulated_time', 0))
+        accumulated_time_formatted = format_minutes_as_mmss(state_data.accumulated_time)
         await update.message.reply_text(
             _(user_id, 'timer_paused',
               timer_type=timer_type.capitalize(),
@@ -916,23 +1092,24 @@ async def resume_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     log.debug(f"/resume_timer received from user {user_id}")
     try:
         state_data = timer_states.get(user_id)
-        if not state_data or state_data['state'] != 'paused':
+        if not state_data or state_data.state != TIMER_PAUSED:
             await update.message.reply_text(_(user_id, 'timer_not_paused'))
             return
             
-        duration_minutes = state_data['duration']
-        accumulated_time = state_data['accumulated_time']
-        session_type = state_data['session_type']
-        initial_start_time = state_data['initial_start_time']
+        duration_minutes = state_data.duration
+        accumulated_time = state_data.accumulated_time
+        session_type = state_data.session_type
+        initial_start_time = state_data.initial_start_time
         remaining_time_minutes = duration_minutes - accumulated_time
         
         if remaining_time_minutes <= 0:
             log.info(f"Attempted to resume completed timer for user {user_id}. Cleaning up.")
             await update.message.reply_text(_(user_id, 'timer_already_completed'))
             try:
-                project_id = database.get_current_project(user_id) if session_type == 'work' else None
-                task_id = database.get_current_task(user_id) if session_type == 'work' else None
-                database.add_pomodoro_session(
+                project_id, task_id = None, None
+                if session_type == SESSION_WORK:
+                    project_id, _pname, task_id, _tname = work_session_target(user_id, state_data)
+                database.queue_pomodoro_session(
                     user_id=user_id, project_id=project_id, task_id=task_id,
                     start_time=initial_start_time, duration_minutes=accumulated_time,
                     session_type=session_type, completed=1 
@@ -942,15 +1119,11 @@ async def resume_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
             except Exception as log_err:
                  log.error(f"Unexpected error logging completed session on resume for user {user_id}: {log_err}")
             finally:
-                 if user_id in timer_states: del timer_states[user_id] 
+                 timer_states.pop(user_id, None)
             return
             
-        job_data = {'user_id': user_id, 'duration': duration_minutes, 'session_type': session_type}
-        job = context.job_queue.run_once(timer_finished, remaining_time_minutes * 60, data=job_data, name=f"timer_{user_id}")
-        
-        state_data['state'] = 'running'
-        state_data['start_time'] = datetime.now()
-        state_data['job'] = job
+        job = schedule_timer_job(context.job_queue, user_id, duration_minutes, session_type, run_in_minutes=remaining_time_minutes)
+        state_data.mark_resumed(job)
 
         # Format remaining_time as MM:SS for user-facing message
         remaining_time_formatted = format_minutes_as_mmss(remaining_time_minutes)
@@ -982,41 +1155,36 @@ async def stop_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(_(user_id, 'timer_no_timer_active'))
         return
 
-    session_type = state_data.get('session_type', 'work')
-    duration_minutes = state_data.get('duration', 25)
-    initial_start_time = state_data.get('initial_start_time') or state_data.get('start_time')
-    job = state_data.get('job')
+    session_type = state_data.session_type
+    duration_minutes = state_data.duration
+    initial_start_time = state_data.initial_start_time or state_data.start_time
+    job = state_data.job
 
     try:
         # Accumulate if running
-        if state_data.get('state') == 'running':
-            current_time = datetime.now()
-            start_time = state_data.get('start_time')
-            if not start_time:
+        if state_data.state == TIMER_RUNNING:
+            if not state_data.start_time:
                 log.error(f"Missing start_time in timer state for user {user_id} during stop.")
                 await update.message.reply_text(_(user_id, 'timer_state_inconsistent'))
                 return
-            elapsed = (current_time - start_time).total_seconds() / 60
-            state_data['accumulated_time'] = state_data.get('accumulated_time', 0) + elapsed
+            state_data.accumulated_time += state_data.running_minutes()
 
-        accumulated_time = float(state_data.get('accumulated_time', 0))
-        completed = 1 if accumulated_time >= (duration_minutes - 0.01) else 0
+        accumulated_time = float(state_data.accumulated_time)
+        completed = state_data.completed_flag()
 
         # Resolve project/task for work sessions
         project_id = None
         task_id = None
         project_name = None
         task_name = None
-        if session_type == 'work':
-            project_id = database.get_current_project(user_id)
-            task_id = database.get_current_task(user_id)
-            if project_id and task_id:
-                project_name = database.get_project_name(project_id)
-                task_name = database.get_task_name(task_id)
-
-        # Persist
+        if session_type == SESSION_WORK:
+            project_id, project_name, task_id, task_name = work_session_target(user_id, state_data)
+            if not (project_id and task_id):
+                project_name, task_name = None, None
+
+        # Persist (batched)
         try:
-            database.add_pomodoro_session(
+            database.queue_pomodoro_session(
                 user_id=user_id,
                 project_id=project_id,
                 task_id=task_id,
@@ -1031,7 +1199,7 @@ async def stop_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # User message
         try:
             accumulated_str = format_minutes_as_mmss(accumulated_time)
-            if session_type == 'work':
+            if session_type == SESSION_WORK:
                 if project_id and task_id and project_name and task_name:
                     await update.message.reply_text(
                         _(user_id, 'timer_stopped_work', project_name=project_name, task_name=task_name,
@@ -1074,8 +1242,7 @@ async def stop_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 job.schedule_removal()
         except Exception as cancel_err:
             log.warning(f"Failed to cancel job for user {user_id}: {cancel_err}")
-        if user_id in timer_states:
-            del timer_states[user_id]
+        timer_states.pop(user_id, None)
 
 # --- Helper Function for Report Titles --- 
 def _get_report_title(user_id: int, report_type: str, report_date_str: str | None, offset: int) -> str:
@@ -1123,11 +1290,44 @@ def _get_report_title(user_id: int, report_type: str, report_date_str: str | Non
 
 # --- Report Commands ---
 
+# Reports are sent with legacy Markdown: names outside an entity get their markers
+# backslash-escaped; inside the bold project label a '*' must close, escape and reopen
+_MD_ESCAPE_TABLE = str.maketrans({'_': '\\_', '*': '\\*', '`': '\\`', '[': '\\['})
+_MD_BOLD_ESCAPE_TABLE = str.maketrans({'*': '*\\**'})
+
+def _md_escape(text, table=_MD_ESCAPE_TABLE) -> str:
+    """Escapes a user-supplied name for a legacy Markdown message in a single pass."""
+    return str(text).translate(table)
+
+@functools.lru_cache(maxsize=512)
+def _format_report_day(date_str) -> str:
+    """Formats a 'YYYY-MM-DD' day from the weekly breakdown as e.g. 'Mon, Oct 13' (anything else as-is)."""
+    # Dates come from SQLite DATE(), so they are 'YYYY-MM-DD' strings (or NULL); the shape
+    # check keeps anything else off the exception path
+    if isinstance(date_str, str) and len(date_str) >= 10 and date_str[4] == '-' and date_str[7] == '-':
+        try:
+            return datetime.fromisoformat(date_str[:10]).strftime("%a, %b %d")
+        except ValueError:
+            pass
+    return str(date_str)
+
+def _breakdown_lines(user_id: int, breakdown, total_minutes: float):
+    """Yields the project lines (with share of total) and their task lines of a report breakdown."""
+    pct_scale = 100.0 / total_minutes # Callers only pass a non-zero total
+    for project_data in breakdown:
+        proj_mins = project_data['project_minutes']
+        yield _(user_id, 'report_project_line_percentage',
+                project_name=_md_escape(project_data['project_name'], _MD_BOLD_ESCAPE_TABLE),
+                minutes=f"{proj_mins:.1f}", percentage=f"{proj_mins * pct_scale:.1f}")
+        for task_data in project_data['tasks']:
+            yield _(user_id, 'report_task_line', task_name=_md_escape(task_data['task_name']),
+                    minutes=f"{task_data['task_minutes']:.1f}")
+
 async def report_daily(update: Update, context: ContextTypes.DEFAULT_TYPE, offset: int = 0):
     """Sends the daily report with navigation."""
     user_id = update.effective_user.id
     log.info(f"Generating daily report for user {user_id}, offset {offset}")
-    report_date, total_minutes, detailed_breakdown = database.get_daily_report(user_id, offset=offset)
+    report_date, total_minutes, detailed_breakdown = await asyncio.to_thread(database.get_daily_report, user_id, offset=offset)
     
     # Get base report title content
     if offset == 0:
@@ -1159,24 +1359,7 @@ async def report_daily(update: Update, context: ContextTypes.DEFAULT_TYPE, offse
         
         if detailed_breakdown:
             report_lines.append("\n" + _(user_id, 'report_project_task_breakdown'))
-            for project_data in detailed_breakdown:
-                proj_name = project_data['project_name']
-                proj_mins = project_data['project_minutes']
-                percentage = (proj_mins / total_minutes) * 100 if total_minutes > 0 else 0
-                
-                # Add project line without formatting in code
-                report_lines.append(_(user_id, 'report_project_line_percentage', 
-                                    project_name=proj_name, 
-                                    minutes=f"{proj_mins:.1f}", 
-                                    percentage=f"{percentage:.1f}"))
-                
-                # Add task lines
-                for task_data in project_data['tasks']:
-                    task_name = task_data['task_name']
-                    task_mins = task_data['task_minutes']
-                    report_lines.append(_(user_id, 'report_task_line', 
-                                        task_name=task_name, 
-                                        minutes=f"{task_mins:.1f}"))
+            report_lines.extend(_breakdown_lines(user_id, detailed_breakdown, total_minutes))
         else:
             report_lines.append(_(user_id, 'report_no_project_task_data'))
 
@@ -1222,7 +1405,7 @@ async def report_weekly(update: Update, context: ContextTypes.DEFAULT_TYPE, offs
     """Sends the weekly report with navigation."""
     user_id = update.effective_user.id
     log.info(f"Generating weekly report for user {user_id}, offset {offset}")
-    week_start_date, total_minutes, daily_breakdown, detailed_project_task_breakdown = database.get_weekly_report(user_id, offset=offset)
+    week_start_date, total_minutes, daily_breakdown, detailed_project_task_breakdown = await asyncio.to_thread(database.get_weekly_report, user_id, offset=offset)
     
     # Get base report title content
     if offset == 0:
@@ -1258,37 +1441,13 @@ async def report_weekly(update: Update, context: ContextTypes.DEFAULT_TYPE, offs
         if daily_breakdown:
             report_lines.append("\n" + _(user_id, 'report_daily_breakdown'))
             for date_str, minutes in daily_breakdown:
-                try:
-                    date_obj = datetime.fromisoformat(date_str)
-                    date_display = date_obj.strftime("%a, %b %d")
-                    report_lines.append(_(user_id, 'report_daily_line', 
-                                        date=date_display, 
-                                        minutes=f"{minutes:.1f}"))
-                except (ValueError, TypeError):
-                    report_lines.append(_(user_id, 'report_daily_line', 
-                                        date=date_str, 
-                                        minutes=f"{minutes:.1f}"))
+                report_lines.append(_(user_id, 'report_daily_line', 
+                                    date=_format_report_day(date_str), 
+                                    minutes=f"{minutes:.1f}"))
         
         if detailed_project_task_breakdown:
             report_lines.append("\n" + _(user_id, 'report_project_task_breakdown'))
-            for project_data in detailed_project_task_breakdown:
-                proj_name = project_data['project_name']
-                proj_mins = project_data['project_minutes']
-                percentage = (proj_mins / total_minutes) * 100 if total_minutes > 0 else 0
-                
-                # Add project line without formatting in code
-                report_lines.append(_(user_id, 'report_project_line_percentage', 
-                                    project_name=proj_name, 
-                                    minutes=f"{proj_mins:.1f}", 
-                                    percentage=f"{percentage:.1f}"))
-                
-                # Add task lines
-                for task_data in project_data['tasks']:
-                    task_name = task_data['task_name']
-                    task_mins = task_data['task_minutes']
-                    report_lines.append(_(user_id, 'report_task_line', 
-                                        task_name=task_name, 
-                                        minutes=f"{task_mins:.1f}"))
+            report_lines.extend(_breakdown_lines(user_id, detailed_project_task_breakdown, total_minutes))
         elif not daily_breakdown:
             report_lines.append(_(user_id, 'report_no_project_task_data'))
 
@@ -1336,23 +1495,16 @@ async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     log.info(f"/report command received from user {user_id} with args: {context.args}")
     try:
         if not context.args or len(context.args) == 0:
-            keyboard = [ 
-                # Change callback data to include offset 0 for initial view
-                [InlineKeyboardButton(_(user_id, 'report_button_daily'), callback_data="report_nav:daily:0")],
-                [InlineKeyboardButton(_(user_id, 'report_button_weekly'), callback_data="report_nav:weekly:0")],
-                [InlineKeyboardButton(_(user_id, 'report_button_monthly'), callback_data="report_nav:monthly:0")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = _static_menu(user_id, _REPORT_MENU_ROWS)
             await update.message.reply_text(_(user_id, 'report_select_prompt'), reply_markup=reply_markup)
             return
         
         # Handling direct calls like /report daily (less common now with buttons)
-        report_type = context.args[0].lower()
-        offset = 0 # Default to current period if called directly
-        if report_type == "daily": await report_daily(update, context, offset=offset)
-        elif report_type == "weekly": await report_weekly(update, context, offset=offset)
-        elif report_type == "monthly": await report_monthly(update, context, offset=offset)
-        else: await update.message.reply_text(_(user_id, 'report_unknown_type'))
+        report_handler = REPORT_HANDLERS.get(context.args[0].lower())
+        if report_handler:
+            await report_handler(update, context, offset=0) # Current period when called directly
+        else:
+            await update.message.reply_text(_(user_id, 'report_unknown_type'))
     except Exception as e:
         log.error(f"Error in report_command for user {user_id}: {e}", exc_info=True)
         await update.message.reply_text(_(user_id, 'report_error_processing'))
@@ -1361,7 +1513,7 @@ async def report_monthly(update: Update, context: ContextTypes.DEFAULT_TYPE, off
     """Sends the monthly report with navigation."""
     user_id = update.effective_user.id
     log.info(f"Generating monthly report for user {user_id}, offset {offset}")
-    month_start_date, total_minutes, detailed_breakdown = database.get_monthly_report(user_id, offset=offset)
+    month_start_date, total_minutes, detailed_breakdown = await asyncio.to_thread(database.get_monthly_report, user_id, offset=offset)
     
     # Get base report title content
     try:
@@ -1391,24 +1543,7 @@ async def report_monthly(update: Update, context: ContextTypes.DEFAULT_TYPE, off
         
         if detailed_breakdown:
             report_lines.append("\n" + _(user_id, 'report_project_task_breakdown'))
-            for project_data in detailed_breakdown:
-                proj_name = project_data['project_name']
-                proj_mins = project_data['project_minutes']
-                percentage = (proj_mins / total_minutes) * 100 if total_minutes > 0 else 0
-                
-                # Add project line without formatting in code
-                report_lines.append(_(user_id, 'report_project_line_percentage', 
-                                    project_name=proj_name, 
-                                    minutes=f"{proj_mins:.1f}", 
-                                    percentage=f"{percentage:.1f}"))
-                
-                # Add task lines
-                for task_data in project_data['tasks']:
-                    task_name = task_data['task_name']
-                    task_mins = task_data['task_minutes']
-                    report_lines.append(_(user_id, 'report_task_line', 
-                                        task_name=task_name, 
-                                        minutes=f"{task_mins:.1f}"))
+            report_lines.extend(_breakdown_lines(user_id, detailed_breakdown, total_minutes))
         else:
             report_lines.append(_(user_id, 'report_no_project_task_data'))
 
@@ -1450,6 +1585,13 @@ async def report_monthly(update: Update, context: ContextTypes.DEFAULT_TYPE, off
         except Exception as fb_err:
             log.error(f"Fallback report sending failed: {fb_err}")
 
+# Report handlers by type, as used in /report <type> and report_nav callbacks
+REPORT_HANDLERS = {
+    "daily": report_daily,
+    "weekly": report_weekly,
+    "monthly": report_monthly,
+}
+
 # --- Reply Keyboard Button Handlers ---
 
 # IMPORTANT: The Regex filters in bot.py MUST now match the *translated* button texts.
@@ -1493,7 +1635,7 @@ async def handle_break_button(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     # Check if another timer is active before starting break
     existing_state = timer_states.get(user_id)
-    if existing_state and existing_state.get('state') in ('running', 'paused'):
+    if existing_state and existing_state.state in ACTIVE_TIMER_STATES:
         log.warning(f"User {user_id} pressed break button while timer active.")
         await update.message.reply_text(_(user_id, 'error_timer_active_break'))
         return
@@ -1513,7 +1655,8 @@ async def handle_list_tasks_button(update: Update, context: ContextTypes.DEFAULT
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles text messages, mapping Reply Keyboard buttons and project/task creation."""
-    user_id = update.message.from_user.id
+    user = update.message.from_user
+    user_id = user.id
     text = update.message.text
     
     # Map Reply Keyboard button text to actions based on user language
@@ -1540,14 +1683,15 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     if button_pressed:
         return # Don't process further if it was a button press
         
+    state = get_pending_input(context.user_data, user_id)
     # Check if we're expecting a project name (for creation via callback button)
-    if context.user_data.get(user_id, {}).get('expecting_project_name'):
+    if state.expecting_project_name:
         log.debug(f"User {user_id} sent project name: {text}")
         # Clear the flag
-        context.user_data[user_id]['expecting_project_name'] = False
+        state.expecting_project_name = False
         
         # Create the project
-        result = await _create_project_logic(update.message.from_user, context, text)
+        result = await _create_project_logic(user, context, text)
         if result:
             # Use the key that requires the project name parameter
             await update.message.reply_text(_(user_id, 'project_created_selected', project_name=text))
@@ -1555,27 +1699,25 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         return # Handled as project name input
         
     # Check if we're expecting a task name (for creation via callback button)
-    elif context.user_data.get(user_id, {}).get('expecting_task_name'):
+    elif state.expecting_task_name:
         log.debug(f"User {user_id} sent task name: {text}")
         # Clear the flag
-        context.user_data[user_id]['expecting_task_name'] = False
+        state.expecting_task_name = False
         
         # Create the task
-        current_project_id = database.get_current_project(user_id)
+        current_project_id, project_name = database.get_current_context(user_id)[:2]
         if not current_project_id:
             await update.message.reply_text(_(user_id, 'task_create_no_project'))
             return
             
-        result = await _create_task_logic(update.message.from_user, context, text)
+        result = await _create_task_logic(user, context, text)
         if result:
-            project_name = database.get_project_name(current_project_id) or _(user_id, 'text_current_project')
+            project_name = project_name or _(user_id, 'text_current_project')
             # Use the key that requires both task and project name
             await update.message.reply_text(_(user_id, 'task_created_selected', task_name=text, project_name=project_name))
             
             # Refresh the task list to show the new task
-            fake_update = Update(0, message=update.message)
-            fake_update._effective_user = update.message.from_user
-            await list_tasks(fake_update, context)
+            await list_tasks(update, context)
         # Error handling done inside _create_task_logic
         return # Handled as task name input
         
@@ -1606,8 +1748,7 @@ async def handle_forwarded_message(update: Update, context: ContextTypes.DEFAULT
     
     # Store forwarded message data in user_data (temporary until project is chosen)
     try:
-        context.user_data[user_id] = context.user_data.get(user_id, {})
-        context.user_data[user_id]['pending_forwarded_message'] = {
+        pending = {
             'message_text': message.text or message.caption or '',
             'original_sender_name': (getattr(message, 'api_kwargs', {}).get('forward_sender_name') or 
                                    (message.forward_from.full_name if getattr(message, 'forward_from', None) else '') or
@@ -1622,12 +1763,13 @@ async def handle_forwarded_message(update: Update, context: ContextTypes.DEFAULT
             forward_timestamp = message.api_kwargs['forward_date']
             # Convert timestamp to datetime
             forward_date = datetime.fromtimestamp(forward_timestamp, tz=timezone.utc)
-            context.user_data[user_id]['pending_forwarded_message']['forwarded_date'] = forward_date.isoformat()
+            pending['forwarded_date'] = forward_date.isoformat()
         # If forward_origin is available, use its date
         elif getattr(message, 'forward_origin', None) and getattr(message.forward_origin, 'date', None):
-            context.user_data[user_id]['pending_forwarded_message']['forwarded_date'] = message.forward_origin.date.isoformat()
-            
-        log.info(f"Stored forwarded message data: {context.user_data[user_id]['pending_forwarded_message']}")
+            pending['forwarded_date'] = message.forward_origin.date.isoformat()
+
+        get_pending_input(context.user_data, user_id).pending_forwarded_message = pending
+        log.info(f"Stored forwarded message data: {pending}")
         
         # Prompt for project selection
         projects = database.get_projects(user_id, status=STATUS_ACTIVE)
@@ -1635,12 +1777,12 @@ async def handle_forwarded_message(update: Update, context: ContextTypes.DEFAULT
         
         keyboard = []
         for project_id, project_name in projects:
-            keyboard.append([InlineKeyboardButton(project_name, callback_data=f"forwarded_select_project:{project_id}")])
+            keyboard.append([InlineKeyboardButton(project_name, callback_data=f"forwarded_select_project:{encode_callback_id(project_id)}")])
         
         # Use the correct translation key that exists in the translation files
-        keyboard.append([InlineKeyboardButton(_(user_id, 'create_new_project_button'), callback_data="forwarded_create_new_project")])
+        keyboard.append([static_button(user_id, 'create_new_project_button', "forwarded_create_new_project")])
         # Add a cancel button
-        keyboard.append([InlineKeyboardButton(_(user_id, 'button_cancel'), callback_data="cancel_forwarded_message")])
+        keyboard.append([static_button(user_id, 'button_cancel', "cancel_forwarded_message")])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         log.info(f"Built keyboard with {len(keyboard)} rows")
@@ -1663,16 +1805,21 @@ async def handle_forwarded_message(update: Update, context: ContextTypes.DEFAULT
 
 # --- Callback handler for project selection (to be called from callbacks.py) ---
 async def handle_forwarded_project_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, project_id: int) -> int:
-    user_id = update.effective_user.id
-    pending = context.user_data.get(user_id, {}).get('pending_forwarded_message')
+    user = update.effective_user
+    user_id = user.id
+    pending = get_pending_input(context.user_data, user_id).pending_forwarded_message
     if not pending:
         await update.callback_query.edit_message_text(_(user_id, 'forwarded_no_pending'))
         return ConversationHandler.END
+
+    # The project ID comes from callback data; only the user's own projects may receive the message
+    project_name = database.get_owned_project_name(user_id, project_id)
+    if project_name is None:
+        log.warning(f"User {user_id} tried to file a forwarded message into non-existent or foreign project {project_id}")
+        await update.callback_query.edit_message_text(_(user_id, 'project_not_found'))
+        return ConversationHandler.END
     
     try:
-        # Set this as the current project
-        database.set_current_project(user_id, project_id)
-        
         # Save to forwarded_messages table
         database.add_forwarded_message(
             user_id=user_id,
@@ -1689,26 +1836,22 @@ async def handle_forwarded_project_selection(update: Update, context: ContextTyp
         if len(task_name) > 100:  # Truncate if too long
             task_name = task_name[:97] + "..."
         
-        project_name = database.get_project_name(project_id) or _(user_id, 'text_unknown_project')
-        
         # Add task to the project
         task_id = database.add_task(project_id, task_name)
         
-        # Set as current task
-        if task_id:
-            database.set_current_task(user_id, task_id)
+        # Set the project (and the new task, if created) as current in one write
+        database.set_current_selection(user_id, project_id, task_id)
             
         log.info(f"Created task '{task_name}' from forwarded message for user {user_id} in project {project_id}")
         
         # Send admin notification
-        await admin_handlers.send_admin_notification(
+        admin_handlers.notify_admin_in_background(
             context,
-            f"Task created from forwarded message by {update.effective_user.first_name} ({user_id}) in project '{project_name}': '{task_name}'"
+            f"Task created from forwarded message by {user.first_name} ({user_id}) in project '{project_name}': '{task_name}'"
         )
         
         # Clear the pending message data
-        if user_id in context.user_data and 'pending_forwarded_message' in context.user_data[user_id]:
-            del context.user_data[user_id]['pending_forwarded_message']
+        get_pending_input(context.user_data, user_id).pending_forwarded_message = None
         
         # Notify the user
         await update.callback_query.edit_message_text(
@@ -1730,11 +1873,9 @@ async def handle_forwarded_create_new_project(update: Update, context: ContextTy
     log.info(f"User {user_id} chose to create a new project for forwarded message")
     
     try:
-        # Make sure we have a user_data dictionary
-        context.user_data[user_id] = context.user_data.get(user_id, {})
-        context.user_data[user_id]['expecting_forwarded_project_name'] = True
-        
         # Store that we're expecting a project name for a forwarded message
+        get_pending_input(context.user_data, user_id).expecting_forwarded_project_name = True
+
         # Add instructions about using /cancel
         await update.callback_query.edit_message_text(_(user_id, 'forwarded_prompt_new_project_name_with_cancel'))
         log.info(f"Prompting user {user_id} to enter new project name for forwarded message")
@@ -1748,7 +1889,8 @@ async def handle_forwarded_create_new_project(update: Update, context: ContextTy
 
 async def handle_forwarded_project_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the project name entry in the forwarded message workflow."""
-    user_id = update.effective_user.id
+    user = update.effective_user
+    user_id = user.id
     message_text = update.message.text
     
     log.info(f"Received project name '{message_text}' from user {user_id} for forwarded message")
@@ -1760,12 +1902,10 @@ async def handle_forwarded_project_name(update: Update, context: ContextTypes.DE
             await update.message.reply_text(_(user_id, 'error_create_project'))
             return ConversationHandler.END
         
-        # Set as current project
-        database.set_current_project(user_id, project_id)
-        
         # Get the pending forwarded message
-        pending = context.user_data.get(user_id, {}).get('pending_forwarded_message')
+        pending = get_pending_input(context.user_data, user_id).pending_forwarded_message
         if not pending:
+            database.set_current_project(user_id, project_id) # Still select the new project
             await update.message.reply_text(_(user_id, 'forwarded_no_pending'))
             return ConversationHandler.END
             
@@ -1787,24 +1927,21 @@ async def handle_forwarded_project_name(update: Update, context: ContextTypes.DE
         
         task_id = database.add_task(project_id, task_name)
         
-        # Set as current task
-        if task_id:
-            database.set_current_task(user_id, task_id)
+        # Set the new project (and task, if created) as current in one write
+        database.set_current_selection(user_id, project_id, task_id)
         
         log.info(f"Created task '{task_name}' from forwarded message for user {user_id} in new project {project_id}")
         
         # Send admin notification
-        await admin_handlers.send_admin_notification(
+        admin_handlers.notify_admin_in_background(
             context,
-            f"New project '{message_text}' and task created from forwarded message by {update.message.from_user.first_name} ({user_id}): '{task_name}'"
+            f"New project '{message_text}' and task created from forwarded message by {user.first_name} ({user_id}): '{task_name}'"
         )
         
         # Clear the pending data - make sure we remove ALL flags
-        if user_id in context.user_data:
-            if 'pending_forwarded_message' in context.user_data[user_id]:
-                del context.user_data[user_id]['pending_forwarded_message']
-            if 'expecting_forwarded_project_name' in context.user_data[user_id]:
-                del context.user_data[user_id]['expecting_forwarded_project_name']
+        state = get_pending_input(context.user_data, user_id)
+        state.pending_forwarded_message = None
+        state.expecting_forwarded_project_name = False
         
         # Notify the user
         await update.message.reply_text(
@@ -1820,17 +1957,24 @@ async def handle_forwarded_project_name(update: Update, context: ContextTypes.DE
         return ConversationHandler.END
 
 # --- Language Selection Command ---
+_LANGUAGE_MENU = None # Native language names don't depend on the user, so one markup serves everyone
+
+def _language_menu() -> InlineKeyboardMarkup:
+    """Returns the language selection keyboard, built on first use."""
+    global _LANGUAGE_MENU
+    if _LANGUAGE_MENU is None:
+        _LANGUAGE_MENU = InlineKeyboardMarkup([
+            [InlineKeyboardButton(get_language_name(lang_code), callback_data=f"set_lang:{lang_code}")]
+            for lang_code in SUPPORTED_LANGUAGES
+        ])
+    return _LANGUAGE_MENU
+
 async def set_language_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Displays language selection buttons."""
     user_id = update.effective_user.id
     log.debug(f"User {user_id} requested language change.")
     
-    keyboard = []
-    for lang_code in SUPPORTED_LANGUAGES:
-        lang_name = get_language_name(lang_code)
-        keyboard.append([InlineKeyboardButton(lang_name, callback_data=f"set_lang:{lang_code}")])
-        
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _language_menu()
     select_message = _(user_id, 'select_language') # Get translated prompt
     await update.message.reply_text(select_message, reply_markup=reply_markup)
 
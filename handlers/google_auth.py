@@ -1,4 +1,5 @@
 import logging
+import asyncio
 from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler
 import database
@@ -118,7 +119,8 @@ async def _fetch_and_store_token(user_id: int, auth_code: str, context: ContextT
         return False
 
     try:
-        flow.fetch_token(code=auth_code)
+        # Token exchange is a blocking HTTP call; keep it off the event loop
+        await asyncio.to_thread(flow.fetch_token, code=auth_code)
         credentials = flow.credentials
         
         if not credentials or not credentials.valid:
@@ -179,7 +181,7 @@ async def _append_single_session_to_sheet(user_id: int, session_data: dict) -> b
         log.debug(f"No default Google Sheet ID found for user {user_id}. Skipping auto-append.")
         return False # User hasn't set up or created a default sheet yet
         
-    service = _get_sheets_service(user_id)
+    service = await asyncio.to_thread(_get_sheets_service, user_id) # May refresh the token over HTTP
     if not service:
         log.warning(f"Failed to get Sheets service for user {user_id}. Skipping auto-append.")
         # _get_sheets_service handles logging credential errors and clearing if refresh fails
@@ -204,14 +206,15 @@ async def _append_single_session_to_sheet(user_id: int, session_data: dict) -> b
         sheet_name = "Sheet1"
         range_name = f"'{sheet_name}'!A1"
         
-        # Append the row
-        service.spreadsheets().values().append(
+        # Append the row (the HTTP round-trip runs in a worker thread, off the event loop)
+        append_request = service.spreadsheets().values().append(
             spreadsheetId=sheet_id,
             range=range_name, # Use quoted sheet name
             valueInputOption='USER_ENTERED',
             insertDataOption='INSERT_ROWS',
             body=body
-        ).execute()
+        )
+        await asyncio.to_thread(append_request.execute)
         
         log.info(f"Successfully auto-appended session to sheet {sheet_id} for user {user_id}.")
         return True
@@ -329,7 +332,7 @@ async def export_to_sheets(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # spreadsheet_id remains None, triggering creation logic below
 
     # --- Get Sheets Service --- 
-    service = _get_sheets_service(user_id)
+    service = await asyncio.to_thread(_get_sheets_service, user_id) # May refresh the token over HTTP
     if not service:
         await update.message.reply_text(
             "Could not connect to Google Sheets. Have you authorized using `/connect_google`? "
@@ -347,7 +350,8 @@ async def export_to_sheets(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     'title': f'Focus Pomodoro Bot Export - User {user_id}'
                 }
             }
-            spreadsheet = service.spreadsheets().create(body=spreadsheet_body, fields='spreadsheetId').execute()
+            create_request = service.spreadsheets().create(body=spreadsheet_body, fields='spreadsheetId')
+            spreadsheet = await asyncio.to_thread(create_request.execute)
             spreadsheet_id = spreadsheet.get('spreadsheetId')
             if spreadsheet_id:
                 database.store_google_sheet_id(user_id, spreadsheet_id)
@@ -376,7 +380,7 @@ async def export_to_sheets(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
     # --- Get Data and Export --- 
-    export_data = database.get_all_user_sessions_for_export(user_id)
+    export_data = await asyncio.to_thread(database.get_all_user_sessions_for_export, user_id) # Full history scan
     if not export_data or len(export_data) <= 1: 
         await update.message.reply_text("No session data found to export.")
         return
@@ -393,13 +397,14 @@ async def export_to_sheets(update: Update, context: ContextTypes.DEFAULT_TYPE):
     range_name = f"'{sheet_name}'!A1"
 
     try:
-        result = service.spreadsheets().values().append(
+        append_request = service.spreadsheets().values().append(
             spreadsheetId=spreadsheet_id,
             range=range_name, # Use quoted sheet name
             valueInputOption='USER_ENTERED',
             insertDataOption='INSERT_ROWS',
             body=body
-        ).execute()
+        )
+        result = await asyncio.to_thread(append_request.execute)
         
         updates = result.get('updates', {})
         rows_appended = updates.get('updatedRows', 0)
@@ -5,6 +5,7 @@ import config
 import database
 import requests
 import json
+import asyncio
 
 log = logging.getLogger(__name__)
 
@@ -81,7 +82,7 @@ async def receive_jira_oauth_code(update: Update, context: ContextTypes.DEFAULT_
         "redirect_uri": redirect_uri
     }
     try:
-        resp = requests.post(JIRA_TOKEN_URL, json=data, timeout=10)
+        resp = await asyncio.to_thread(requests.post, JIRA_TOKEN_URL, json=data, timeout=10)
         if resp.status_code != 200:
             log.error(f"Jira token exchange failed: {resp.text}")
             await update.message.reply_text(f"Failed to exchange code for tokens. Jira API error: {resp.text}")
@@ -93,7 +94,7 @@ async def receive_jira_oauth_code(update: Update, context: ContextTypes.DEFAULT_
             return ConversationHandler.END
         # Fetch cloudId for the user
         headers = {"Authorization": f"Bearer {access_token}"}
-        cloud_resp = requests.get(f"{JIRA_API_BASE}/oauth/token/accessible-resources", headers=headers, timeout=10)
+        cloud_resp = await asyncio.to_thread(requests.get, f"{JIRA_API_BASE}/oauth/token/accessible-resources", headers=headers, timeout=10)
         if cloud_resp.status_code != 200:
             log.error(f"Failed to fetch Jira cloudId: {cloud_resp.text}")
             await update.message.reply_text(f"Failed to fetch Jira cloudId: {cloud_resp.text}")
@@ -153,7 +154,7 @@ async def fetch_jira_projects(update: Update, context: ContextTypes.DEFAULT_TYPE
         # JQL: assigned to current user, unresolved
         jql = "assignee = currentUser() AND resolution = Unresolved"
         url = f"{JIRA_API_BASE}/ex/jira/{cloud_id}/rest/api/3/search?jql={jql}"
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = await asyncio.to_thread(requests.get, url, headers=headers, timeout=10)
         if resp.status_code != 200:
             await update.message.reply_text(f"Failed to fetch Jira issues: {resp.text}")
             return
@@ -189,7 +190,7 @@ async def jira_project_callback(update: Update, context: ContextTypes.DEFAULT_TY
     data = query.data
     if not data.startswith("jira_project:"):
         return
-    project_id = data.split(":")[1]
+    project_id = data.partition(":")[2]
     creds_json, cloud_id = database.get_jira_credentials(user_id)
     if not creds_json or not cloud_id:
         await query.edit_message_text("You are not connected to Jira. Use /connect_jira first.")
@@ -201,7 +202,7 @@ async def jira_project_callback(update: Update, context: ContextTypes.DEFAULT_TY
         # JQL: assigned to current user, unresolved, in selected project
         jql = f"assignee = currentUser() AND resolution = Unresolved AND project = {project_id}"
         url = f"{JIRA_API_BASE}/ex/jira/{cloud_id}/rest/api/3/search?jql={jql}"
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = await asyncio.to_thread(requests.get, url, headers=headers, timeout=10)
         if resp.status_code != 200:
             await query.edit_message_text(f"Failed to fetch Jira issues: {resp.text}")
             return
@@ -232,7 +233,7 @@ async def jira_add_all_callback(update: Update, context: ContextTypes.DEFAULT_TY
     data = query.data
     if not data.startswith("jira_add_all:"):
         return
-    project_id = data.split(":")[1]
+    project_id = data.partition(":")[2]
     creds_json, cloud_id = database.get_jira_credentials(user_id)
     if not creds_json or not cloud_id:
         await query.edit_message_text("You are not connected to Jira. Use /connect_jira first.")
@@ -244,7 +245,7 @@ async def jira_add_all_callback(update: Update, context: ContextTypes.DEFAULT_TY
         # JQL: assigned to current user, unresolved, in selected project
         jql = f"assignee = currentUser() AND resolution = Unresolved AND project = {project_id}"
         url = f"{JIRA_API_BASE}/ex/jira/{cloud_id}/rest/api/3/search?jql={jql}"
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = await asyncio.to_thread(requests.get, url, headers=headers, timeout=10)
         if resp.status_code != 200:
             await query.edit_message_text(f"Failed to fetch Jira issues: {resp.text}")
             return
@@ -260,12 +261,8 @@ async def jira_add_all_callback(update: Update, context: ContextTypes.DEFAULT_TY
         if not project_name:
             await query.edit_message_text("Could not determine Jira project name.")
             return
-        projects = database.get_projects(user_id)
-        project_id_db = None
-        for pid, pname in projects:
-            if pname == project_name:
-                project_id_db = pid
-                break
+        existing_project = database.find_project_by_name(user_id, project_name)
+        project_id_db = existing_project[0] if existing_project else None
         if not project_id_db:
             project_id_db = database.add_project(user_id, project_name)
         # Import all issues as tasks
@@ -292,7 +289,7 @@ async def jira_issue_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     data = query.data
     if not data.startswith("jira_issue:"):
         return
-    issue_key = data.split(":")[1]
+    issue_key = data.partition(":")[2]
     creds_json, cloud_id = database.get_jira_credentials(user_id)
     if not creds_json or not cloud_id:
         await query.edit_message_text("You are not connected to Jira. Use /connect_jira first.")
@@ -303,7 +300,7 @@ async def jira_issue_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
         # Fetch issue details
         url = f"{JIRA_API_BASE}/ex/jira/{cloud_id}/rest/api/3/issue/{issue_key}"
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = await asyncio.to_thread(requests.get, url, headers=headers, timeout=10)
         if resp.status_code != 200:
             await query.edit_message_text(f"Failed to fetch Jira issue details: {resp.text}")
             return
@@ -315,21 +312,15 @@ async def jira_issue_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
             await query.edit_message_text("Could not determine Jira project name for this issue.")
             return
         # Check if bot project exists, else create
-        projects = database.get_projects(user_id)
-        project_id = None
-        for pid, pname in projects:
-            if pname == project_name:
-                project_id = pid
-                break
+        existing_project = database.find_project_by_name(user_id, project_name)
+        project_id = existing_project[0] if existing_project else None
         if not project_id:
             project_id = database.add_project(user_id, project_name)
         # Check if task already exists (by name prefix)
-        tasks = database.get_tasks(project_id)
         jira_task_name = f"[{issue_key}] {summary}"
-        for tid, tname in tasks:
-            if tname == jira_task_name:
-                await query.edit_message_text(f"Task already imported: {jira_task_name}")
-                return
+        if database.find_task_by_name(project_id, jira_task_name):
+            await query.edit_message_text(f"Task already imported: {jira_task_name}")
+            return
         # Create the task
         task_id = database.add_task(project_id, jira_task_name)
         if task_id:
@@ -352,7 +343,7 @@ async def log_jira_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not data.startswith("log_jira:"):
         return
     try:
-        _, jira_key, minutes = data.split(":")
+        jira_key, _sep, minutes = data.partition(":")[2].partition(":")
         minutes = float(minutes)
         creds_json, cloud_id = database.get_jira_credentials(user_id)
         if not creds_json or not cloud_id:
@@ -365,7 +356,7 @@ async def log_jira_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         time_spent = f"{int(round(minutes))}m"
         worklog_url = f"{JIRA_API_BASE}/ex/jira/{cloud_id}/rest/api/3/issue/{jira_key}/worklog"
         body = {"timeSpent": time_spent, "comment": "Logged from Focus Pomodoro Bot"}
-        resp = requests.post(worklog_url, headers=headers, json=body, timeout=10)
+        resp = await asyncio.to_thread(requests.post, worklog_url, headers=headers, json=body, timeout=10)
         if resp.status_code in (200, 201):
             await query.edit_message_text(f"✅ Work logged to Jira issue {jira_key} ({time_spent})")
         else:
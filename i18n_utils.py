@@ -1,5 +1,6 @@
 import i18n
 import os
+import functools
 import database
 from config import SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE
 import logging
@@ -45,17 +46,28 @@ def set_user_lang(user_id, lang_code):
             return True
     return False
 
+@functools.lru_cache(maxsize=4096)
+def _translate_cached(locale, key, kwargs_items):
+    """Memoized i18n.t(); locale files are loaded once and never change at runtime."""
+    return i18n.t(key, locale=locale, **dict(kwargs_items))
+
 def _(user_id, key, **kwargs):
     """Translates a key using the user's preferred language."""
     locale = get_user_lang(user_id)
-    return i18n.t(key, locale=locale, **kwargs)
+    if not kwargs:
+        return _translate_cached(locale, key, ())
+    try:
+        return _translate_cached(locale, key, tuple(sorted(kwargs.items())))
+    except TypeError: # Unhashable placeholder value, translate without caching
+        return i18n.t(key, locale=locale, **kwargs)
+
+LANGUAGE_NAMES = {
+    'en': 'English',
+    'de': 'Deutsch',
+    'ru': 'Русский'
+}
 
 # Function to get language name (e.g., English, Deutsch, Русский)
 def get_language_name(lang_code):
     """Returns the native name of a supported language."""
-    names = {
-        'en': 'English',
-        'de': 'Deutsch',
-        'ru': 'Русский'
-    }
-    return names.get(lang_code, lang_code) # Fallback to code if name unknown 
\ No newline at end of file
+    return LANGUAGE_NAMES.get(lang_code, lang_code) # Fallback to code if name unknown 
\ No newline at end of file
@@ -0,0 +1,21 @@
+from dataclasses import dataclass
+
+
+# --- Per-User Pending Input State ---
+@dataclass(slots=True)
+class PendingInput:
+    """Flags for the free-text input a user is expected to send next (stored in context.user_data)."""
+    expecting_project_name: bool = False
+    expecting_task_name: bool = False
+    expecting_forwarded_project_name: bool = False
+    renaming_project_id: int | None = None
+    renaming_task_id: int | None = None
+    pending_forwarded_message: dict | None = None
+
+
+def get_pending_input(user_data: dict, user_id: int) -> PendingInput:
+    """Returns the user's PendingInput, creating it on first use."""
+    state = user_data.get(user_id)
+    if state is None:
+        state = user_data[user_id] = PendingInput()
+    return state
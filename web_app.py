@@ -1,7 +1,8 @@
 from flask import Flask, render_template, jsonify, send_from_directory, request, g
 import os
 from datetime import datetime, timezone
-from config import timer_states, DOMAIN_URL, FLASK_PORT, SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE, TOKEN
+from config import timer_states, TimerState, DOMAIN_URL, FLASK_PORT, SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE, TOKEN
+from config import TIMER_RUNNING, TIMER_PAUSED, TIMER_STOPPED, TIMER_FINISHED, SESSION_WORK, SESSION_BREAK
 import logging
 import traceback # Import traceback for detailed error logging
 from flask_babel import Babel
@@ -247,43 +248,40 @@ def api_timer_status(user_id):
             web_log.debug(f"API: No timer state found for user {user_id}")
             # Return default values for a non-existent timer
             return jsonify({
-                'state': 'stopped', 
+                'state': TIMER_STOPPED, 
                 'remaining_seconds': 0, 
                 'duration': 25, 
-                'session_type': 'work' # Default session type
+                'session_type': SESSION_WORK # Default session type
             })
 
-        current_state = state_data.get('state', 'stopped') # Default to stopped if state key missing
-        duration_minutes = state_data.get('duration', 25)
-        session_type = state_data.get('session_type', 'work') # Get session type, default to 'work'
+        current_state = state_data.state
+        duration_minutes = state_data.duration
+        session_type = state_data.session_type
         remaining_seconds = 0
 
-        if current_state == 'running':
-            start_time = state_data.get('start_time')
-            accumulated_time_minutes = state_data.get('accumulated_time', 0)
+        if current_state == TIMER_RUNNING:
+            accumulated_time_minutes = state_data.accumulated_time
 
-            if not start_time:
+            if not state_data.start_time:
                  web_log.error(f"API: Missing start_time for running timer, user {user_id}")
                  return jsonify({'state': 'error', 'message': 'Inconsistent timer state'}), 500
 
-            now = datetime.now()
-            elapsed_seconds = (now - start_time).total_seconds()
-            total_worked_minutes = accumulated_time_minutes + (elapsed_seconds / 60)
+            total_worked_minutes = accumulated_time_minutes + state_data.running_minutes()
             remaining_minutes = duration_minutes - total_worked_minutes
             remaining_seconds = max(0, round(remaining_minutes * 60))
 
-        elif current_state == 'paused':
-            accumulated_time_minutes = state_data.get('accumulated_time', 0)
+        elif current_state == TIMER_PAUSED:
+            accumulated_time_minutes = state_data.accumulated_time
             remaining_minutes = duration_minutes - accumulated_time_minutes
             remaining_seconds = max(0, round(remaining_minutes * 60))
 
-        elif current_state == 'finished':
+        elif current_state == TIMER_FINISHED:
             # Timer completed - return 0 seconds remaining but preserve session type
             remaining_seconds = 0
 
-        elif current_state == 'stopped':
-            accumulated_time_minutes = state_data.get('accumulated_time', 0)
-            is_completed = 1 if accumulated_time_minutes >= (duration_minutes - 0.01) else 0
+        elif current_state == TIMER_STOPPED:
+            accumulated_time_minutes = state_data.accumulated_time
+            is_completed = state_data.completed_flag()
             if is_completed:
                 # If stopped but completed, report 0 seconds remaining
                 remaining_seconds = 0
@@ -292,10 +290,7 @@ def api_timer_status(user_id):
                 remaining_seconds = 0 
 
         # Fetch current project/task names for display
-        project_id = database.get_current_project(user_id)
-        task_id = database.get_current_task(user_id)
-        project_name = database.get_project_name(project_id) if project_id else None
-        task_name = database.get_task_name(task_id) if task_id else None
+        project_id, project_name, task_id, task_name = database.get_current_context(user_id)
 
         web_log.debug(f"API: Returning state={current_state}, session={session_type}, remaining={remaining_seconds}, duration={duration_minutes} for user {user_id}")
         return jsonify({
@@ -424,35 +419,33 @@ def api_pause_timer(user_id: int):
         code = 403 if verified_user_id else 401
         return jsonify({'ok': False, 'error': err}), code
     state_data = timer_states.get(user_id)
-    if not state_data or state_data.get('state') != 'running':
+    if not state_data or state_data.state != TIMER_RUNNING:
         return jsonify({'ok': False, 'error': 'No running timer'}), 400
     try:
-        start_time = state_data.get('start_time')
-        if not start_time:
+        if not state_data.start_time:
             return jsonify({'ok': False, 'error': 'Inconsistent state'}), 500
-        elapsed_min = (datetime.now() - start_time).total_seconds() / 60
-        state_data['accumulated_time'] = state_data.get('accumulated_time', 0) + elapsed_min
-        state_data['state'] = 'paused'
-        job = state_data.get('job')
+        state_data.accumulated_time += state_data.running_minutes()
+        state_data.state = TIMER_PAUSED
+        job = state_data.job
         if job:
             try:
                 job.schedule_removal()
             except Exception:
                 pass
-            state_data['job'] = None
+            state_data.job = None
         # Respond with status-like payload
-        duration_minutes = state_data.get('duration', 25)
-        remaining_seconds = max(0, round((duration_minutes - state_data['accumulated_time']) * 60))
+        duration_minutes = state_data.duration
+        remaining_seconds = max(0, round((duration_minutes - state_data.accumulated_time) * 60))
 
         # Send Telegram notification
-        session_type = state_data.get('session_type', 'work')
-        accumulated_formatted = format_minutes_as_mmss(state_data.get('accumulated_time', 0))
+        session_type = state_data.session_type
+        accumulated_formatted = format_minutes_as_mmss(state_data.accumulated_time)
         _send_telegram_message(
             user_id,
             _(user_id, 'timer_paused', timer_type=session_type.capitalize(), accumulated_time=accumulated_formatted)
         )
 
-        return jsonify({'ok': True, 'state': 'paused', 'remaining_seconds': remaining_seconds})
+        return jsonify({'ok': True, 'state': TIMER_PAUSED, 'remaining_seconds': remaining_seconds})
     except Exception as e:
         web_log.error(f"Error pausing timer via API for {user_id}: {e}")
         return jsonify({'ok': False, 'error': 'Internal error'}), 500
@@ -465,26 +458,23 @@ def api_resume_timer(user_id: int):
         code = 403 if verified_user_id else 401
         return jsonify({'ok': False, 'error': err}), code
     state_data = timer_states.get(user_id)
-    if not state_data or state_data.get('state') != 'paused':
+    if not state_data or state_data.state != TIMER_PAUSED:
         return jsonify({'ok': False, 'error': 'No paused timer'}), 400
     try:
-        duration_minutes = state_data.get('duration', 25)
-        accumulated = state_data.get('accumulated_time', 0)
-        session_type = state_data.get('session_type', 'work')
+        duration_minutes = state_data.duration
+        accumulated = state_data.accumulated_time
+        session_type = state_data.session_type
         remaining_min = duration_minutes - accumulated
         if remaining_min <= 0:
             # No time left: treat as completed
-            state_data['state'] = 'stopped'
-            return jsonify({'ok': True, 'state': 'finished', 'remaining_seconds': 0})
+            state_data.state = TIMER_STOPPED
+            return jsonify({'ok': True, 'state': TIMER_FINISHED, 'remaining_seconds': 0})
         job_queue = _get_job_queue()
         if not job_queue:
             return jsonify({'ok': False, 'error': 'Scheduler unavailable'}), 500
         # Schedule using the PTB callback to keep unified logic
-        data = {'user_id': user_id, 'duration': duration_minutes, 'session_type': session_type}
-        job = job_queue.run_once(cmd_handlers.timer_finished, remaining_min * 60, data=data, name=f"timer_{user_id}")
-        state_data['state'] = 'running'
-        state_data['start_time'] = datetime.now()
-        state_data['job'] = job
+        job = cmd_handlers.schedule_timer_job(job_queue, user_id, duration_minutes, session_type, run_in_minutes=remaining_min)
+        state_data.mark_resumed(job)
         remaining_seconds = max(0, round(remaining_min * 60))
 
         # Send Telegram notification
@@ -494,7 +484,7 @@ def api_resume_timer(user_id: int):
             _(user_id, 'timer_resumed', timer_type=session_type.capitalize(), remaining_time=remaining_formatted)
         )
 
-        return jsonify({'ok': True, 'state': 'running', 'remaining_seconds': remaining_seconds})
+        return jsonify({'ok': True, 'state': TIMER_RUNNING, 'remaining_seconds': remaining_seconds})
     except Exception as e:
         web_log.error(f"Error resuming timer via API for {user_id}: {e}")
         return jsonify({'ok': False, 'error': 'Internal error'}), 500
@@ -511,23 +501,22 @@ def api_stop_timer(user_id: int):
         return jsonify({'ok': False, 'error': 'No active timer'}), 400
     try:
         # Accumulate if running
-        if state_data.get('state') == 'running':
-            start_time = state_data.get('start_time')
-            if not start_time:
+        if state_data.state == TIMER_RUNNING:
+            if not state_data.start_time:
                 return jsonify({'ok': False, 'error': 'Inconsistent state'}), 500
-            elapsed = (datetime.now() - start_time).total_seconds() / 60
-            state_data['accumulated_time'] = state_data.get('accumulated_time', 0) + elapsed
-
-        duration = float(state_data.get('duration', 25))
-        accumulated = float(state_data.get('accumulated_time', 0))
-        completed = 1 if accumulated >= (duration - 0.01) else 0
-        session_type = state_data.get('session_type', 'work')
-        initial_start_time = state_data.get('initial_start_time') or state_data.get('start_time') or datetime.now()
+            state_data.accumulated_time += state_data.running_minutes()
+
+        duration = float(state_data.duration)
+        accumulated = float(state_data.accumulated_time)
+        completed = state_data.completed_flag()
+        session_type = state_data.session_type
+        initial_start_time = state_data.initial_start_time or state_data.start_time or datetime.now()
         # Persist
-        project_id = database.get_current_project(user_id) if session_type == 'work' else None
-        task_id = database.get_current_task(user_id) if session_type == 'work' else None
+        project_id, project_name, task_id, task_name = None, None, None, None
+        if session_type == SESSION_WORK:
+            project_id, project_name, task_id, task_name = cmd_handlers.work_session_target(user_id, state_data)
         try:
-            database.add_pomodoro_session(
+            database.queue_pomodoro_session(
                 user_id=user_id,
                 project_id=project_id,
                 task_id=task_id,
@@ -540,23 +529,18 @@ def api_stop_timer(user_id: int):
             web_log.error(f"DB error logging stop via API for {user_id}: {db_err}")
 
         # Cancel job
-        job = state_data.get('job')
+        job = state_data.job
         if job:
             try:
                 job.schedule_removal()
             except Exception:
                 pass
         # Cleanup
-        try:
-            del timer_states[user_id]
-        except Exception:
-            pass
+        timer_states.pop(user_id, None)
 
         # Send Telegram notification
         accumulated_str = format_minutes_as_mmss(accumulated)
-        if session_type == 'work':
-            project_name = database.get_project_name(project_id) if project_id else None
-            task_name = database.get_task_name(task_id) if task_id else None
+        if session_type == SESSION_WORK:
             if project_id and task_id and project_name and task_name:
                 _send_telegram_message(
                     user_id,
@@ -579,7 +563,7 @@ def api_stop_timer(user_id: int):
                 _(user_id, 'timer_stopped_break', accumulated_time=accumulated_str, target_duration=int(duration))
             )
 
-        return jsonify({'ok': True, 'state': 'stopped', 'accumulated_minutes': round(accumulated, 2)})
+        return jsonify({'ok': True, 'state': TIMER_STOPPED, 'accumulated_minutes': round(accumulated, 2)})
     except Exception as e:
         web_log.error(f"Error stopping timer via API for {user_id}: {e}")
         return jsonify({'ok': False, 'error': 'Internal error'}), 500
@@ -601,16 +585,13 @@ def api_start_break(user_id: int):
         state_data = timer_states.get(user_id)
         if state_data:
             # Stop the existing timer
-            job = state_data.get('job')
+            job = state_data.job
             if job:
                 try:
                     job.schedule_removal()
                 except Exception:
                     pass
-            try:
-                del timer_states[user_id]
-            except Exception:
-                pass
+            timer_states.pop(user_id, None)
 
         # Get the job queue
         job_queue = _get_job_queue()
@@ -618,20 +599,14 @@ def api_start_break(user_id: int):
             return jsonify({'ok': False, 'error': 'Scheduler unavailable'}), 500
 
         # Schedule the timer completion callback
-        job_data = {'user_id': user_id, 'duration': duration, 'session_type': 'break'}
-        job = job_queue.run_once(cmd_handlers.timer_finished, duration * 60, data=job_data, name=f"timer_{user_id}")
+        job = cmd_handlers.schedule_timer_job(job_queue, user_id, duration, SESSION_BREAK)
 
         # Create timer state
         now = datetime.now()
-        timer_states[user_id] = {
-            'state': 'running',
-            'accumulated_time': 0,
-            'start_time': now,
-            'initial_start_time': now,
-            'duration': duration,
-            'session_type': 'break',
-            'job': job
-        }
+        timer_states[user_id] = TimerState(
+            duration=duration, session_type=SESSION_BREAK, job=job,
+            start_time=now, initial_start_time=now
+        )
 
         # Send Telegram notification
         _send_telegram_message(
@@ -639,7 +614,7 @@ def api_start_break(user_id: int):
             _(user_id, 'timer_break_started', duration_minutes=duration)
         )
 
-        return jsonify({'ok': True, 'duration': duration, 'session_type': 'break', 'state': 'running'})
+        return jsonify({'ok': True, 'duration': duration, 'session_type': SESSION_BREAK, 'state': TIMER_RUNNING})
     except Exception as e:
         web_log.error(f"Error starting break for {user_id}: {e}\n{traceback.format_exc()}")
         return jsonify({'ok': False, 'error': 'Internal error'}), 500
@@ -658,29 +633,21 @@ def api_start_next_pomodoro(user_id: int):
         duration = data.get('duration', 25)
 
         # Get current project and task
-        project_id = database.get_current_project(user_id)
-        task_id = database.get_current_task(user_id)
+        project_id, project_name, task_id, task_name = database.get_current_context(user_id)
 
         if not project_id or not task_id:
             return jsonify({'ok': False, 'error': 'No active project/task selected'}), 400
 
-        # Get task info for response
-        task_name = database.get_task_name(task_id)
-        project_name = database.get_project_name(project_id)
-
         # Stop any existing timer
         state_data = timer_states.get(user_id)
         if state_data:
-            job = state_data.get('job')
+            job = state_data.job
             if job:
                 try:
                     job.schedule_removal()
                 except Exception:
                     pass
-            try:
-                del timer_states[user_id]
-            except Exception:
-                pass
+            timer_states.pop(user_id, None)
 
         # Get the job queue
         job_queue = _get_job_queue()
@@ -688,20 +655,14 @@ def api_start_next_pomodoro(user_id: int):
             return jsonify({'ok': False, 'error': 'Scheduler unavailable'}), 500
 
         # Schedule the timer completion callback
-        job_data = {'user_id': user_id, 'duration': duration, 'session_type': 'work'}
-        job = job_queue.run_once(cmd_handlers.timer_finished, duration * 60, data=job_data, name=f"timer_{user_id}")
+        job = cmd_handlers.schedule_timer_job(job_queue, user_id, duration, SESSION_WORK)
 
         # Create timer state
         now = datetime.now()
-        timer_states[user_id] = {
-            'state': 'running',
-            'accumulated_time': 0,
-            'start_time': now,
-            'initial_start_time': now,
-            'duration': duration,
-            'session_type': 'work',
-            'job': job
-        }
+        timer_states[user_id] = TimerState(
+            duration=duration, session_type=SESSION_WORK, job=job,
+            start_time=now, initial_start_time=now, project_id=project_id, task_id=task_id
+        )
 
         # Send Telegram notification
         _send_telegram_message(
@@ -712,8 +673,8 @@ def api_start_next_pomodoro(user_id: int):
         return jsonify({
             'ok': True,
             'duration': duration,
-            'session_type': 'work',
-            'state': 'running',
+            'session_type': SESSION_WORK,
+            'state': TIMER_RUNNING,
             'task_name': task_name,
             'project_name': project_name
         })
@@ -857,11 +818,13 @@ def api_create_task(user_id: int):
             return jsonify({'ok': False, 'error': 'Task name is required'}), 400
         if not project_id:
             return jsonify({'ok': False, 'error': 'Project ID is required'}), 400
+        project_name = database.get_owned_project_name(user_id, project_id)
+        if project_name is None:
+            return jsonify({'ok': False, 'error': 'Project not found'}), 404
 
         task_id = database.add_task(project_id, task_name)
         if task_id:
             # Send Telegram notification
-            project_name = database.get_project_name(project_id)
             _send_telegram_message(
                 user_id,
                 _(user_id, 'task_created_selected', task_name=task_name, project_name=project_name)
@@ -886,7 +849,7 @@ def api_complete_task(user_id: int, task_id: int):
         task_name = database.get_task_name(task_id)
 
         # Mark task as done
-        success = database.mark_task_status(task_id, database.STATUS_DONE)
+        success = database.mark_task_status(user_id, task_id, database.STATUS_DONE)
         if success:
             # Send Telegram notification
             if task_name:
@@ -914,7 +877,7 @@ def api_uncomplete_task(user_id: int, task_id: int):
         task_name = database.get_task_name(task_id)
 
         # Mark task as active
-        success = database.mark_task_status(task_id, database.STATUS_ACTIVE)
+        success = database.mark_task_status(user_id, task_id, database.STATUS_ACTIVE)
         if success:
             # Send Telegram notification
             if task_name:
@@ -938,59 +901,39 @@ def api_start_task_timer(user_id: int, task_id: int):
         return jsonify({'ok': False, 'error': err}), code
 
     try:
-        # Get task and project info
-        task_name = database.get_task_name(task_id)
-        if not task_name:
-            return jsonify({'ok': False, 'error': 'Task not found'}), 404
-
-        # Get project_id from task
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT project_id FROM tasks WHERE task_id = ?', (task_id,))
-        result = cursor.fetchone()
-        conn.close()
-
-        if not result:
+        # Get task and project info (only for the user's own tasks)
+        owned = database.get_owned_task(user_id, task_id)
+        if not owned:
             return jsonify({'ok': False, 'error': 'Task not found'}), 404
-
-        project_id = result[0]
+        project_id, task_name = owned
 
         # Set current project and task
-        database.set_current_project(user_id, project_id)
-        database.set_current_task(user_id, task_id)
+        database.set_current_selection(user_id, project_id, task_id)
 
         # Get duration from request or use default
         data = request.get_json() if request.is_json else {}
         duration = data.get('duration', 25)  # Default 25 minutes
 
         # Stop any existing timer
-        if user_id in timer_states:
+        state_data = timer_states.pop(user_id, None)
+        if state_data and state_data.job:
             try:
-                state_data = timer_states[user_id]
-                job = state_data.get('job')
-                if job:
-                    job.schedule_removal()
+                state_data.job.schedule_removal()
             except Exception:
                 pass
-            del timer_states[user_id]
 
         # Start new timer
         job_queue = _get_job_queue()
         if not job_queue:
             return jsonify({'ok': False, 'error': 'Scheduler unavailable'}), 500
 
-        timer_data = {'user_id': user_id, 'duration': duration, 'session_type': 'work'}
-        job = job_queue.run_once(cmd_handlers.timer_finished, duration * 60, data=timer_data, name=f"timer_{user_id}")
+        job = cmd_handlers.schedule_timer_job(job_queue, user_id, duration, SESSION_WORK)
 
-        timer_states[user_id] = {
-            'state': 'running',
-            'start_time': datetime.now(),
-            'initial_start_time': datetime.now(),
-            'accumulated_time': 0,
-            'duration': duration,
-            'session_type': 'work',
-            'job': job
-        }
+        now = datetime.now()
+        timer_states[user_id] = TimerState(
+            duration=duration, session_type=SESSION_WORK, job=job,
+            start_time=now, initial_start_time=now, project_id=project_id, task_id=task_id
+        )
 
         # Send Telegram notification
         project_name = database.get_project_name(project_id)
@@ -1001,7 +944,7 @@ def api_start_task_timer(user_id: int, task_id: int):
 
         return jsonify({
             'ok': True,
-            'state': 'running',
+            'state': TIMER_RUNNING,
             'duration': duration,
             'task_id': task_id,
             'task_name': task_name,